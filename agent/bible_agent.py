@@ -1,5 +1,6 @@
 import random
 import time
+import asyncio
 import requests
 import json
 import logging
@@ -10,7 +11,15 @@ from models.verse import Verse
 from config.settings import Config
 from services.llm.gemini_llm import GeminiLLM
 from services.llm.hf_llm import HuggingFaceLLM
-from services.llm.model_selector import ModelSelector, ModelType, TaskType
+from services.llm.model_selector import LOCAL_MODELS, ModelSelector, ModelType, TaskType
+from services.llm.warmup import ModelWarmup
+from services.llm.hedged_llm import HedgedLLM
+from services.llm.model_types import parse_model_types
+from services.llm.rate_limiter import Priority, request_priority
+from services.llm.structured_output import TEACHING_SCHEMA, find_references
+from services.llm.inference_stats import InferenceStats
+from services.llm.usage_ledger import UsageLedger
+from services.llm.prompt_templates import PromptRegistry
 from typing import Dict, List, Optional, Any
 from models.verse_categories import VerseCategory, VerseCatalog
 from .search_agent import SearchAgent
@@ -30,6 +39,10 @@ from .components.session import StudySession
 import numpy as np
 
 from services.model_manager import ModelManager
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.single_flight import SingleFlight
+from services.semantic_cache import SemanticCache
+from services.event_loop import BackgroundLoop
 
 class BibleAgent(BaseAgent):
     def __init__(self):
@@ -39,16 +52,39 @@ class BibleAgent(BaseAgent):
             
             # Core components
             self.model_manager = ModelManager()
-            self.current_model_type = ModelType.GEMINI
+            self.current_model_type = ModelType[Config.MODEL_BACKEND.upper()]
+            self.model_selector = ModelSelector()
+            self.routing_enabled = len(self.model_selector.routing_models) > 1
+            # Fallback chain, optionally hedging slow backends (Config.HEDGE_REQUESTS)
+            self.fallback_llm = HedgedLLM(
+                chain=parse_model_types(Config.FALLBACK_CHAIN) or [self.current_model_type],
+                model_getter=self.model_selector.get_model if self.routing_enabled else self.model_manager.get_model,
+                selector=self.model_selector,
+                hedge=Config.HEDGE_REQUESTS
+            )
+            self.esv_breaker = CircuitBreaker.get("esv", max_timeout=Config.ESV_TIMEOUT)
+            self.single_flight = SingleFlight.shared()
+            # Async model clients bind to one loop; every command's coroutines share it
+            self.event_loop = BackgroundLoop.shared()
+            self.teach_cache = SemanticCache.shared("teach") if Config.SEMANTIC_CACHE_ENABLED else None
+            self.usage_ledger = UsageLedger.shared()
+            self.prompts = PromptRegistry.shared()
+            # Local models report through InferenceStats rather than to the ledger directly
+            InferenceStats.shared().subscribe(self.usage_ledger.record_inference)
             self.console_formatter = ConsoleFormatter()
             
             # Initialize model system
             self._models = {}
+            self.warmup = None
             if not self._init_model():
                 raise Exception("Failed to initialize model system")
             
             # Initialize services
-            self.search_agent = SearchAgent(model_manager=self.model_manager)
+            self.search_agent = SearchAgent(
+                model_manager=self.model_manager,
+                stream_renderer=self.console_formatter.stream_panel if Config.STREAM_OUTPUT else None,
+                model_for=self._model_for
+            )
             
             # Initialize session and preferences
             self.current_session = StudySession()
@@ -64,6 +100,14 @@ class BibleAgent(BaseAgent):
     def _init_model(self) -> bool:
         """Initialize primary model"""
         try:
+            if self.current_model_type in LOCAL_MODELS and Config.HF_BACKGROUND_WARMUP:
+                # Load local weights while the user is still at the command prompt
+                self.warmup = ModelWarmup(
+                    lambda: self.get_model(self.current_model_type),
+                    name=self.current_model_type.name
+                ).start()
+                return True
+
             model = self.model_manager.get_model(self.current_model_type)
             if model:
                 self._models[self.current_model_type] = model
@@ -100,12 +144,17 @@ class BibleAgent(BaseAgent):
 
     def get_model(self, model_type: ModelType):
         if (model_type not in self._models):
-            if model_type == ModelType.GEMINI:
-                self._models[model_type] = GeminiLLM(api_key=Config.GEMINI_API_KEY)
-            elif model_type == ModelType.LLAMA:
-                self._models[model_type] = HuggingFaceLLM(model_id=Config.HF_MODEL_ID)
+            # Waits for an in-flight background load of the same model
+            model = self.model_manager.get_model(model_type)
+            if model is None:
+                return None
+            self._models[model_type] = model
         return self._models[model_type]
 
+    def unavailable_dependencies(self) -> List[str]:
+        """External services whose circuit breaker is currently open"""
+        return [name for name, stats in CircuitBreaker.all_stats().items() if stats["state"] == "open"]
+
     @property
     def current_model(self):
         return self.get_model(self.current_model_type)
@@ -149,6 +198,11 @@ class BibleAgent(BaseAgent):
             logging.error(f"Error in get_daily_verse: {str(e)}")
             return self._get_fallback_verse()
 
+    def _esv_get(self, url: str, headers: Dict, params: Dict) -> Dict:
+        response = requests.get(url, headers=headers, params=params, timeout=self.esv_breaker.timeout())
+        response.raise_for_status()
+        return response.json()
+
     def _fetch_verse(self, reference: str, translation: str) -> Optional[Verse]:
         try:
             url = "https://api.esv.org/v3/passage/text/"
@@ -164,10 +218,9 @@ class BibleAgent(BaseAgent):
             }
             
             logging.debug(f"Fetching from ESV API: {reference}")
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self.single_flight.do(
+                ("esv", reference), self.esv_breaker.call, self._esv_get, url, headers, params
+            )
             
             # Save detailed response to JSON file
             output_dir = Config.DATA_DIR / "verses"
@@ -198,28 +251,23 @@ class BibleAgent(BaseAgent):
             logging.debug(f"Processed verse: {json.dumps(verse.to_dict(), indent=2)}")
             return verse  # Return verse object only, don't format yet
             
+        except CircuitOpenError as e:
+            logging.warning(str(e))
+            return None
         except Exception as e:
             logging.error(f"ESV API error: {str(e)}")
             return None
 
     def get_teachings(self, topic: str = None) -> dict:
-        start_time = time.time()
-        model = None
-        
         try:
-            context = {'topic': topic, 'timestamp': datetime.now().isoformat()}
-            
             # Get initialized model
-            model = self.model_selector.select_and_get_model(
-                task=TaskType.TEACHING,
-                context=context
-            )
+            model = self.model_selector.select_and_get_model(task=TaskType.TEACHING)
             
             if not model:
                 raise Exception("Failed to initialize any model")
             
             # Generate content
-            result = model.generate(self._create_teaching_prompt(topic))
+            result = model.generate(self._create_teaching_prompt(topic), task=TaskType.TEACHING)
             if not result:
                 raise Exception("No content generated")
             
@@ -231,59 +279,26 @@ class BibleAgent(BaseAgent):
                 "timestamp": datetime.now().isoformat()
             }
             
-            # Update performance metrics
-            self.model_selector.update_performance(
-                model=model.model_type,
-                success=True,
-                latency=time.time() - start_time
-            )
-            
+            # The routed model records its own latency and outcome
             print(self.console_formatter.format_teaching(teaching_data))
             return teaching_data
             
         except Exception as e:
-            if model:
-                self.model_selector.update_performance(
-                    model=model.model_type,
-                    success=False,
-                    latency=time.time() - start_time
-                )
             logging.error(f"Teaching generation failed: {str(e)}")
             raise
 
     def _create_teaching_prompt(self, topic: str) -> str:
         """Create a structured prompt for biblical teaching generation"""
-        return f"""
-        Provide biblical teachings and insights about: {topic}
-        
-        Please include:
-        1. Key biblical principles
-        2. Relevant scripture references
-        3. Practical applications
-        4. Spiritual wisdom
-        5. Examples from biblical narratives
-        
-        Format the response with clear sections and scripture citations.
-        Focus on providing deep spiritual insights while maintaining theological accuracy.
-        """
-
-    def generate_reflection(self, verse: Verse) -> str:
-        """Generate reflection using best-suited model"""
-        selected_model = self.model_selector.select_model(
-            task=TaskType.REFLECTION,
-            context={'verse_length': len(verse.text)}
-        )
-        
+        return self.prompts.render("teaching", topic=topic)
+
+    def generate_verse_reflection(self, verse: Verse) -> Optional[str]:
+        """Generate a verse reflection, falling back along Config.FALLBACK_CHAIN"""
+        prompt = self.prompts.render("verse_reflection", text=verse.text, reference=verse.reference)
         try:
-            self.current_model = self.models[selected_model]
-            prompt = f"Provide a deep spiritual reflection on this verse: {verse.text} ({verse.reference})"
-            response = self.current_model.generate(prompt)
-            self.model_selector.track_performance(selected_model, True)
-            return response
+            return self.fallback_llm.generate(prompt, task=TaskType.REFLECTION)
         except Exception as e:
-            self.model_selector.track_performance(selected_model, False)
-            fallback_model = next(m for m in ModelType if m != selected_model)
-            return self.models[fallback_model].generate(prompt)
+            logging.error(f"Verse reflection failed: {str(e)}")
+            return None
 
     def save_favorite(self, verse: Verse):
         """Save a verse to favorites"""
@@ -305,15 +320,8 @@ class BibleAgent(BaseAgent):
             
             enhanced_results = []
             for result in raw_results:
-                prompt = f"""Based on this search result about "{query}":
-                {result['snippet']}
-                
-                Provide:
-                1. Biblical perspective
-                2. Key spiritual insights
-                3. Relevant scripture references
-                """
-                
+                prompt = self.prompts.render("search_result_insight", topic=query, snippet=result['snippet'])
+
                 insight = model.generate(prompt)
                 result['enhanced_insight'] = insight
                 enhanced_results.append(result)
@@ -332,11 +340,7 @@ class BibleAgent(BaseAgent):
             raise
 
     def _create_search_prompt(self, query: str) -> str:
-        return f"""
-        Please provide biblical insights and references about: {query}
-        Include relevant scripture verses and theological context.
-        Focus on practical application and spiritual understanding.
-        """
+        return self.prompts.render("search", topic=query)
 
     def analyze_passage(self, passage: str) -> Dict[str, Any]:
         """Analyze biblical passage using Gemini"""
@@ -344,17 +348,8 @@ class BibleAgent(BaseAgent):
         try:
             model = self.get_model(ModelType.GEMINI)
             
-            prompt = f"""Analyze this biblical passage:
-            {passage}
-            
-            Provide:
-            1. Historical Context
-            2. Key Themes
-            3. Theological Significance
-            4. Practical Applications
-            5. Cross References
-            """
-            
+            prompt = self.prompts.render("passage_analysis", passage=passage)
+
             analysis = model.generate(prompt)
             
             analysis_data = {
@@ -441,9 +436,6 @@ class BibleAgent(BaseAgent):
 
     def search_with_analysis(self, query: str) -> Dict:
         """Enhanced search with theological analysis"""
-        start_time = time.time()
-        model = None
-        
         try:
             # Get search results and analysis
             search_data = self.search_agent.search_and_analyze(query)
@@ -451,14 +443,6 @@ class BibleAgent(BaseAgent):
             if not search_data:
                 raise Exception("Failed to get search results")
                 
-            # Track model performance
-            if model := self.get_model(self.current_model_type):
-                self.model_selector.update_performance(
-                    model=model.model_type,
-                    success=True,
-                    latency=time.time() - start_time
-                )
-                
             # Add to session
             if hasattr(self, 'current_session'):
                 self.current_session.add_search(search_data)
@@ -468,12 +452,6 @@ class BibleAgent(BaseAgent):
             return search_data
             
         except Exception as e:
-            if model:
-                self.model_selector.update_performance(
-                    model=model.model_type,
-                    success=False,
-                    latency=time.time() - start_time
-                )
             logging.error(f"Search failed: {str(e)}")
             return None
 
@@ -513,6 +491,25 @@ class BibleAgent(BaseAgent):
 
     def process_command(self, command: str, *args) -> Optional[Dict]:
         """Process user commands"""
+        # Someone is waiting on these; their model calls go ahead of queued background work
+        with request_priority(Priority.INTERACTIVE), self.usage_ledger.command(command) as command_id:
+            try:
+                return self._process_command(command, *args)
+            finally:
+                self._log_command_usage(command, command_id)
+
+    def _log_command_usage(self, command: str, command_id: int):
+        usage = self.usage_ledger.command_totals(command_id)
+        if not usage["calls"]:
+            return
+        session = self.usage_ledger.get_stats()["session"]
+        logging.info(
+            f"'{command}' used {usage['calls']} model call(s): {usage['input_tokens']} input + "
+            f"{usage['output_tokens']} output tokens, {usage['latency']:.1f}s, ${usage['cost']:.4f} "
+            f"(session: {session['calls']} calls, ${session['cost']:.4f})"
+        )
+
+    def _process_command(self, command: str, *args) -> Optional[Dict]:
         try:
             logging.debug(f"Processing command: {command}")
             
@@ -541,22 +538,51 @@ class BibleAgent(BaseAgent):
             if not query:
                 print("Please provide a topic")
                 return None
-            
-            # Get search results and generate teaching
-            search_data = self.search_agent.search_and_analyze(query)
-            if not search_data:
-                return None
-                
+
+            # Near-duplicate topics reuse an earlier teaching
+            cached = self.teach_cache.get(query) if self.teach_cache else None
+            if cached is not None:
+                teaching_data = {**cached, "query": query, "timestamp": datetime.now().isoformat()}
+                self.current_session.add_teaching(teaching_data)
+                print(self.console_formatter.format_teaching(teaching_data))
+                return teaching_data
+            
+            # One structured call when possible; the per-section pipeline otherwise
+            search_data = None
+            raw_results = None
+            if Config.TEACH_STRUCTURED_OUTPUT:
+                # Searched once; the per-section fallback reuses the results
+                raw_results = self.search_agent.search(query)
+                search_data = self.search_agent.search_and_teach(query, raw_results=raw_results)
+            if search_data:
+                insights = search_data['insights']
+                references, application, prayer = self.event_loop.run(
+                    self._fill_teaching_fields(query, search_data)
+                )
+            else:
+                search_data = self.search_agent.search_and_analyze(query, raw_results=raw_results)
+                if not search_data:
+                    return None
+
+                insights = search_data.get('insights', '')
+                references, application, prayer = self.event_loop.run(
+                    self._generate_teaching_details(query, insights)
+                )
+
             teaching_data = {
                 "query": query,
-                "insights": search_data.get('insights', ''),
-                "references": self._extract_references(search_data.get('insights', '')),
-                "application": self._generate_application(search_data.get('insights', '')),
-                "prayer": self._generate_prayer_points(query, search_data.get('insights', '')),
+                "insights": insights,
+                "references": references,
+                "application": application,
+                "prayer": prayer,
                 "sources": search_data.get('sources', []),
                 "timestamp": datetime.now().isoformat()
             }
             
+            # A teaching with a failed section would be served to every similar topic
+            if self.teach_cache and all(teaching_data[field] for field in TEACHING_SCHEMA):
+                self.teach_cache.set(query, teaching_data)
+
             # Add to session and display
             self.current_session.add_teaching(teaching_data)
             print(self.console_formatter.format_teaching(teaching_data))
@@ -574,16 +600,11 @@ class BibleAgent(BaseAgent):
             
         try:
             # Generate devotional
-            model = self.model_manager.get_model(self.current_model_type)
-            devotional = model.generate(f"""
-            Create a short devotional for this verse:
-            {verse.text} - {verse.reference}
-            
-            Include:
-            1. Brief explanation
-            2. Life application
-            3. Prayer point
-            """)
+            model = self._model_for(TaskType.VERSE_ANALYSIS)
+            devotional = self._generate_live(
+                model, self.prompts.render("devotional", text=verse.text, reference=verse.reference),
+                TaskType.VERSE_ANALYSIS, "🙏 Daily Devotional"
+            )
             
             verse_data = verse.to_dict()
             verse_data['devotional'] = devotional
@@ -598,21 +619,38 @@ class BibleAgent(BaseAgent):
             logging.error(f"Error generating devotional: {str(e)}")
             return verse.to_dict()  # Return verse without devotional as fallback
 
+    def _model_for(self, task: TaskType):
+        """Pick the model for a task: hedged fallback chain, routed backend or the configured one"""
+        if Config.HEDGE_REQUESTS:
+            return self.fallback_llm
+        if self.routing_enabled:
+            model = self.model_selector.select_and_get_model(task)
+            if model:
+                return model
+        return self.model_manager.get_model(self.current_model_type)
+
+    def _generate_live(self, model, prompt: str, task: TaskType, title: str) -> Optional[str]:
+        """Generate while streaming chunks into a live console panel when enabled"""
+        if not Config.STREAM_OUTPUT or not hasattr(model, 'generate_stream'):
+            return model.generate(prompt, task=task)
+        return self.console_formatter.stream_panel(
+            model.generate_stream(prompt, task=task), title
+        ) or None
+
+    def _references_prompt(self, text: str) -> str:
+        return self.prompts.render("references", text=text)
+
+    def _application_prompt(self, insights: str) -> str:
+        return self.prompts.render("application", insights=insights)
+
+    def _prayer_prompt(self, topic: str, insights: str) -> str:
+        return self.prompts.render("prayer", topic=topic, insights=insights)
+
     def _extract_references(self, text: str) -> List[str]:
         """Extract biblical references from text"""
         try:
-            model = self.model_manager.get_model(self.current_model_type)
-            prompt = f"""
-            Extract all Bible verse references from this text:
-            {text}
-            
-            Return only the references, one per line.
-            Example format:
-            John 3:16
-            Romans 8:28
-            """
-            
-            result = model.generate(prompt)
+            model = self._model_for(TaskType.EXTRACTION)
+            result = model.generate(self._references_prompt(text), task=TaskType.EXTRACTION)
             return [ref.strip() for ref in result.split('\n') if ref.strip()]
         except Exception as e:
             logging.error(f"Reference extraction failed: {str(e)}")
@@ -621,18 +659,8 @@ class BibleAgent(BaseAgent):
     def _generate_application(self, insights: str) -> str:
         """Generate practical application points"""
         try:
-            model = self.model_manager.get_model(self.current_model_type)
-            prompt = f"""
-            Based on these biblical insights:
-            {insights}
-            
-            Generate practical application points including:
-            1. Personal application
-            2. Daily life implementation
-            3. Spiritual growth steps
-            """
-            
-            return model.generate(prompt)
+            model = self._model_for(TaskType.TEACHING)
+            return model.generate(self._application_prompt(insights), task=TaskType.TEACHING)
         except Exception as e:
             logging.error(f"Application generation failed: {str(e)}")
             return ""
@@ -640,23 +668,70 @@ class BibleAgent(BaseAgent):
     def _generate_prayer_points(self, topic: str, insights: str) -> str:
         """Generate focused prayer points"""
         try:
-            model = self.model_manager.get_model(self.current_model_type)
-            prompt = f"""
-            Based on the topic '{topic}' and these insights:
-            {insights}
-            
-            Create focused prayer points covering:
-            1. Personal transformation
-            2. Spiritual understanding
-            3. Practical application
-            4. Community impact
-            """
-            
-            return model.generate(prompt)
+            model = self._model_for(TaskType.TEACHING)
+            return model.generate(self._prayer_prompt(topic, insights), task=TaskType.TEACHING)
         except Exception as e:
             logging.error(f"Prayer points generation failed: {str(e)}")
             return ""
 
+    async def _aextract_references(self, text: str) -> List[str]:
+        """Async variant of _extract_references"""
+        try:
+            model = self._model_for(TaskType.EXTRACTION)
+            result = await model.agenerate(self._references_prompt(text), task=TaskType.EXTRACTION)
+            return [ref.strip() for ref in result.split('\n') if ref.strip()]
+        except Exception as e:
+            logging.error(f"Reference extraction failed: {str(e)}")
+            return []
+
+    async def _agenerate_application(self, insights: str) -> str:
+        """Async variant of _generate_application"""
+        try:
+            model = self._model_for(TaskType.TEACHING)
+            return await model.agenerate(self._application_prompt(insights), task=TaskType.TEACHING)
+        except Exception as e:
+            logging.error(f"Application generation failed: {str(e)}")
+            return ""
+
+    async def _agenerate_prayer_points(self, topic: str, insights: str) -> str:
+        """Async variant of _generate_prayer_points"""
+        try:
+            model = self._model_for(TaskType.TEACHING)
+            return await model.agenerate(self._prayer_prompt(topic, insights), task=TaskType.TEACHING)
+        except Exception as e:
+            logging.error(f"Prayer points generation failed: {str(e)}")
+            return ""
+
+    async def _generate_teaching_details(self, topic: str, insights: str) -> tuple:
+        """Run the follow-up teaching calls concurrently; each depends only on the insights"""
+        return await asyncio.gather(
+            self._aextract_references(insights),
+            self._agenerate_application(insights),
+            self._agenerate_prayer_points(topic, insights)
+        )
+
+    async def _fill_teaching_fields(self, topic: str, data: Dict) -> tuple:
+        """Keep the fields a structured response got right; regenerate only the rest"""
+        insights = data['insights']
+
+        async def references():
+            if 'references' in data:
+                return data['references']
+            # Found locally in the insights first; a model call only if there are none
+            return find_references(insights) or await self._aextract_references(insights)
+
+        async def application():
+            if 'application' in data:
+                return data['application']
+            return await self._agenerate_application(insights)
+
+        async def prayer():
+            if 'prayer' in data:
+                return data['prayer']
+            return await self._agenerate_prayer_points(topic, insights)
+
+        return await asyncio.gather(references(), application(), prayer())
+
     def _handle_reflect_command(self) -> Optional[Dict]:
         try:
             logging.debug("Executing reflect command")
@@ -678,22 +753,15 @@ class BibleAgent(BaseAgent):
                 return None
             
             # More structured prompt
-            model = self.model_manager.get_model(self.current_model_type)
-            reflection = model.generate(f"""
-            Reflect deeply on this {content['type']}:
-            {content['content'].get('insights', content['content'].get('text', ''))}
-            
-            Format your response exactly as follows:
-            
-            INSIGHTS:
-            [Your spiritual insights here]
-            
-            APPLICATION:
-            [Your personal application points here]
-            
-            PRAYER:
-            [Your prayer focus here]
-            """)
+            model = self._model_for(TaskType.REFLECTION)
+            reflection = self._generate_live(
+                model,
+                self.prompts.render(
+                    "reflect", content_type=content['type'],
+                    content=content['content'].get('insights', content['content'].get('text', ''))
+                ),
+                TaskType.REFLECTION, "💭 Reflecting"
+            )
             
             # More robust parsing
             sections = reflection.split('INSIGHTS:')[1].split('APPLICATION:')
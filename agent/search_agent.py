@@ -1,46 +1,80 @@
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import logging
 from services.serper_service import SerperService
 from services.model_manager import ModelManager
 from config.settings import Config
 from services.llm.gemini_llm import GeminiLLM
-from services.llm.model_types import ModelType
+from services.llm.model_types import ModelType, TaskType
+from services.semantic_cache import SemanticCache
+from services.llm.structured_output import StructuredResult, parse_structured, stream_json_field
+from services.llm.prompt_templates import PromptRegistry
 from datetime import datetime
 
 class SearchAgent:
     """Enhanced biblical search and analysis agent"""
     
-    def __init__(self, model_manager: ModelManager):
-        """Initialize with shared model manager"""
+    def __init__(self, model_manager: ModelManager,
+                 stream_renderer: Optional[Callable[[Iterator[str], str], str]] = None,
+                 model_for: Optional[Callable[[TaskType], Any]] = None):
+        """Initialize with shared model manager, optional live stream renderer and model picker.
+
+        model_for(task) returns the model for a task (e.g. the agent's hedged
+        fallback chain or routed backend); Gemini when not given.
+        """
         self.model_manager = model_manager
+        self.stream_renderer = stream_renderer
+        self.model_for = model_for or (lambda task: self.model_manager.get_model(ModelType.GEMINI))
         self.serper = SerperService(api_key=Config.SERPER_API_KEY)
-        self.gemini = self.model_manager.get_model(ModelType.GEMINI)
+        self.cache = SemanticCache.shared("search") if Config.SEMANTIC_CACHE_ENABLED else None
+        self.prompts = PromptRegistry.shared()
+
+    def _generate(self, prompt: str, task: TaskType, title: Optional[str] = None) -> Optional[str]:
+        """Generate with the model picked for the task, streaming into a titled panel when enabled"""
+        model = self.model_for(task)
+        if not model:
+            raise Exception(f"No model available for {task.name.lower()}")
+        if not (title and self.stream_renderer):
+            return model.generate(prompt, task=task)
+        if hasattr(model, 'generate_stream'):
+            return self.stream_renderer(model.generate_stream(prompt, task=task), title)
+        # Models without streaming (e.g. the hedged chain) are shown once complete
+        text = model.generate(prompt, task=task)
+        if text:
+            self.stream_renderer(iter([text]), title)
+        return text
+
+    def search(self, query: str) -> List[Dict]:
+        """Raw web search results; empty if the search failed"""
+        return self.serper.search(query)
+
+    def search_and_analyze(self, query: str, raw_results: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Enhanced biblical search with theological analysis.
 
-    def search_and_analyze(self, query: str) -> Optional[Dict]:
-        """Enhanced biblical search with theological analysis"""
+        raw_results from an earlier search of the same query are reused.
+        """
         try:
+            cached = self.cache.get(query) if self.cache else None
+            if cached is not None:
+                if self.stream_renderer:
+                    self.stream_renderer(iter([cached["insights"]]), "🔍 Key Insights")
+                return {**cached, "query": query, "timestamp": datetime.now().isoformat()}
+
             # Get raw search results
-            raw_results = self.serper.search(query)
+            raw_results = raw_results or self.search(query)
             if not raw_results:
                 raise Exception("No search results found")
 
-            # Generate theological analysis
-            analysis_prompt = f"""Analyze biblically: {query}
-            Based on these sources: {[r.get('snippet', '') for r in raw_results[:3]]}
-            
-            Consider:
-            1. Biblical perspective
-            2. Key theological points
-            3. Scripture references
-            4. Practical application
-            """
+            # Generate theological analysis from the most relevant snippets
+            analysis_prompt = self.prompts.render(
+                "search_analysis", topic=query, snippets=[r.get('snippet', '') for r in raw_results]
+            )
             
-            analysis = self.gemini.generate(analysis_prompt)
+            analysis = self._generate(analysis_prompt, TaskType.TEACHING, title="🔍 Key Insights")
             if not analysis:
                 raise Exception("Failed to generate analysis")
 
             # Structure the response
-            return {
+            result = {
                 "query": query,
                 "insights": analysis,  # Key matches session storage expectation
                 "sources": [{
@@ -50,25 +84,77 @@ class SearchAgent:
                 } for r in raw_results[:3]],
                 "timestamp": datetime.now().isoformat()
             }
+            if self.cache and result["insights"] and result["sources"]:
+                self.cache.set(query, result)
+            return result
 
         except Exception as e:
             logging.error(f"Search and analysis failed: {str(e)}")
             return None
 
+    def search_and_teach(self, query: str, raw_results: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Search, then generate the whole teaching in one structured call.
+
+        Returns the validated fields plus 'missing' (fields the model left
+        out or got wrong) and 'sources'; None if nothing usable came back.
+        raw_results from an earlier search of the same query are reused.
+        """
+        try:
+            raw_results = raw_results or self.search(query)
+            if not raw_results:
+                raise Exception("No search results found")
+
+            prompt = self.prompts.render(
+                "teaching_structured", topic=query, snippets=[r.get('snippet', '') for r in raw_results]
+            )
+            model = self.model_for(TaskType.TEACHING)
+            if not model:
+                raise Exception("No model available for teaching")
+            shown = None
+            if self.stream_renderer and hasattr(model, 'generate_stream'):
+                # Raw JSON is not worth showing; stream just the insights text as it arrives
+                raw = []
+                shown = self.stream_renderer(
+                    stream_json_field(model.generate_stream(prompt, task=TaskType.TEACHING), "insights", raw),
+                    "🔍 Key Insights"
+                )
+                text = "".join(raw)
+            else:
+                text = model.generate(prompt, task=TaskType.TEACHING)
+
+            result: StructuredResult = parse_structured(text)
+            if 'insights' in result.missing:
+                raise Exception("Structured teaching response had no insights")
+            if result.missing:
+                logging.info(f"Structured teaching missing {', '.join(result.missing)}; using fallbacks")
+            # Models without streaming, or insights that were not a plain string, are shown once parsed
+            if self.stream_renderer and not shown:
+                self.stream_renderer(iter([result.data['insights']]), "🔍 Key Insights")
+
+            return {
+                **result.data,
+                "query": query,
+                "missing": result.missing,
+                "sources": [{
+                    "title": r.get('title', ''),
+                    "link": r.get('link', ''),
+                    "snippet": r.get('snippet', '')
+                } for r in raw_results[:3]],
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logging.error(f"Structured teaching failed: {str(e)}")
+            return None
+
     def reflect_on_results(self, search_results: Dict) -> str:
         """Generate spiritual reflection on search results"""
         try:
-            reflection_prompt = f"""Provide a spiritual reflection on: {search_results['query']}
-            Based on: {search_results['insights']}
-            
-            Consider:
-            1. Spiritual significance
-            2. Personal application
-            3. Prayer points
-            4. Meditation focus
-            """
-            
-            return self.gemini.generate(reflection_prompt)
+            reflection_prompt = self.prompts.render(
+                "search_reflection", topic=search_results['query'], insights=search_results['insights']
+            )
+
+            return self._generate(reflection_prompt, TaskType.REFLECTION)
             
         except Exception as e:
             logging.error(f"Reflection generation failed: {str(e)}")
@@ -77,18 +163,9 @@ class SearchAgent:
     def get_summary(self, text: str) -> Dict:
         """Generate a comprehensive biblical summary"""
         try:
-            summary_prompt = f"""
-            Provide a biblical analysis of this text:
-            {text}
-            
-            Include:
-            - Main theological themes
-            - Key spiritual principles
-            - Biblical cross-references
-            - Practical applications
-            """
+            summary_prompt = self.prompts.render("summary", text=text)
             
-            summary = self.gemini.generate(summary_prompt)
+            summary = self._generate(summary_prompt, TaskType.ANALYSIS)
             
             return {
                 "summary": summary,
@@ -123,8 +200,8 @@ class SearchAgent:
     def _extract_key_points(self, text: str) -> List[str]:
         """Extract key theological points from analysis"""
         try:
-            prompt = f"Extract the key theological points from this analysis: {text}"
-            result = self.gemini.generate(prompt)
+            prompt = self.prompts.render("key_points", text=text)
+            result = self._generate(prompt, TaskType.EXTRACTION)
             return [point.strip() for point in result.split('\n') if point.strip()]
         except Exception as e:
             logging.error(f"Key point extraction failed: {str(e)}")
@@ -133,8 +210,8 @@ class SearchAgent:
     def _find_biblical_references(self, text: str) -> List[str]:
         """Extract biblical references from text"""
         try:
-            prompt = f"List all Bible verse references from this text: {text}"
-            result = self.gemini.generate(prompt)
+            prompt = self.prompts.render("find_references", text=text)
+            result = self._generate(prompt, TaskType.EXTRACTION)
             return [ref.strip() for ref in result.split('\n') if ref.strip()]
         except Exception as e:
             logging.error(f"Reference extraction failed: {str(e)}")
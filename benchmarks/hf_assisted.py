@@ -0,0 +1,51 @@
+"""Measure the speedup of assisted (draft model) decoding for HuggingFaceLLM.
+
+    python benchmarks/hf_assisted.py --model-id meta-llama/Llama-2-7b-chat-hf \
+        --draft-model-id TinyLlama/TinyLlama-1.1B-Chat-v1.0
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+
+from config.settings import Config
+from services.llm.hf_llm import HuggingFaceLLM
+
+PROMPTS = ["love", "forgiveness", "faith in hard times"]
+
+def time_generation(llm: HuggingFaceLLM) -> float:
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        llm.generate(prompt)
+    return (time.perf_counter() - start) / len(PROMPTS)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-id", default=Config.HF_MODEL_ID)
+    parser.add_argument("--draft-model-id", required=True)
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    args = parser.parse_args()
+
+    Config.HF_DRAFT_MODEL_ID = args.draft_model_id
+    llm = HuggingFaceLLM(model_id=args.model_id)
+    llm.generation_kwargs['max_new_tokens'] = args.max_new_tokens
+
+    assisted_seconds = time_generation(llm)
+    stats = llm.get_assisted_stats()
+
+    draft_model, llm.draft_model = llm.draft_model, None
+    plain_seconds = time_generation(llm)
+    llm.draft_model = draft_model
+
+    print(f"plain decoding:    {plain_seconds:.2f}s per response")
+    print(f"assisted decoding: {assisted_seconds:.2f}s per response")
+    print(f"speedup:           {plain_seconds / assisted_seconds:.2f}x")
+    print(f"acceptance rate:   {stats.get('acceptance_rate', 0.0):.1%}")
+    print(f"tokens per main-model pass: {stats.get('tokens_per_target_forward', 0.0):.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare load time, memory and generation speed of HuggingFaceLLM precision modes.
+
+Each mode runs in its own subprocess so peak RSS is measured independently:
+
+    python benchmarks/hf_precision.py --model-id microsoft/phi-2 --modes fp32 bf16 int8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROMPTS = ["love", "forgiveness", "faith in hard times"]
+
+def run_worker(model_id: str, max_new_tokens: int) -> dict:
+    from services.llm.hf_llm import HuggingFaceLLM
+
+    start = time.perf_counter()
+    llm = HuggingFaceLLM(model_id=model_id)
+    load_seconds = time.perf_counter() - start
+    llm.generation_kwargs['max_new_tokens'] = max_new_tokens
+
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        llm.generate(prompt)
+    generate_seconds = (time.perf_counter() - start) / len(PROMPTS)
+
+    return {
+        "precision": llm.precision,
+        "load_seconds": load_seconds,
+        "generate_seconds": generate_seconds,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-id", default="microsoft/phi-2")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.model_id, args.max_new_tokens)))
+        return
+
+    results = {}
+    for mode in args.modes:
+        env = {**os.environ, "HF_PRECISION": mode, "RESPONSE_CACHE_ENABLED": "false"}
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", "--model-id", args.model_id,
+             "--max-new-tokens", str(args.max_new_tokens)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    baseline = results.get("fp32")
+    print(f"{'mode':<6} {'load (s)':>9} {'gen (s)':>9} {'peak RSS (MB)':>14} {'gen speedup':>12}")
+    for mode, r in results.items():
+        speedup = baseline["generate_seconds"] / r["generate_seconds"] if baseline else float("nan")
+        print(f"{mode:<6} {r['load_seconds']:>9.2f} {r['generate_seconds']:>9.3f} "
+              f"{r['peak_rss_mb']:>14.0f} {speedup:>11.2f}x")
+        if r["precision"] != mode:
+            print(f"       (ran as {r['precision']}: mode not supported on this CPU)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare per-token decode time of eager and compiled static-cache generation.
+
+    HF_STATIC_CACHE_MAX_LENGTH=1024 python benchmarks/hf_static_cache.py --model-id microsoft/phi-2
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ["HF_STATIC_CACHE"] = "true"
+# Both modes prefill the full prompt so only decoding differs
+os.environ["HF_PREFIX_CACHE"] = "false"
+
+from config.settings import Config
+from services.llm.hf_llm import HuggingFaceLLM
+
+PROMPTS = ["love", "forgiveness", "faith in hard times"]
+
+def ms_per_token(llm: HuggingFaceLLM, max_new_tokens: int) -> float:
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        llm._generate_direct(prompt)
+    return (time.perf_counter() - start) * 1000 / (len(PROMPTS) * max_new_tokens)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-id", default=Config.HF_MODEL_ID)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    llm = HuggingFaceLLM(model_id=args.model_id)
+    # Fixed-length greedy output so both modes decode the same number of tokens
+    llm.generation_kwargs.update(
+        max_new_tokens=args.max_new_tokens, min_new_tokens=args.max_new_tokens, do_sample=False
+    )
+
+    start = time.perf_counter()
+    llm.warmup()
+    compile_seconds = time.perf_counter() - start
+    static_cache = llm.static_cache
+    if static_cache is None:
+        print("static-cache compilation failed; only eager decoding is available")
+        return
+    static_ms = ms_per_token(llm, args.max_new_tokens)
+
+    llm.static_cache = None
+    eager_ms = ms_per_token(llm, args.max_new_tokens)
+    llm.static_cache = static_cache
+
+    print(f"warm-up (compile):   {compile_seconds:.1f}s")
+    print(f"eager decoding:      {eager_ms:.1f} ms/token")
+    print(f"static + compiled:   {static_ms:.1f} ms/token")
+    print(f"speedup:             {eager_ms / static_ms:.2f}x")
+
+if __name__ == "__main__":
+    main()
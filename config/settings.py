@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 # Load environment variables
 load_dotenv()
@@ -11,14 +11,50 @@ load_dotenv()
 class Config:
     # API Keys with fallbacks
     GEMINI_API_KEY: str = os.getenv('GEMINI_API_KEY', '')
+    GEMINI_API_KEYS: str = os.getenv('GEMINI_API_KEYS', '')  # Comma-separated pool; overrides GEMINI_API_KEY
     SERPER_API_KEY: str = os.getenv('SERPER_API_KEY', '')
     ESV_API_KEY: str = os.getenv('ESV_API_KEY', '') 
     HF_API_KEY: str = os.getenv('HF_API_KEY', '')
     
     # Model Configuration
     DEFAULT_MODEL: str = "phi-2"
+    MODEL_BACKEND: str = os.getenv('MODEL_BACKEND', 'GEMINI')  # Any ModelType name
+    ROUTING_MODELS: str = os.getenv('ROUTING_MODELS', '')  # Comma-separated ModelType names; empty = MODEL_BACKEND only
+    ROUTING_EXPLORATION: float = float(os.getenv('ROUTING_EXPLORATION', '0.05'))
+    ROUTING_METRICS_WINDOW: int = int(os.getenv('ROUTING_METRICS_WINDOW', '100'))
+    FALLBACK_CHAIN: str = os.getenv('FALLBACK_CHAIN', 'GEMINI,GEMINI')  # Tried in order; repeats allowed
+    HEDGE_REQUESTS: bool = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+    HEDGE_MIN_DELAY: float = float(os.getenv('HEDGE_MIN_DELAY', '0.5'))  # Seconds; floor for the p95 hedge delay
+    TEACH_STRUCTURED_OUTPUT: bool = os.getenv('TEACH_STRUCTURED_OUTPUT', 'true').lower() == 'true'  # One JSON call per teaching
     MAX_TOKENS: int = 2048
     TEMPERATURE: float = 0.7
+
+    # Local Model Configuration
+    HF_MODEL_ID: str = os.getenv('HF_MODEL_ID', 'microsoft/phi-2')
+    HF_DRAFT_MODEL_ID: str = os.getenv('HF_DRAFT_MODEL_ID', '')  # Enables assisted decoding
+    HF_PRECISION: str = os.getenv('HF_PRECISION', 'fp32')  # fp32, bf16 or int8
+    HF_BATCH_SIZE: int = int(os.getenv('HF_BATCH_SIZE', '8'))
+    HF_PREFIX_CACHE: bool = os.getenv('HF_PREFIX_CACHE', 'true').lower() == 'true'
+    HF_NUM_WORKERS: int = int(os.getenv('HF_NUM_WORKERS', '1'))  # >1 starts a process pool
+    HF_THREADS_PER_WORKER: int = int(os.getenv('HF_THREADS_PER_WORKER', '0'))  # 0 = split cores evenly
+    ONNX_MODEL_ID: str = os.getenv('ONNX_MODEL_ID', 'microsoft/phi-2')
+    ONNX_NUM_THREADS: int = int(os.getenv('ONNX_NUM_THREADS', '0'))  # 0 = onnxruntime default
+    HF_STREAM_TIMEOUT: float = float(os.getenv('HF_STREAM_TIMEOUT', '60'))  # Max seconds between streamed chunks
+    HF_MICRO_BATCHING: bool = os.getenv('HF_MICRO_BATCHING', 'false').lower() == 'true'  # Padded batches skip the prefix KV-cache
+    HF_MICRO_BATCH_MAX_SIZE: int = int(os.getenv('HF_MICRO_BATCH_MAX_SIZE', '8'))
+    HF_MICRO_BATCH_MAX_WAIT_MS: int = int(os.getenv('HF_MICRO_BATCH_MAX_WAIT_MS', '20'))
+    HF_MMAP_WEIGHTS: bool = os.getenv('HF_MMAP_WEIGHTS', 'true').lower() == 'true'  # Map safetensors shards instead of copying
+    HF_STATIC_CACHE: bool = os.getenv('HF_STATIC_CACHE', 'false').lower() == 'true'  # Fixed-size KV cache + compiled decode
+    HF_STATIC_CACHE_MAX_LENGTH: int = int(os.getenv('HF_STATIC_CACHE_MAX_LENGTH', '1024'))  # Prompt + new tokens
+    MODEL_MEMORY_BUDGET_MB: int = int(os.getenv('MODEL_MEMORY_BUDGET_MB', '0'))  # 0 = 80% of system RAM
+    MODEL_IDLE_TIMEOUT: int = int(os.getenv('MODEL_IDLE_TIMEOUT', '900'))  # Seconds; 0 disables idle eviction
+    MODEL_MIN_FREE_MB: int = int(os.getenv('MODEL_MIN_FREE_MB', '512'))
+    REMOTE_ENDPOINTS: str = os.getenv('REMOTE_ENDPOINTS', 'http://localhost:8080')  # Comma-separated, round-robin
+    REMOTE_MODEL: str = os.getenv('REMOTE_MODEL', 'default')  # Model name sent to the server
+    REMOTE_API_KEY: str = os.getenv('REMOTE_API_KEY', '')
+    REMOTE_TIMEOUT: float = float(os.getenv('REMOTE_TIMEOUT', '120'))  # Upper bound; adapts to recent p95
+    REMOTE_POOL_SIZE: int = int(os.getenv('REMOTE_POOL_SIZE', '10'))  # Keep-alive connections per endpoint
+    HF_BACKGROUND_WARMUP: bool = os.getenv('HF_BACKGROUND_WARMUP', 'true').lower() == 'true'
     
     # File Paths
     PROJECT_ROOT: Path = Path(__file__).parent.parent.parent
@@ -33,7 +69,41 @@ class Config:
     # Search Configuration
     MAX_SEARCH_RESULTS: int = 5
     SEARCH_TIMEOUT: int = 10
-    
+
+    # Circuit Breaker Configuration
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+    BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv('BREAKER_RECOVERY_TIMEOUT', '30'))  # Seconds before a probe
+    GEMINI_TIMEOUT: float = float(os.getenv('GEMINI_TIMEOUT', '60'))  # Upper bound; adapts to recent p95
+    ESV_TIMEOUT: float = float(os.getenv('ESV_TIMEOUT', '10'))
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', '3.0'))
+    ADAPTIVE_TIMEOUT_MIN: float = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', '2.0'))
+
+    # Gemini Quota Configuration (defaults match the free tier)
+    GEMINI_RPM: int = int(os.getenv('GEMINI_RPM', '15'))  # Per API key
+    GEMINI_TPM: int = int(os.getenv('GEMINI_TPM', '1000000'))
+    GEMINI_KEY_SELECTION: str = os.getenv('GEMINI_KEY_SELECTION', 'least_loaded')  # or round_robin
+    RATE_LIMIT_MAX_WAIT: float = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))  # Seconds in the queue before giving up
+
+    # Usage Ledger Configuration (prices in USD per million tokens)
+    USAGE_LEDGER_ENABLED: bool = os.getenv('USAGE_LEDGER_ENABLED', 'true').lower() == 'true'  # Append to cache/usage_ledger.jsonl
+    GEMINI_INPUT_PRICE: float = float(os.getenv('GEMINI_INPUT_PRICE', '0.075'))
+    GEMINI_OUTPUT_PRICE: float = float(os.getenv('GEMINI_OUTPUT_PRICE', '0.30'))
+
+    # Response Cache Configuration
+    RESPONSE_CACHE_ENABLED: bool = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+    RESPONSE_CACHE_MAX_MB: int = int(os.getenv('RESPONSE_CACHE_MAX_MB', '100'))
+    RESPONSE_CACHE_DEFAULT_TTL: int = int(os.getenv('RESPONSE_CACHE_DEFAULT_TTL', '86400'))
+
+    # Semantic Cache Configuration (near-duplicate teaching/search topics)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85'))  # Cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '500'))
+    SEMANTIC_CACHE_TTL: int = int(os.getenv('SEMANTIC_CACHE_TTL', str(7 * 24 * 3600)))
+
+    # Console Configuration
+    STREAM_OUTPUT: bool = os.getenv('STREAM_OUTPUT', 'true').lower() == 'true'
+
     # Session Configuration
     MAX_MEMORY_ITEMS: int = 100
     MAX_FAVORITES: int = 50
@@ -63,6 +133,12 @@ class Config:
                 print("API keys saved to .env file.")
         return True
     
+    @classmethod
+    def gemini_api_keys(cls) -> List[str]:
+        """Configured Gemini keys; GEMINI_API_KEYS takes precedence over GEMINI_API_KEY"""
+        keys = [key.strip() for key in cls.GEMINI_API_KEYS.split(',') if key.strip()]
+        return keys or [cls.GEMINI_API_KEY]
+
     @classmethod
     def ensure_directories(cls) -> None:
         """Ensure required directories exist"""
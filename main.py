@@ -1,6 +1,7 @@
 import os
 import argparse
 import sys
+import time
 import logging
 from rich.console import Console
 
@@ -52,6 +53,18 @@ def resolve_command(input_cmd: str) -> Optional[str]:
             
     return None
 
+def report_first_command_latency(agent: BibleAgent, command: str, seconds: float):
+    """Log how long the first real command took and how much warm-up covered"""
+    message = f"First command '{command}' took {seconds:.2f}s"
+    if agent.warmup is not None:
+        stats = agent.warmup.get_stats()
+        if stats["ready"]:
+            message += f" (model warmed up in background: load {stats['load_seconds'] or 0:.2f}s"
+            message += f", warm-up {stats['warmup_seconds'] or 0:.2f}s)"
+        else:
+            message += " (background warm-up still running)"
+    logging.info(message)
+
 def main():
     """Main entry point with enhanced error handling"""
     console = Console()
@@ -71,21 +84,31 @@ def main():
     
     try:
         agent = BibleAgent()
-        if not agent._models:
+        if not agent._models and agent.warmup is None:
             raise Exception("Model system failed to initialize")
             
         # Show the welcome message with creative styling
         print(agent.console_formatter.format_welcome())
         
+        first_command = True
         while True:
             try:
                 command = input("\nEnter command (h for help): ").strip()
                 resolved_cmd = resolve_command(command)
                 
                 if resolved_cmd:
+                    started = time.perf_counter()
                     result = agent.process_command(resolved_cmd)
+                    if first_command and resolved_cmd not in ("help", "exit"):
+                        first_command = False
+                        report_first_command_latency(agent, resolved_cmd, time.perf_counter() - started)
                     if result is None and resolved_cmd != "reflect":
-                        console.print("[bold red]Command failed. Please check the logs and try again.[/bold red]")
+                        unavailable = agent.unavailable_dependencies()
+                        if unavailable:
+                            console.print(f"[bold yellow]{', '.join(unavailable)} unavailable right now. "
+                                          f"Please try again shortly.[/bold yellow]")
+                        else:
+                            console.print("[bold red]Command failed. Please check the logs and try again.[/bold red]")
                 else:
                     console.print("[bold red]Unknown command. Type 'h' for help.[/bold red]")
             except KeyboardInterrupt:
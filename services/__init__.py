@@ -4,15 +4,24 @@ This module is the entry point for the services package.
 
 from .llm.hf_llm import HuggingFaceLLM
 from .llm.gemini_llm import GeminiLLM
+from .llm.onnx_llm import OnnxLLM
+from .llm.remote_llm import RemoteLLM
+from .llm.hedged_llm import HedgedLLM
 from .llm.model_types import ModelType, TaskType
 from .serper_service import SerperService
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
 
 __version__ = '0.1.0'
 
 __all__ = [
     'HuggingFaceLLM',
     'GeminiLLM',
+    'OnnxLLM',
+    'RemoteLLM',
+    'HedgedLLM',
     'ModelType',
     'TaskType',
-    'SerperService'
+    'SerperService',
+    'CircuitBreaker',
+    'CircuitOpenError'
 ]
\ No newline at end of file
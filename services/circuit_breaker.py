@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from config.settings import Config
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+def is_outage(error: Exception) -> bool:
+    """Client errors (4xx other than 429) are our fault, not the dependency's"""
+    # requests errors carry the response; google.api_core errors carry the HTTP code
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code
+    return not (status is not None and 400 <= status < 500 and status != 429)
+
+class CircuitBreaker:
+    """Circuit breaker with half-open probing and a latency-derived timeout.
+
+    After failure_threshold consecutive failures the breaker opens and
+    calls fail fast with CircuitOpenError. Once recovery_timeout has
+    passed, one probe call is let through (half-open): success closes the
+    breaker, failure opens it again.
+
+    timeout() returns a multiple of the recent p95 latency, clamped to
+    [min_timeout, max_timeout], so a slow but healthy dependency keeps
+    working while a hung one is cut off early. Calls of very different
+    length (a short extraction vs. a long teaching answer) pass a latency
+    profile so each is timed against its own window.
+    """
+
+    _registry: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, name: str, max_timeout: float,
+                 failure_threshold: Optional[int] = None,
+                 recovery_timeout: Optional[float] = None,
+                 min_timeout: Optional[float] = None,
+                 timeout_multiplier: Optional[float] = None,
+                 window: int = 100):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.recovery_timeout = recovery_timeout or Config.BREAKER_RECOVERY_TIMEOUT
+        self.min_timeout = min(min_timeout or Config.ADAPTIVE_TIMEOUT_MIN, max_timeout)
+        self.timeout_multiplier = timeout_multiplier or Config.ADAPTIVE_TIMEOUT_MULTIPLIER
+
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+        self.window = window
+        self.latencies: Dict[Optional[str], deque] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str, **kwargs) -> "CircuitBreaker":
+        """Get the process-wide breaker for a dependency, creating it on first use"""
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = cls(name, **kwargs)
+            return cls._registry[name]
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """State, trip counts and timeouts of every registered breaker"""
+        with cls._registry_lock:
+            breakers = list(cls._registry.values())
+        return {breaker.name: breaker.get_stats() for breaker in breakers}
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> BreakerState:
+        if self._state == BreakerState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = BreakerState.HALF_OPEN
+            self._probe_in_flight = False
+            logging.info(f"Circuit {self.name} half-open, probing")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time"""
+        with self._lock:
+            state = self._current_state()
+            if state == BreakerState.CLOSED:
+                return True
+            if state == BreakerState.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: Optional[float] = None, profile: Optional[str] = None):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if latency is not None:
+                self.latencies.setdefault(profile, deque(maxlen=self.window)).append(latency)
+            if self._state != BreakerState.CLOSED:
+                logging.info(f"Circuit {self.name} closed")
+            self._state = BreakerState.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            probe_failed = self._state == BreakerState.HALF_OPEN
+            if probe_failed or (self._state == BreakerState.CLOSED
+                                and self.consecutive_failures >= self.failure_threshold):
+                self._state = BreakerState.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.trips += 1
+                logging.warning(
+                    f"Circuit {self.name} opened after {self.consecutive_failures} failures; "
+                    f"failing fast for {self.recovery_timeout:.0f}s"
+                )
+
+    def release_probe(self):
+        """Give up a call without an outcome (e.g. cancelled), freeing the half-open probe slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def timeout(self, profile: Optional[str] = None) -> float:
+        """Request timeout from the profile's recent latency; max_timeout until there is enough history"""
+        with self._lock:
+            latencies = self.latencies.get(profile, ())
+            if len(latencies) < 5:
+                return self.max_timeout
+            p95 = float(np.percentile(np.fromiter(latencies, dtype=float), 95))
+        return max(self.min_timeout, min(self.max_timeout, p95 * self.timeout_multiplier))
+
+    def _before_call(self):
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_error(self, error: Exception):
+        """Count an exception from the dependency, ignoring client errors"""
+        if is_outage(error):
+            self.record_failure()
+        else:
+            # The dependency answered; the request itself was bad
+            self.record_success()
+
+    def call(self, fn: Callable[..., Any], *args, latency_profile: Optional[str] = None, **kwargs) -> Any:
+        """Run fn through the breaker; raises CircuitOpenError while open"""
+        self._before_call()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_error(e)
+            raise
+        except BaseException:
+            self.release_probe()
+            raise
+        self.record_success(time.perf_counter() - start, latency_profile)
+        return result
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args,
+                    latency_profile: Optional[str] = None, **kwargs) -> Any:
+        """Async variant of call()"""
+        self._before_call()
+        start = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            self.record_error(e)
+            raise
+        except BaseException:
+            # Cancelled (hedge loser, abandoned waiter): says nothing about the dependency
+            self.release_probe()
+            raise
+        self.record_success(time.perf_counter() - start, latency_profile)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = self.state
+        timeout = self.timeout()
+        with self._lock:
+            return {
+                "state": state.value,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "successes": self.successes,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "timeout": timeout
+            }
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Coroutine, Optional
+
+class BackgroundLoop:
+    """One long-lived event loop running in a daemon thread.
+
+    Async clients (grpc.aio channels in particular) stay bound to the loop
+    they were first used on, so a fresh asyncio.run() per command breaks
+    them from the second command on. Synchronous code hands coroutines to
+    this loop instead and waits for the result.
+    """
+
+    _shared: Optional["BackgroundLoop"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, name: str = "background-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls) -> "BackgroundLoop":
+        """Get the process-wide loop"""
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared.loop.is_closed():
+                cls._shared = cls()
+            return cls._shared
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and wait for its result.
+
+        The caller's contextvars (request priority, usage command) carry over
+        to the coroutine.
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() would deadlock when called from its own loop")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Timed out or interrupted while waiting; do not leave the work running
+            future.cancel()
+            raise
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        if self._thread.is_alive():
+            logging.warning("Background event loop did not stop in time")
+            return
+        self.loop.close()
@@ -0,0 +1,146 @@
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.settings import Config
+from services.circuit_breaker import BreakerState, CircuitBreaker
+from .rate_limiter import RateLimiter, is_throttled
+
+def is_auth_error(error: Exception) -> bool:
+    """Whether an API error means the key itself is invalid or lacks access"""
+    code = getattr(error, "code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code in (401, 403) or (code == 400 and "API_KEY_INVALID" in str(error))
+
+@dataclass
+class ApiKey:
+    """One key (or project) with its own client, quota and health"""
+    label: str
+    key: str = field(repr=False)
+    client: Any
+    limiter: RateLimiter
+    breaker: CircuitBreaker
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    disabled: bool = False
+
+    @property
+    def available(self) -> bool:
+        return not self.disabled and self.breaker.state != BreakerState.OPEN
+
+    @property
+    def has_quota(self) -> bool:
+        return self.limiter.get_stats()["requests_available"] >= 1
+
+    def load(self) -> Tuple[int, float]:
+        """Sort key for least-loaded selection: busy keys and drained quotas sort last"""
+        stats = self.limiter.get_stats()
+        return self.in_flight + stats["queue_depth"], -stats["requests_available"]
+
+class ApiKeyPool:
+    """Spread requests across several API keys.
+
+    Each key gets its own client, rate limiter (its own per-minute quota)
+    and circuit breaker, so throughput scales with the number of keys.
+    Keys whose breaker is open (repeated failures or 429s) are skipped
+    until a half-open probe succeeds; keys rejected as invalid are
+    removed for the rest of the process.
+    """
+
+    _shared: Dict[Tuple[str, ...], "ApiKeyPool"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, keys: Sequence[str], client_factory: Callable[[str], Any],
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 strategy: Optional[str] = None, name: str = "gemini"):
+        if not keys:
+            raise ValueError("ApiKeyPool needs at least one key")
+        self.strategy = (strategy or Config.GEMINI_KEY_SELECTION).lower()
+        if self.strategy not in ("least_loaded", "round_robin"):
+            raise ValueError(f"Unknown key selection strategy: {self.strategy}")
+        rpm = requests_per_minute or Config.GEMINI_RPM
+        tpm = tokens_per_minute or Config.GEMINI_TPM
+
+        unique_keys = list(dict.fromkeys(keys))
+        self.keys: List[ApiKey] = []
+        for index, key in enumerate(unique_keys):
+            # A single key keeps the plain dependency name
+            label = name if len(unique_keys) == 1 else f"{name}#{index + 1}"
+            self.keys.append(ApiKey(
+                label=label,
+                key=key,
+                client=client_factory(key),
+                limiter=RateLimiter.shared(label, rpm, tpm),
+                breaker=CircuitBreaker.get(label, max_timeout=Config.GEMINI_TIMEOUT)
+            ))
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, keys: Sequence[str], client_factory: Callable[[str], Any], **kwargs) -> "ApiKeyPool":
+        """Get the process-wide pool for a set of keys"""
+        with cls._shared_lock:
+            pool_key = tuple(keys)
+            if pool_key not in cls._shared:
+                cls._shared[pool_key] = cls(keys, client_factory, **kwargs)
+            return cls._shared[pool_key]
+
+    def select(self) -> Optional[ApiKey]:
+        """Pick a healthy key, or None when every key is disabled or tripped"""
+        with self._lock:
+            candidates = [key for key in self.keys if key.available]
+            if not candidates:
+                return None
+            # Keys drained by a 429 sit out until their quota refills, unless all are drained
+            candidates = [key for key in candidates if key.has_quota] or candidates
+            if self.strategy == "round_robin":
+                return candidates[next(self._round_robin) % len(candidates)]
+            return min(candidates, key=ApiKey.load)
+
+    @contextmanager
+    def use(self, key: ApiKey) -> Iterator[ApiKey]:
+        """Count a request against a key while it is in flight"""
+        with self._lock:
+            key.in_flight += 1
+            key.requests += 1
+        try:
+            yield key
+        finally:
+            with self._lock:
+                key.in_flight -= 1
+
+    def record_error(self, key: ApiKey, error: Exception):
+        """Drain the key's quota on 429; drop it for good if the key was rejected"""
+        with self._lock:
+            key.failures += 1
+        if is_throttled(error):
+            key.limiter.penalize()
+        elif is_auth_error(error) and not key.disabled:
+            key.disabled = True
+            logging.error(f"Removed {key.label} from the key pool: {str(error)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self.keys)
+        return {
+            "strategy": self.strategy,
+            "available": sum(1 for key in keys if key.available),
+            "keys": {
+                key.label: {
+                    "available": key.available,
+                    "disabled": key.disabled,
+                    "in_flight": key.in_flight,
+                    "requests": key.requests,
+                    "failures": key.failures,
+                    "breaker": key.breaker.state.value,
+                    "queue_depth": key.limiter.get_stats()["queue_depth"]
+                }
+                for key in keys
+            }
+        }
@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+_STOP = object()
+
+@dataclass
+class _Request:
+    item: Any
+    future: Future = field(default_factory=Future)
+
+class MicroBatchScheduler:
+    """Merge concurrent single-item requests into micro-batches.
+
+    A background thread waits for the first request, then collects more for
+    up to `max_wait` seconds or until `max_batch_size` is reached, and hands
+    the whole batch to `batch_fn`. Each caller gets its own result back
+    through a Future. With `group_key`, requests collected together are
+    split so each batch only holds items with the same key.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait: float = 0.02,
+                 name: str = "micro-batch",
+                 group_key: Optional[Callable[[Any], Hashable]] = None):
+        self.batch_fn = batch_fn
+        self.group_key = group_key
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        # Orders submit() against close() so nothing is queued behind _STOP
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item and return a Future for its result"""
+        request = _Request(item=item)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            self._queue.put(request)
+        return request.future
+
+    def _run(self):
+        try:
+            self._serve()
+        finally:
+            self._fail_leftovers()
+
+    def _serve(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            for group in self._groups(batch):
+                self._dispatch(group)
+
+    def _groups(self, batch: List[_Request]) -> List[List[_Request]]:
+        """Split a collected batch by group_key, keeping arrival order within each group"""
+        if self.group_key is None:
+            return [batch]
+        groups: Dict[Hashable, List[_Request]] = {}
+        for request in batch:
+            groups.setdefault(self.group_key(request.item), []).append(request)
+        return list(groups.values())
+
+    def _fail_leftovers(self):
+        """Fail requests still queued when the worker stops so no caller waits forever"""
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not _STOP and not request.future.done():
+                request.future.set_exception(RuntimeError("Scheduler is closed"))
+
+    def _dispatch(self, batch: List[_Request]):
+        self.batches += 1
+        self.requests += len(batch)
+        logging.debug(f"Dispatching micro-batch of {len(batch)}")
+        try:
+            results = self.batch_fn([request.item for request in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize()
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting requests and finish queued work"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout)
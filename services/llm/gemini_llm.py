@@ -1,53 +1,320 @@
-from .model_types import ModelType
-import google.generativeai as genai
+from .model_types import ModelType, TaskType
+from .response_cache import ResponseCache
+from .streaming import StreamMetrics
+from .api_key_pool import ApiKey, ApiKeyPool, is_auth_error
+from .rate_limiter import is_throttled
+from .generation_profiles import DEFAULT_PROFILE, profile_for
+from .usage_ledger import UsageLedger
+from config.settings import Config
+from services.circuit_breaker import CircuitOpenError
+from services.single_flight import SingleFlight
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions
+from google.api_core.retry import Retry, if_exception_type
+from google.api_core.retry_async import AsyncRetry
+import asyncio
 import logging
-from typing import Optional
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Only transient server errors are retried on the same key. Quota (429) and key
+# errors go straight back to the caller, which penalizes the key's rate limiter
+# or moves on to another key instead of retrying into the same quota.
+RETRYABLE_ERRORS = if_exception_type(exceptions.ServiceUnavailable, exceptions.InternalServerError)
+
+class KeyClients:
+    """Generative service clients bound to one API key.
+
+    A grpc.aio channel belongs to the event loop it was created on, so the
+    async client is built lazily for each running loop rather than up front.
+    """
 
-class GeminiLLM:
     def __init__(self, api_key: str):
+        self._api_key = api_key
+        self.sync = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self._async: Dict[int, Tuple[asyncio.AbstractEventLoop, glm.GenerativeServiceAsyncClient]] = {}
+        self._lock = threading.Lock()
+
+    def for_running_loop(self) -> glm.GenerativeServiceAsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Clients of finished loops are unusable; the loop reference keeps ids from being reused
+            for loop_id, (owner, _) in list(self._async.items()):
+                if owner.is_closed():
+                    del self._async[loop_id]
+            if id(loop) not in self._async:
+                self._async[id(loop)] = (
+                    loop, glm.GenerativeServiceAsyncClient(client_options={"api_key": self._api_key})
+                )
+            return self._async[id(loop)][1]
+
+class GeminiLLM:
+    def __init__(self, api_key: Optional[str] = None, api_keys: Optional[List[str]] = None):
+        """Use one API key, or spread requests over several (see ApiKeyPool)"""
         try:
             self.model_type = ModelType.GEMINI
             self.model_id = "gemini-1.5-flash"
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            keys = [key for key in (api_keys or [api_key]) if key]
+            if not keys:
+                raise ValueError("No Gemini API key configured")
+            # Used when no task is given; otherwise the task's generation profile applies
+            self.generation_config = DEFAULT_PROFILE.gemini_config()
+            self.safety_settings = {
+                "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+                "HARM_CATEGORY_HATE_SPEECH": "BLOCK_ONLY_HIGH",
+                "HARM_CATEGORY_HARASSMENT": "BLOCK_ONLY_HIGH",
+                "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_ONLY_HIGH"
+            }
+            self.cache = ResponseCache.shared() if Config.RESPONSE_CACHE_ENABLED else None
+            self.stream_metrics = deque(maxlen=100)
+            self.single_flight = SingleFlight.shared()
+            self.usage_ledger = UsageLedger.shared()
+            self.key_pool = ApiKeyPool.shared(keys, KeyClients)
             logging.info(f"Initialized {self.model_id}")
-            
+
         except Exception as e:
             logging.error(f"Failed to initialize Gemini: {str(e)}")
             raise
-        
-    def generate(self, prompt: str) -> Optional[str]:
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'top_p': 0.8,
-                    'top_k': 40,
-                    'max_output_tokens': 2048,
-                },
-                safety_settings={
-                    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
-                    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_ONLY_HIGH",
-                    "HARM_CATEGORY_HARASSMENT": "BLOCK_ONLY_HIGH",
-                    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_ONLY_HIGH"
-                }
-            )
-            
-            # Check if response has content
-            if not response.parts:
-                logging.error("No content in response")
+
+    def _generation_config(self, task: Optional[TaskType]) -> dict:
+        return profile_for(task).gemini_config() if task else self.generation_config
+
+    def _cache_lookup(self, prompt: str, config: dict) -> Tuple[Optional[str], Optional[str]]:
+        """Return (cache_key, cached_response) for a prompt"""
+        if not self.cache:
+            return None, None
+        cache_key = ResponseCache.make_key(prompt, self.model_id, config)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.debug(f"Response cache hit for {self.model_id}")
+        return cache_key, cached
+
+    def _request(self, prompt: str, config: dict) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(
+            model=f"models/{self.model_id}",
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+            generation_config=glm.GenerationConfig(**config),
+            safety_settings=[
+                glm.SafetySetting(category=category, threshold=threshold)
+                for category, threshold in self.safety_settings.items()
+            ]
+        )
+
+    def _request_options(self, key: ApiKey, task: Optional[TaskType] = None,
+                         asynchronous: bool = False, timeout: Optional[float] = None) -> dict:
+        # The client's default retry policy keeps retrying for minutes; bound it too.
+        # Short extraction calls and long teaching answers are timed separately.
+        if timeout is None:
+            timeout = key.breaker.timeout(profile_for(task).name)
+        retry_class = AsyncRetry if asynchronous else Retry
+        return {"timeout": timeout, "retry": retry_class(predicate=RETRYABLE_ERRORS, timeout=timeout)}
+
+    @staticmethod
+    def _parts(response) -> list:
+        return list(response.candidates[0].content.parts) if response.candidates else []
+
+    def _extract_content(self, response) -> Optional[str]:
+        # Check if response has content
+        parts = self._parts(response)
+        if not parts:
+            logging.error("No content in response")
+            return None
+
+        # Get text from first part
+        content = parts[0].text
+        if not content:
+            logging.error("Empty content in response")
+            return None
+
+        logging.debug(f"Generated content length: {len(content)}")
+        return content
+
+    def _estimate_tokens(self, prompt: str, config: dict) -> int:
+        # ~4 characters per token; the full output budget is reserved and refunded afterwards
+        return len(prompt) // 4 + config['max_output_tokens']
+
+    def _select_key(self) -> Optional[ApiKey]:
+        key = self.key_pool.select()
+        if key is None:
+            logging.warning("No Gemini API key available (all throttled, failing or removed)")
+        return key
+
+    def _settle_quota(self, key: ApiKey, estimated: int, response=None, error: Optional[Exception] = None):
+        """Report real token usage, or the error, back to the key's quota and health"""
+        if error is not None:
+            self.key_pool.record_error(key, error)
+        usage = getattr(response, 'usage_metadata', None)
+        key.limiter.reconcile(estimated, getattr(usage, 'total_token_count', None) or None)
+
+    def _retry_on_other_key(self, error: Exception) -> bool:
+        # Quota and key errors are specific to one key; another key may succeed
+        return len(self.key_pool.keys) > 1 and (is_throttled(error) or is_auth_error(error))
+
+    def _record_usage(self, response, task: Optional[TaskType], latency: float):
+        usage = getattr(response, 'usage_metadata', None)
+        self.usage_ledger.record(
+            self.model_id, task,
+            getattr(usage, 'prompt_token_count', None),
+            getattr(usage, 'candidates_token_count', None),
+            latency
+        )
+
+    def _flight_key(self, prompt: str, config: dict) -> tuple:
+        return ("gemini", ResponseCache.make_key(prompt, self.model_id, config))
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        config = self._generation_config(task)
+        cache_key, cached = self._cache_lookup(prompt, config)
+        if cached is not None:
+            return cached
+        # Identical concurrent prompts share one API call
+        return self.single_flight.do(self._flight_key(prompt, config), self._generate_uncached, prompt, cache_key, task)
+
+    def _generate_uncached(self, prompt: str, cache_key: Optional[str],
+                           task: Optional[TaskType]) -> Optional[str]:
+        config = self._generation_config(task)
+        estimated = self._estimate_tokens(prompt, config)
+        for _ in self.key_pool.keys:
+            key = self._select_key()
+            if key is None or not key.limiter.acquire(estimated, timeout=Config.RATE_LIMIT_MAX_WAIT):
                 return None
-                
-            # Get text from first part
-            content = response.parts[0].text
-            if not content:
-                logging.error("Empty content in response")
+            try:
+                started = time.perf_counter()
+                with self.key_pool.use(key):
+                    response = key.breaker.call(
+                        key.client.sync.generate_content,
+                        self._request(prompt, config),
+                        latency_profile=profile_for(task).name,
+                        **self._request_options(key, task)
+                    )
+                self._settle_quota(key, estimated, response)
+                self._record_usage(response, task, time.perf_counter() - started)
+
+                content = self._extract_content(response)
+                if content and cache_key:
+                    self.cache.set(cache_key, content, task=task)
+                return content
+
+            except CircuitOpenError as e:
+                key.limiter.reconcile(estimated, 0)
+                logging.warning(str(e))
+            except Exception as e:
+                self._settle_quota(key, estimated, error=e)
+                logging.error(f"Gemini generation error ({key.label}): {str(e)}")
+                if not self._retry_on_other_key(e):
+                    return None
+        return None
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Asyncio-native variant of generate()"""
+        config = self._generation_config(task)
+        cache_key, cached = self._cache_lookup(prompt, config)
+        if cached is not None:
+            return cached
+        return await self.single_flight.ado(
+            self._flight_key(prompt, config), self._agenerate_uncached, prompt, cache_key, task
+        )
+
+    async def _agenerate_uncached(self, prompt: str, cache_key: Optional[str],
+                                  task: Optional[TaskType]) -> Optional[str]:
+        config = self._generation_config(task)
+        estimated = self._estimate_tokens(prompt, config)
+        for _ in self.key_pool.keys:
+            key = self._select_key()
+            if key is None or not await key.limiter.aacquire(estimated, timeout=Config.RATE_LIMIT_MAX_WAIT):
                 return None
-                
-            logging.debug(f"Generated content length: {len(content)}")
-            return content
-            
-        except Exception as e:
-            logging.error(f"Gemini generation error: {str(e)}")
-            return None
\ No newline at end of file
+            try:
+                started = time.perf_counter()
+                with self.key_pool.use(key):
+                    response = await key.breaker.acall(
+                        key.client.for_running_loop().generate_content,
+                        self._request(prompt, config),
+                        latency_profile=profile_for(task).name,
+                        **self._request_options(key, task, asynchronous=True)
+                    )
+                self._settle_quota(key, estimated, response)
+                self._record_usage(response, task, time.perf_counter() - started)
+
+                content = self._extract_content(response)
+                if content and cache_key:
+                    self.cache.set(cache_key, content, task=task)
+                return content
+
+            except CircuitOpenError as e:
+                key.limiter.reconcile(estimated, 0)
+                logging.warning(str(e))
+            except Exception as e:
+                self._settle_quota(key, estimated, error=e)
+                logging.error(f"Gemini async generation error ({key.label}): {str(e)}")
+                if not self._retry_on_other_key(e):
+                    return None
+        return None
+
+    def generate_stream(self, prompt: str, task: Optional[TaskType] = None) -> Iterator[str]:
+        """Yield response text chunks as they arrive from the API"""
+        metrics = StreamMetrics(model_id=self.model_id)
+        self.stream_metrics.append(metrics)
+
+        config = self._generation_config(task)
+        cache_key, cached = self._cache_lookup(prompt, config)
+        if cached is not None:
+            metrics.mark_chunk(cached)
+            metrics.finish()
+            yield cached
+            return
+
+        estimated = self._estimate_tokens(prompt, config)
+        key = self._select_key()
+        if key is None or not key.limiter.acquire(estimated, timeout=Config.RATE_LIMIT_MAX_WAIT):
+            metrics.finish()
+            return
+        if not key.breaker.allow_request():
+            logging.warning(f"{key.label} is unavailable (circuit open)")
+            key.limiter.reconcile(estimated, 0)
+            metrics.finish()
+            return
+
+        parts = []
+        usage = None
+        chunk = None
+        started = time.perf_counter()
+        with self.key_pool.use(key):
+            try:
+                # A whole stream runs far longer than one request's p95, so it
+                # gets the breaker's ceiling rather than the adaptive timeout
+                response = key.client.sync.stream_generate_content(
+                    self._request(prompt, config),
+                    **self._request_options(key, timeout=key.breaker.max_timeout)
+                )
+
+                for chunk in response:
+                    chunk_parts = self._parts(chunk)
+                    if not chunk_parts:
+                        continue
+                    text = chunk_parts[0].text
+                    if not text:
+                        continue
+                    usage = getattr(chunk, 'usage_metadata', None)
+                    metrics.mark_chunk(text, getattr(usage, 'candidates_token_count', None) or None)
+                    parts.append(text)
+                    yield text
+
+                # Whole-stream time would skew the per-request timeout, so it is not sampled
+                key.breaker.record_success()
+                key.limiter.reconcile(estimated, getattr(usage, 'total_token_count', None) or None)
+                self._record_usage(chunk, task, time.perf_counter() - started)
+            except GeneratorExit:
+                # The caller stopped reading; the dependency was answering
+                key.breaker.record_success()
+                raise
+            except Exception as e:
+                key.breaker.record_error(e)
+                self._settle_quota(key, estimated, error=e)
+                logging.error(f"Gemini streaming error: {str(e)}")
+
+        metrics.finish()
+        content = "".join(parts)
+        if content and cache_key:
+            self.cache.set(cache_key, content, task=task)
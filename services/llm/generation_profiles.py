@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import Config
+from .model_types import TaskType
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Sampling settings and output cap for one kind of task"""
+    name: str
+    max_output_tokens: int
+    temperature: float
+    top_p: float = 0.8
+    top_k: int = 40
+    stop_sequences: Tuple[str, ...] = ()
+
+    def gemini_config(self) -> Dict[str, Any]:
+        config = {
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'max_output_tokens': self.max_output_tokens,
+        }
+        if self.stop_sequences:
+            config['stop_sequences'] = list(self.stop_sequences)
+        return config
+
+    def openai_params(self) -> Dict[str, Any]:
+        """Parameters for an OpenAI-compatible chat completion request"""
+        params = {
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'max_tokens': self.max_output_tokens,
+        }
+        if self.stop_sequences:
+            params['stop'] = list(self.stop_sequences)
+        return params
+
+DEFAULT_PROFILE = GenerationProfile("default", Config.MAX_TOKENS, Config.TEMPERATURE)
+
+PROFILES: Dict[TaskType, GenerationProfile] = {
+    # Long form: a full teaching, possibly as one structured JSON response
+    TaskType.TEACHING: GenerationProfile("teaching", 2048, 0.7),
+    TaskType.REFLECTION: GenerationProfile("reflection", 1024, 0.8),
+    TaskType.VERSE_ANALYSIS: GenerationProfile("verse_analysis", 768, 0.7),
+    TaskType.ANALYSIS: GenerationProfile("analysis", 1024, 0.4),
+    TaskType.SEARCH: GenerationProfile("search", 512, 0.3),
+    # Lists of references or key points: short, deterministic, no trailing essay
+    TaskType.EXTRACTION: GenerationProfile("extraction", 256, 0.0, top_p=1.0, top_k=1,
+                                           stop_sequences=("\n\n\n",)),
+}
+
+def profile_for(task: Optional[TaskType]) -> GenerationProfile:
+    return PROFILES.get(task, DEFAULT_PROFILE)
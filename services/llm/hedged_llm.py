@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .model_types import ModelType, TaskType
+from config.settings import Config
+from services.single_flight import uncoalesced
+
+class HedgedLLM:
+    """Send a request along a chain of backends, hedging slow ones.
+
+    The first backend gets the request. If it fails or returns nothing the
+    next one is tried straight away; with hedging enabled, a backend that
+    has not answered within its observed p95 latency also gets company
+    from the next one. The first usable answer wins and the requests
+    still running are cancelled. The chain may repeat a backend to send
+    a second request to it.
+    """
+
+    def __init__(self, chain: List[ModelType], model_getter: Callable[[ModelType], Any],
+                 selector: Any = None, hedge: bool = True, min_delay: Optional[float] = None):
+        if not chain:
+            raise ValueError("HedgedLLM needs at least one backend")
+        self.chain = chain
+        self.model_getter = model_getter
+        self.selector = selector
+        self.hedge = hedge
+        self.min_delay = Config.HEDGE_MIN_DELAY if min_delay is None else min_delay
+        self.model_type = chain[0]
+        self.model_id = "hedged:" + ",".join(m.name for m in chain)
+
+        self.wins = Counter()
+        self.hedged_requests = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(chain), thread_name_prefix="hedge")
+
+    def _hedge_delay(self, model_type: ModelType, task: Optional[TaskType]) -> float:
+        """How long to wait for a backend before hedging: its p95 latency"""
+        if self.selector is None:
+            return self.min_delay
+        _, p95 = self.selector.get_latency_profile(model_type, task)
+        return max(self.min_delay, p95)
+
+    def _next_delay(self, position: int, task: Optional[TaskType]) -> Optional[float]:
+        """None (wait for completion) when there is nothing left to hedge with"""
+        if not self.hedge or position + 1 >= len(self.chain):
+            return None
+        return self._hedge_delay(self.chain[position], task)
+
+    @staticmethod
+    def _usable(text: Optional[str]) -> bool:
+        return bool(text and text.strip())
+
+    def _record(self, model: Any, model_type: ModelType, success: bool,
+                started: float, task: Optional[TaskType]):
+        # Local models already report through InferenceStats
+        if self.selector is not None and model is not None and not hasattr(model, "inference_stats"):
+            self.selector.update_performance(model_type, success, time.perf_counter() - started, task=task)
+
+    def _finish(self, position: int, model_type: ModelType):
+        with self._stats_lock:
+            self.wins[f"{position}:{model_type.name}"] += 1
+        if position:
+            logging.info(f"{model_type.name} (backend {position + 1} of {len(self.chain)}) answered first")
+
+    def _call(self, position: int, model_type: ModelType, prompt: str,
+              task: Optional[TaskType]) -> Tuple[Any, Optional[str]]:
+        # Loading happens here so a slow local load never delays the hedge timer
+        model = self.model_getter(model_type)
+        if model is None:
+            return None, None
+        if position == 0:
+            return model, model.generate(prompt, task=task)
+        # A hedge that joined the identical call it is racing would just wait on it
+        with uncoalesced():
+            return model, model.generate(prompt, task=task)
+
+    async def _acall(self, position: int, model_type: ModelType, prompt: str,
+                     task: Optional[TaskType]) -> Tuple[Any, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        model = await loop.run_in_executor(self._executor, self.model_getter, model_type)
+        if model is None:
+            return None, None
+        if position == 0:
+            return model, await model.agenerate(prompt, task=task)
+        with uncoalesced():
+            return model, await model.agenerate(prompt, task=task)
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        pending: Dict[Future, Tuple[int, ModelType, float]] = {}
+        position = -1
+
+        def launch() -> bool:
+            nonlocal position
+            if position + 1 >= len(self.chain):
+                return False
+            position += 1
+            model_type = self.chain[position]
+            # Carry context (e.g. request priority) into the worker thread
+            future = self._executor.submit(
+                contextvars.copy_context().run, self._call, position, model_type, prompt, task
+            )
+            pending[future] = (position, model_type, time.perf_counter())
+            return True
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=self._next_delay(position, task), return_when=FIRST_COMPLETED)
+            if not done:
+                with self._stats_lock:
+                    self.hedged_requests += 1
+                logging.debug(f"Hedging {self.chain[position].name} after its p95 latency")
+                launch()
+                continue
+
+            for future in done:
+                index, model_type, started = pending.pop(future)
+                try:
+                    model, text = future.result()
+                except Exception as e:
+                    logging.error(f"{model_type.name} generation error: {str(e)}")
+                    model, text = None, None
+                self._record(model, model_type, self._usable(text), started, task)
+                if self._usable(text):
+                    # Threads cannot be interrupted; losers that already started finish unobserved
+                    for loser in pending:
+                        loser.cancel()
+                    self._finish(index, model_type)
+                    return text
+
+            if not pending and launch():
+                with self._stats_lock:
+                    self.fallbacks += 1
+
+        with self._stats_lock:
+            self.failures += 1
+        logging.error(f"All backends in {self.model_id} failed")
+        return None
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Async variant of generate(); losing requests are cancelled"""
+        pending: Dict[asyncio.Task, Tuple[int, ModelType, float]] = {}
+        position = -1
+
+        def launch() -> bool:
+            nonlocal position
+            if position + 1 >= len(self.chain):
+                return False
+            position += 1
+            model_type = self.chain[position]
+            request = asyncio.create_task(self._acall(position, model_type, prompt, task))
+            pending[request] = (position, model_type, time.perf_counter())
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=self._next_delay(position, task), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    with self._stats_lock:
+                        self.hedged_requests += 1
+                    launch()
+                    continue
+
+                for request in done:
+                    index, model_type, started = pending.pop(request)
+                    try:
+                        model, text = request.result()
+                    except Exception as e:
+                        logging.error(f"{model_type.name} async generation error: {str(e)}")
+                        model, text = None, None
+                    self._record(model, model_type, self._usable(text), started, task)
+                    if self._usable(text):
+                        self._finish(index, model_type)
+                        return text
+
+                if not pending and launch():
+                    with self._stats_lock:
+                        self.fallbacks += 1
+        finally:
+            for loser in pending:
+                loser.cancel()
+
+        with self._stats_lock:
+            self.failures += 1
+        logging.error(f"All backends in {self.model_id} failed")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "chain": [m.name for m in self.chain],
+                "hedge": self.hedge,
+                "wins": dict(self.wins),
+                "hedged_requests": self.hedged_requests,
+                "fallbacks": self.fallbacks,
+                "failures": self.failures
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,152 @@
-from transformers import AutoTokenizer, pipeline, AutoModelForCausalLM
+from transformers import AutoConfig, AutoTokenizer, pipeline, AutoModelForCausalLM, TextIteratorStreamer
 import torch
+import asyncio
+import copy
+import json
 import logging
-from typing import Optional
-from .model_types import ModelType
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .model_types import ModelType, TaskType
+from .response_cache import ResponseCache
+from .streaming import StreamMetrics
+from .batch_scheduler import MicroBatchScheduler
+from .inference_stats import GenerationTimer, InferenceStats
+from config.settings import Config
+
+try:
+    from torch._dynamo.exc import TorchDynamoException
+except ImportError:  # torch < 2.0 has no compiler
+    TorchDynamoException = ()
+
+# Improved prompt engineering
+PROMPT_PREFIX = """You are a biblical teaching assistant providing direct spiritual insights.
+
+Share biblical teachings about the topic below, including:
+- Key Biblical principles with accurate scripture references
+- Clear spiritual insights from God's Word
+- Practical applications for daily life
+- Examples from Biblical narratives
+
+Remember to speak directly to the reader and maintain a pastoral tone.
+
+"""
+PROMPT_SUFFIX = "Topic: {prompt}\n"
+
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+def cpu_supports_bf16() -> bool:
+    """Check for native bf16 kernels (AVX512-BF16/AMX) on this CPU"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+def resolve_precision(mode: str) -> str:
+    """Map a configured precision mode to one this machine can run"""
+    mode = (mode or "fp32").lower()
+    if mode not in PRECISION_MODES:
+        logging.warning(f"Unknown precision mode '{mode}', using fp32")
+        return "fp32"
+    if mode == "bf16" and not cpu_supports_bf16():
+        logging.warning("CPU lacks native bf16 support, using fp32")
+        return "fp32"
+    return mode
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool
+}
+
+def mmap_safetensors(path: Path) -> Dict[str, torch.Tensor]:
+    """Map a safetensors file copy-on-write and return tensors viewing the mapping.
+
+    Pages are read from the page cache on first touch instead of being
+    copied into anonymous memory up front.
+    """
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=path.stat().st_size)
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, _ = info["data_offsets"]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        # Storage offsets count whole elements; a misaligned tensor cannot be viewed in place
+        if (data_start + begin) % itemsize:
+            raise ValueError(f"Tensor {name} in {path.name} is not aligned to its {itemsize}-byte dtype")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(
+            storage, (data_start + begin) // itemsize, info["shape"]
+        )
+    return tensors
+
+def compiled_decoder(model: Any, compile_config: Any) -> Any:
+    """Shallow copy of a model, sharing its weights, whose one-token decode steps run compiled.
+
+    generate() auto-compiles only on GPU, so on CPU the decode step is wired
+    in with torch.compile here. Prefill (variable length) stays eager, and
+    the original model is untouched for the other generation paths.
+    """
+    compiled_forward = torch.compile(model.forward, **compile_config.to_dict())
+
+    def forward(*args, input_ids: Optional[torch.Tensor] = None, **kwargs):
+        step = compiled_forward if input_ids is not None and input_ids.shape[-1] == 1 else model.forward
+        return step(*args, input_ids=input_ids, **kwargs)
+
+    decoder = copy.copy(model)
+    decoder.forward = forward
+    return decoder
+
+def is_compile_or_shape_error(error: Exception) -> bool:
+    """Failures that mean the compiled static-cache path cannot serve this model"""
+    if isinstance(error, TorchDynamoException):
+        return True
+    message = str(error).lower()
+    return isinstance(error, (RuntimeError, IndexError, ValueError)) and any(
+        word in message for word in ("shape", "size", "out of bounds", "out of range")
+    )
+
+def resolve_model_path(model_id: str) -> Path:
+    """Local directory for a model id, fetching safetensors shards if needed"""
+    if Path(model_id).is_dir():
+        return Path(model_id)
+    from huggingface_hub import snapshot_download
+    return Path(snapshot_download(model_id, allow_patterns=["*.json", "*.safetensors"]))
+
+@dataclass
+class AssistedStats:
+    """Forward-pass counts for one assisted generation"""
+    new_tokens: int
+    target_forwards: int
+    draft_forwards: int
+    seconds: float
+
+    @property
+    def acceptance_rate(self) -> float:
+        if not self.draft_forwards:
+            return 0.0
+        accepted = self.new_tokens - self.target_forwards
+        return max(0.0, min(1.0, accepted / self.draft_forwards))
+
+    @property
+    def tokens_per_target_forward(self) -> float:
+        """Upper bound on speedup over plain decoding (one token per pass)"""
+        return self.new_tokens / self.target_forwards if self.target_forwards else 0.0
 
 class HuggingFaceLLM:
     def __init__(self, model_id: str = None):
         try:
+            model_id = model_id or Config.HF_MODEL_ID
+
             # Set model type and configuration
             if "phi-2" in model_id:
                 self.model_type = ModelType.PHI
@@ -16,82 +156,585 @@ class HuggingFaceLLM:
             else:
                 self.model_type = ModelType.PHI
                 
-            self.model_id = model_id or "microsoft/phi-2"
+            self.model_id = model_id
             self.device = "cpu"
             
-            # Load model with optimizations
-            model = AutoModelForCausalLM.from_pretrained(
-                self.model_id,
-                torch_dtype=torch.float32,
-                low_cpu_mem_usage=True,
-                use_cache=True,
-                device_map={"": self.device}
-            )
+            self.precision = resolve_precision(Config.HF_PRECISION)
+            torch_dtype = torch.bfloat16 if self.precision == "bf16" else torch.float32
+
+            model = self._load_model(self.model_id, torch_dtype)
             
             tokenizer = AutoTokenizer.from_pretrained(
                 self.model_id,
                 use_fast=True  # Use faster tokenizer
             )
+
+            # Small draft model for assisted (speculative) decoding
+            self.draft_model = self._load_draft_model(tokenizer, torch_dtype)
+            self.assisted_stats = deque(maxlen=100)
+            self._assist_lock = threading.Lock()
             
             # Configure pipeline with optimizations
             self.pipe = pipeline(
                 "text-generation",
                 model=model,
                 tokenizer=tokenizer,
-                torch_dtype=torch.float32,
+                torch_dtype=torch_dtype,
                 device_map={"": self.device},
                 max_length=2048,
                 trust_remote_code=True,
                 # Performance optimizations
                 framework="pt",
-                batch_size=1,
+                batch_size=Config.HF_BATCH_SIZE,
                 use_cache=True
             )
             
-            logging.info(f"Successfully loaded {self.model_id} with optimizations")
+            self.generation_kwargs = {
+                'max_new_tokens': 256,
+                'do_sample': True,
+                'temperature': 0.8,  # Slightly increased for more natural language
+                'top_p': 0.92,
+                'top_k': 50,
+                'repetition_penalty': 1.2,
+                'no_repeat_ngram_size': 3
+            }
+            self.cache = ResponseCache.shared() if Config.RESPONSE_CACHE_ENABLED else None
+            self.stream_metrics = deque(maxlen=100)
+            self.inference_stats = InferenceStats.shared()
+            self._prefix_ids = None
+            self._prefix_kv = None
+            self._prefix_lock = threading.Lock()
+
+            # Fixed-size KV cache with a compiled decode step, reused across calls
+            self.static_cache = None
+            self.compile_config = None
+            self.static_model = None
+            self._static_lock = threading.Lock()
+            if Config.HF_STATIC_CACHE:
+                if self.draft_model is not None:
+                    logging.warning("Static KV cache is not supported with assisted decoding, ignoring HF_STATIC_CACHE")
+                else:
+                    self._init_static_cache(model)
+
+            # Merge concurrent generate() calls into shared forward passes; one
+            # task per batch, so a batch shares its generation profile and is
+            # recorded under that task
+            self.scheduler = None
+            if Config.HF_MICRO_BATCHING:
+                self.scheduler = MicroBatchScheduler(
+                    self._generate_micro_batch,
+                    max_batch_size=Config.HF_MICRO_BATCH_MAX_SIZE,
+                    max_wait=Config.HF_MICRO_BATCH_MAX_WAIT_MS / 1000,
+                    name=f"micro-batch-{self.model_id}",
+                    group_key=lambda item: item[1]
+                )
+
+            logging.info(f"Successfully loaded {self.model_id} ({self.precision}) with optimizations")
             
         except Exception as e:
             logging.error(f"Failed to initialize model: {str(e)}")
             raise
 
-    def generate(self, prompt: str) -> Optional[str]:
+    def _load_model(self, model_id: str, torch_dtype: torch.dtype):
+        model = None
+        if Config.HF_MMAP_WEIGHTS:
+            try:
+                model = self._load_model_mmap(model_id, torch_dtype)
+            except Exception as e:
+                logging.warning(f"Memory-mapped load of {model_id} failed, using from_pretrained: {str(e)}")
+
+        if model is None:
+            # Load model with optimizations
+            model = AutoModelForCausalLM.from_pretrained(
+                model_id,
+                torch_dtype=torch_dtype,
+                low_cpu_mem_usage=True,
+                use_cache=True,
+                device_map={"": self.device}
+            )
+
+        if self.precision == "int8":
+            # Dynamic quantization: int8 weights, activations quantized on the fly
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return model
+
+    def _load_model_mmap(self, model_id: str, torch_dtype: torch.dtype):
+        """Build the model without allocating weights, then point it at mapped shards.
+
+        Parameters whose checkpoint dtype already matches torch_dtype stay
+        backed by the file mapping; others are converted (and so copied).
+        """
+        from accelerate import init_empty_weights
+
+        path = resolve_model_path(model_id)
+        shards = sorted(path.glob("*.safetensors"))
+        if not shards:
+            raise FileNotFoundError(f"No safetensors shards for {model_id}")
+
+        config = AutoConfig.from_pretrained(path)
+        config.use_cache = True
+        # Parameters go on the meta device; buffers computed at init stay real
+        with init_empty_weights(include_buffers=False):
+            model = AutoModelForCausalLM.from_config(config, torch_dtype=torch_dtype)
+
+        state_dict = {}
+        for shard in shards:
+            for name, tensor in mmap_safetensors(shard).items():
+                state_dict[name] = tensor if tensor.dtype == torch_dtype or not tensor.is_floating_point() else tensor.to(torch_dtype)
+        model.load_state_dict(state_dict, strict=False, assign=True)
+        model.tie_weights()
+
+        missing = [name for name, param in model.named_parameters() if param.is_meta]
+        if missing:
+            raise ValueError(f"{len(missing)} parameters not found in checkpoint (e.g. {missing[0]})")
+        logging.info(f"Memory-mapped {len(shards)} safetensors shard(s) for {model_id}")
+        return model.eval()
+
+    def _init_static_cache(self, model):
         try:
-            # Improved prompt engineering
-            formatted_prompt = f"""You are a biblical teaching assistant providing direct spiritual insights.
+            # Needs transformers>=4.56; the dynamic-cache paths work on older releases
+            from transformers import CompileConfig, StaticCache
+            static_cache = StaticCache(config=model.config, max_cache_len=Config.HF_STATIC_CACHE_MAX_LENGTH)
+        except (ImportError, TypeError) as e:
+            logging.warning(f"Static KV cache needs transformers>=4.56, ignoring HF_STATIC_CACHE: {e}")
+            return
+        self.static_cache = static_cache
+        # Fixed shapes: the decode step compiles once and every later call reuses it
+        self.compile_config = CompileConfig(fullgraph=False, dynamic=False, mode="default")
+        self.static_model = compiled_decoder(model, self.compile_config)
+        logging.info(f"Static KV cache enabled ({Config.HF_STATIC_CACHE_MAX_LENGTH} tokens, compiled decode)")
 
-Topic: {prompt}
+    def _use_static_cache(self, inputs: Dict[str, Any], max_new_tokens: int) -> bool:
+        return (
+            self.static_cache is not None
+            and inputs["input_ids"].shape[1] + max_new_tokens <= Config.HF_STATIC_CACHE_MAX_LENGTH
+        )
 
-Share biblical teachings about this topic, including:
-- Key Biblical principles with accurate scripture references
-- Clear spiritual insights from God's Word
-- Practical applications for daily life
-- Examples from Biblical narratives
+    def _generate_static(self, inputs: Dict[str, Any], **overrides) -> Optional[torch.Tensor]:
+        """Generate into the static cache with the compiled forward.
+
+        Returns None after switching to eager execution if compilation or
+        the compiled call fails.
+        """
+        try:
+            with self._static_lock, torch.inference_mode():
+                self.static_cache.reset()
+                return self.static_model.generate(
+                    **inputs,
+                    **{**self.generation_kwargs, **overrides},
+                    past_key_values=self.static_cache,
+                    # The decode step is already compiled
+                    disable_compile=True,
+                    pad_token_id=self.pipe.tokenizer.eos_token_id
+                )
+        except Exception as e:
+            if not is_compile_or_shape_error(e):
+                logging.warning(f"Static-cache generation failed, retrying eagerly: {str(e)}")
+                return None
+            logging.warning(f"Compiled static-cache generation failed, falling back to eager: {str(e)}")
+            self.static_cache = None
+            self.static_model = None
+            return None
+
+    def warmup(self):
+        """Run one short uncached generation so first-call costs are paid up front"""
+        tokenizer = self.pipe.tokenizer
+        if self.static_cache is not None:
+            # Compiles the decode step once for all later calls
+            inputs = self._model_inputs("warm-up", use_prefix_cache=False)
+            start = time.perf_counter()
+            if self._generate_static(inputs, max_new_tokens=4, do_sample=False) is not None:
+                logging.info(f"Compiled static-cache decode for {self.model_id} in {time.perf_counter() - start:.1f}s")
+                return
+
+        # Also prefills the prompt prefix KV-cache
+        inputs = self._model_inputs("warm-up", use_prefix_cache=self.draft_model is None)
+        with torch.inference_mode():
+            self.pipe.model.generate(
+                **inputs,
+                max_new_tokens=4,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id
+            )
+
+    def _format_prompt(self, prompt: str) -> str:
+        # Constant instructions come first so their KV-cache can be reused
+        return PROMPT_PREFIX + PROMPT_SUFFIX.format(prompt=prompt)
+
+    def _prefix_cache(self) -> Tuple[torch.Tensor, Any]:
+        """Prefill the constant prompt prefix once and keep its past_key_values"""
+        if self._prefix_kv is None:
+            with self._prefix_lock:
+                if self._prefix_kv is None:
+                    prefix_ids = self.pipe.tokenizer(PROMPT_PREFIX, return_tensors="pt").input_ids.to(self.device)
+                    with torch.inference_mode():
+                        outputs = self.pipe.model(input_ids=prefix_ids, use_cache=True)
+                    self._prefix_ids = prefix_ids
+                    self._prefix_kv = outputs.past_key_values
+                    logging.info(f"Cached {prefix_ids.shape[1]}-token prompt prefix for {self.model_id}")
+        return self._prefix_ids, self._prefix_kv
+
+    def _model_inputs(self, prompt: str, use_prefix_cache: bool = True) -> Dict[str, Any]:
+        """Build generate() inputs, reusing the prefix KV-cache when enabled"""
+        tokenizer = self.pipe.tokenizer
+        if not (Config.HF_PREFIX_CACHE and use_prefix_cache):
+            return dict(tokenizer(
+                self._format_prompt(prompt), return_tensors="pt", return_token_type_ids=False
+            ).to(self.device))
+
+        prefix_ids, prefix_kv = self._prefix_cache()
+        suffix_ids = tokenizer(
+            PROMPT_SUFFIX.format(prompt=prompt),
+            add_special_tokens=False,
+            return_tensors="pt"
+        ).input_ids.to(self.device)
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            # generate() extends the cache in place, so each call gets its own copy
+            "past_key_values": copy.deepcopy(prefix_kv)
+        }
+
+    def _record_inference(self, timer: GenerationTimer, task: Optional[TaskType],
+                          inputs: Dict[str, Any], output_ids: Optional[torch.Tensor] = None,
+                          success: bool = True):
+        """Turn a finished generate() call into an InferenceRecord"""
+        input_ids = inputs["input_ids"]
+        attention_mask = inputs.get("attention_mask")
+        generated = None
+        if output_ids is not None:
+            generated = (output_ids.shape[1] - input_ids.shape[1]) * output_ids.shape[0]
+        self.inference_stats.record(timer.finish(
+            self.model_id, self.model_type, task,
+            prompt_tokens=int(attention_mask.sum()) if attention_mask is not None else input_ids.numel(),
+            generated_tokens=generated,
+            cached_prompt_tokens=self._prefix_ids.shape[1] if "past_key_values" in inputs else 0,
+            batch_size=input_ids.shape[0],
+            success=success
+        ))
+
+    def _generate_direct(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Generate with model.generate, prefilling only the uncached part of the prompt"""
+        tokenizer = self.pipe.tokenizer
+        # Assisted and static-cache generation keep their own caches
+        inputs = self._model_inputs(
+            prompt, use_prefix_cache=self.draft_model is None and self.static_cache is None
+        )
+        timer = GenerationTimer()
+        try:
+            output_ids = None
+            if self.draft_model is not None:
+                output_ids = self._generate_assisted(inputs, logits_processor=timer.processors())
+            elif self._use_static_cache(inputs, self.generation_kwargs['max_new_tokens']):
+                output_ids = self._generate_static(inputs, logits_processor=timer.processors())
+
+            if output_ids is None:
+                with torch.inference_mode():
+                    output_ids = self.pipe.model.generate(
+                        **inputs,
+                        **self.generation_kwargs,
+                        logits_processor=timer.processors(),
+                        pad_token_id=tokenizer.eos_token_id
+                    )
+        except Exception:
+            self._record_inference(timer, task, inputs, success=False)
+            raise
+
+        self._record_inference(timer, task, inputs, output_ids)
+        text = tokenizer.decode(output_ids[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return self._clean_response(text) or None
+
+    def _load_draft_model(self, tokenizer, torch_dtype: torch.dtype) -> Optional[Any]:
+        """Config.HF_DRAFT_MODEL_ID, if set and it shares this model's vocabulary"""
+        draft_id = Config.HF_DRAFT_MODEL_ID
+        if not draft_id:
+            return None
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(draft_id, use_fast=True)
+        except Exception as e:
+            logging.warning(f"Draft model {draft_id} unavailable: {str(e)}")
+            return None
+        # Draft tokens are verified by id, so both models must tokenize identically
+        if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+            logging.info(f"Not using draft model {draft_id} with {self.model_id}: tokenizer vocabularies differ")
+            return None
+        draft_model = self._load_model(draft_id, torch_dtype)
+        logging.info(f"Assisted decoding enabled with draft model {draft_id}")
+        return draft_model
+
+    def _generate_assisted(self, inputs: Dict[str, Any], **overrides) -> torch.Tensor:
+        """Draft model proposes tokens, the main model verifies them.
+
+        Forward passes of both models are counted to derive the acceptance
+        rate: every verification step yields its accepted draft tokens plus
+        one token from the main model.
+        """
+        counts = {"target": 0, "draft": 0}
+        # Hooks fire for every caller of the shared models, so only count under the lock
+        with self._assist_lock:
+            hooks = [
+                self.pipe.model.register_forward_hook(lambda *_: counts.__setitem__("target", counts["target"] + 1)),
+                self.draft_model.register_forward_hook(lambda *_: counts.__setitem__("draft", counts["draft"] + 1))
+            ]
+            try:
+                with torch.inference_mode():
+                    start = time.perf_counter()
+                    output_ids = self.pipe.model.generate(
+                        **inputs,
+                        **{**self.generation_kwargs, **overrides},
+                        assistant_model=self.draft_model,
+                        pad_token_id=self.pipe.tokenizer.eos_token_id
+                    )
+                    elapsed = time.perf_counter() - start
+            finally:
+                for hook in hooks:
+                    hook.remove()
+
+        stats = AssistedStats(
+            new_tokens=output_ids.shape[1] - inputs["input_ids"].shape[1],
+            target_forwards=counts["target"],
+            draft_forwards=counts["draft"],
+            seconds=elapsed
+        )
+        self.assisted_stats.append(stats)
+        logging.debug(
+            f"Assisted decoding: {stats.new_tokens} tokens, "
+            f"acceptance {stats.acceptance_rate:.0%}, "
+            f"{stats.tokens_per_target_forward:.2f} tokens per main-model pass"
+        )
+        return output_ids
+
+    def get_assisted_stats(self) -> Dict[str, float]:
+        """Aggregate acceptance rate and throughput over recent assisted calls"""
+        records = list(self.assisted_stats)
+        if not records:
+            return {}
+        new_tokens = sum(r.new_tokens for r in records)
+        target = sum(r.target_forwards for r in records)
+        draft = sum(r.draft_forwards for r in records)
+        seconds = sum(r.seconds for r in records)
+        return {
+            "calls": len(records),
+            "acceptance_rate": max(0.0, min(1.0, (new_tokens - target) / draft)) if draft else 0.0,
+            "tokens_per_target_forward": new_tokens / target if target else 0.0,
+            "tokens_per_second": new_tokens / seconds if seconds else 0.0
+        }
+
+    def _clean_response(self, text: str) -> str:
+        return text.split("Generated using")[0].strip()
+
+    def _cache_lookup(self, formatted_prompt: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return (cache_key, cached_response) for a formatted prompt"""
+        if not self.cache:
+            return None, None
+        cache_key = ResponseCache.make_key(formatted_prompt, self.model_id, self.generation_kwargs)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.debug(f"Response cache hit for {self.model_id}")
+        return cache_key, cached
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        try:
+            formatted_prompt = self._format_prompt(prompt)
+            cache_key, cached = self._cache_lookup(formatted_prompt)
+            if cached is not None:
+                return cached
+
+            if self.scheduler:
+                # Padded batches skip the prefix KV-cache (see _generate_padded)
+                text = self.scheduler.submit((formatted_prompt, task)).result()
+                if text and cache_key:
+                    self.cache.set(cache_key, text, task=task)
+                return text
+
+            if Config.HF_PREFIX_CACHE or self.draft_model is not None or self.static_cache is not None:
+                text = self._generate_direct(prompt, task=task)
+                if text and cache_key:
+                    self.cache.set(cache_key, text, task=task)
+                return text
 
-Remember to speak directly to the reader and maintain a pastoral tone.
-"""
             # Optimize generation parameters
+            timer = GenerationTimer()
             response = self.pipe(
                 formatted_prompt,
-                max_new_tokens=256,
-                do_sample=True,
-                temperature=0.8,  # Slightly increased for more natural language
-                top_p=0.92,
-                top_k=50,
-                repetition_penalty=1.2,
-                no_repeat_ngram_size=3,
+                **self.generation_kwargs,
+                logits_processor=timer.processors(),
                 pad_token_id=self.pipe.tokenizer.eos_token_id
             )
+            self.inference_stats.record(timer.finish(
+                self.model_id, self.model_type, task,
+                prompt_tokens=len(self.pipe.tokenizer.encode(formatted_prompt))
+            ))
             
             if response and len(response) > 0:
                 # Clean up response
                 text = response[0]['generated_text']
                 # Remove prompt and any meta-instructions
-                text = text.replace(formatted_prompt, "").strip()
-                text = text.split("Generated using")[0].strip()
+                text = self._clean_response(text.replace(formatted_prompt, ""))
+                if cache_key:
+                    self.cache.set(cache_key, text, task=task)
                 return text
                 
             return None
             
         except Exception as e:
             logging.error(f"Generation error: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    def generate_stream(self, prompt: str, task: Optional[TaskType] = None) -> Iterator[str]:
+        """Yield decoded text chunks while generation runs in a background thread"""
+        metrics = StreamMetrics(model_id=self.model_id)
+        self.stream_metrics.append(metrics)
+
+        formatted_prompt = self._format_prompt(prompt)
+        cache_key, cached = self._cache_lookup(formatted_prompt)
+        if cached is not None:
+            metrics.mark_chunk(cached)
+            metrics.finish()
+            yield cached
+            return
+
+        tokenizer = self.pipe.tokenizer
+        parts = []
+        try:
+            inputs = self._model_inputs(prompt)
+            timer = GenerationTimer()
+            streamer = TextIteratorStreamer(
+                tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=Config.HF_STREAM_TIMEOUT
+            )
+            errors = []
+
+            def run():
+                # The streamer must always be ended, or the loop below waits forever
+                try:
+                    self.pipe.model.generate(
+                        **inputs,
+                        **self.generation_kwargs,
+                        logits_processor=timer.processors(),
+                        streamer=streamer,
+                        pad_token_id=tokenizer.eos_token_id
+                    )
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    streamer.end()
+
+            worker = threading.Thread(target=run, name="hf-stream", daemon=True)
+            worker.start()
+
+            try:
+                for text in streamer:
+                    if not text:
+                        continue
+                    metrics.mark_chunk(text)
+                    parts.append(text)
+                    yield text
+            except queue.Empty:
+                raise TimeoutError(f"No streamed output for {Config.HF_STREAM_TIMEOUT:.0f}s")
+            worker.join()
+            if errors:
+                raise errors[0]
+            self._record_inference(timer, task, inputs)
+
+        except Exception as e:
+            logging.error(f"Streaming generation error: {str(e)}")
+
+        content = self._clean_response("".join(parts))
+        metrics.finish(tokens=len(tokenizer.encode(content, add_special_tokens=False)) if content else 0)
+        if content and cache_key:
+            self.cache.set(cache_key, content, task=task)
+
+    def generate_batch(self, prompts: List[str], task: Optional[TaskType] = None,
+                       batch_size: Optional[int] = None) -> List[Optional[str]]:
+        """Generate responses for many prompts using padded, length-bucketed batches.
+
+        Results are returned in input order; failed prompts yield None.
+        """
+        batch_size = batch_size or Config.HF_BATCH_SIZE
+        results: List[Optional[str]] = [None] * len(prompts)
+
+        pending = []
+        for index, prompt in enumerate(prompts):
+            formatted_prompt = self._format_prompt(prompt)
+            cache_key, cached = self._cache_lookup(formatted_prompt)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, formatted_prompt, cache_key))
+
+        if not pending:
+            return results
+
+        # Bucket by token length so each batch pads to a similar length
+        lengths = [len(ids) for ids in self.pipe.tokenizer([p for _, p, _ in pending])["input_ids"]]
+        pending = [item for _, item in sorted(zip(lengths, pending), key=lambda pair: pair[0])]
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                texts = self._generate_padded([formatted_prompt for _, formatted_prompt, _ in batch], task=task)
+            except Exception as e:
+                logging.error(f"Batch generation error: {str(e)}")
+                continue
+
+            for (index, _, cache_key), text in zip(batch, texts):
+                results[index] = text
+                if text and cache_key:
+                    self.cache.set(cache_key, text, task=task)
+
+        return results
+
+    def _generate_micro_batch(self, items: List[Tuple[str, Optional[TaskType]]]) -> List[Optional[str]]:
+        """Scheduler batch function; the scheduler groups items so they share one task"""
+        return self._generate_padded([formatted_prompt for formatted_prompt, _ in items], task=items[0][1])
+
+    def _generate_padded(self, formatted_prompts: List[str],
+                         task: Optional[TaskType] = None) -> List[Optional[str]]:
+        """Run one padded generate() call over a batch of formatted prompts.
+
+        The prefix KV-cache is not used here: left padding shifts the prefix
+        to a different position in every row, so its cached keys would not line up.
+        """
+        tokenizer = self.pipe.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models must be padded on the left for generation; the
+        # tokenizer is shared, so put its setting back for other callers
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            inputs = tokenizer(
+                formatted_prompts, return_tensors="pt", padding=True, return_token_type_ids=False
+            ).to(self.device)
+        finally:
+            tokenizer.padding_side = padding_side
+        timer = GenerationTimer()
+        with torch.inference_mode():
+            output_ids = self.pipe.model.generate(
+                **inputs,
+                **self.generation_kwargs,
+                logits_processor=timer.processors(),
+                pad_token_id=tokenizer.pad_token_id
+            )
+        self._record_inference(timer, task, inputs, output_ids)
+
+        new_tokens = output_ids[:, inputs["input_ids"].shape[1]:]
+        texts = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        return [self._clean_response(text) or None for text in texts]
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Run generate() in a worker thread so the event loop stays responsive.
+
+        to_thread() carries the caller's contextvars (usage command, request
+        priority) into the thread; run_in_executor() would drop them.
+        """
+        return await asyncio.to_thread(self.generate, prompt, task=task)
+
+    def close(self):
+        """Stop background threads so the model can be released"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+            self.scheduler = None
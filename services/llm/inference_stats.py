@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from transformers import LogitsProcessor, LogitsProcessorList
+
+from .model_types import ModelType, TaskType
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return 0.0
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+@dataclass
+class InferenceRecord:
+    """Measurements for one local generate() call"""
+    model_id: str
+    model_type: Optional[ModelType]
+    task: Optional[TaskType]
+    prompt_tokens: int
+    generated_tokens: int
+    prefill_seconds: float
+    decode_seconds: float
+    rss_delta_mb: float = 0.0
+    cached_prompt_tokens: int = 0
+    batch_size: int = 1
+    success: bool = True
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def total_seconds(self) -> float:
+        return self.prefill_seconds + self.decode_seconds
+
+    @property
+    def tokens_per_second(self) -> float:
+        """End-to-end throughput, prefill included"""
+        return self.generated_tokens / self.total_seconds if self.total_seconds > 0 else 0.0
+
+    @property
+    def decode_tokens_per_second(self) -> float:
+        # The first token of each sequence comes out of the prefill pass
+        decoded = self.generated_tokens - self.batch_size
+        return decoded / self.decode_seconds if self.decode_seconds > 0 and decoded > 0 else 0.0
+
+class GenerationTimer(LogitsProcessor):
+    """Split a generate() call into prefill and decode time.
+
+    generate() runs logits processors once per step, the first time right
+    after the forward pass over the prompt, so that call marks the end of
+    prefill. The processor leaves the scores untouched.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_step_at: Optional[float] = None
+        self.steps = 0
+        self._peak_rss_before = peak_rss_mb()
+
+    def __call__(self, input_ids, scores):
+        if self.first_step_at is None:
+            self.first_step_at = time.perf_counter()
+        self.steps += 1
+        return scores
+
+    def processors(self) -> LogitsProcessorList:
+        return LogitsProcessorList([self])
+
+    def finish(self, model_id: str, model_type: Optional[ModelType], task: Optional[TaskType],
+               prompt_tokens: int, generated_tokens: Optional[int] = None,
+               success: bool = True, **kwargs) -> InferenceRecord:
+        finished_at = time.perf_counter()
+        first_step_at = self.first_step_at or finished_at
+        return InferenceRecord(
+            model_id=model_id,
+            model_type=model_type,
+            task=task,
+            prompt_tokens=prompt_tokens,
+            generated_tokens=self.steps if generated_tokens is None else generated_tokens,
+            prefill_seconds=first_step_at - self.started_at,
+            decode_seconds=finished_at - first_step_at,
+            rss_delta_mb=max(0.0, peak_rss_mb() - self._peak_rss_before),
+            success=success,
+            **kwargs
+        )
+
+class InferenceStats:
+    """Recent inference records, queryable per model and task.
+
+    Subscribers (e.g. ModelSelector) are called with every new record.
+    """
+
+    _shared: Optional["InferenceStats"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_records: int = 1000):
+        self._records = deque(maxlen=max_records)
+        self._subscribers: List[Callable[[InferenceRecord], Any]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "InferenceStats":
+        """Get the process-wide stats instance"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def subscribe(self, callback: Callable[[InferenceRecord], Any]):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[InferenceRecord], Any]):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def record(self, record: InferenceRecord):
+        with self._lock:
+            self._records.append(record)
+            subscribers = list(self._subscribers)
+        logging.debug(
+            f"{record.model_id}: {record.prompt_tokens} prompt + {record.generated_tokens} new tokens, "
+            f"prefill {record.prefill_seconds:.2f}s, decode {record.decode_seconds:.2f}s "
+            f"({record.decode_tokens_per_second:.1f} tokens/s), peak RSS +{record.rss_delta_mb:.0f}MB"
+        )
+        for callback in subscribers:
+            try:
+                callback(record)
+            except Exception as e:
+                logging.warning(f"Inference stats subscriber failed: {str(e)}")
+
+    def records(self, model_type: Optional[ModelType] = None,
+                task: Optional[TaskType] = None) -> List[InferenceRecord]:
+        with self._lock:
+            records = list(self._records)
+        return [
+            r for r in records
+            if (model_type is None or r.model_type == model_type) and (task is None or r.task == task)
+        ]
+
+    def summary(self, model_type: Optional[ModelType] = None,
+                task: Optional[TaskType] = None) -> Dict[str, Any]:
+        """Aggregate successful calls; empty dict when nothing was recorded"""
+        records = self.records(model_type, task)
+        if not records:
+            return {}
+        ok = [r for r in records if r.success]
+        summary = {"calls": len(records), "failures": len(records) - len(ok)}
+        if not ok:
+            return summary
+
+        latencies = np.array([r.total_seconds for r in ok])
+        generated = sum(r.generated_tokens for r in ok)
+        decoded = sum(max(0, r.generated_tokens - r.batch_size) for r in ok)
+        decode_seconds = sum(r.decode_seconds for r in ok)
+        summary.update({
+            "prompt_tokens": float(np.mean([r.prompt_tokens for r in ok])),
+            "generated_tokens": float(np.mean([r.generated_tokens for r in ok])),
+            "prefill_seconds": float(np.mean([r.prefill_seconds for r in ok])),
+            "decode_seconds": float(np.mean([r.decode_seconds for r in ok])),
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "tokens_per_second": generated / latencies.sum() if latencies.sum() > 0 else 0.0,
+            "decode_tokens_per_second": decoded / decode_seconds if decode_seconds > 0 else 0.0,
+            "max_rss_delta_mb": max(r.rss_delta_mb for r in ok)
+        })
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
@@ -1,12 +1,20 @@
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, Iterator, Deque, Tuple, Iterable
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from pathlib import Path
+import atexit
+import json
 import logging
+import os
+import random
+import threading
+import time
 import numpy as np
 from dataclasses import dataclass, field
-from collections import defaultdict
-from .model_types import ModelType, TaskType  # Updated import
-from .gemini_llm import GeminiLLM
-from .hf_llm import HuggingFaceLLM
+from collections import defaultdict, deque
+from .model_types import ModelType, TaskType, parse_model_types  # Updated import
+from .inference_stats import InferenceRecord, InferenceStats
+from services.model_manager import LOCAL_MODELS, ModelManager
 from config.settings import Config
 
 @dataclass
@@ -16,25 +24,126 @@ class ModelCapability:
     max_tokens: int
     avg_latency: float
     base_weight: float = 1.0
+    memory_mb: float = 0.0  # Estimated resident size before the first load
+
+def _window() -> Deque:
+    return deque(maxlen=Config.ROUTING_METRICS_WINDOW)
 
 @dataclass
 class ModelMetrics:
+    """Lifetime counters plus ring buffers of the most recent calls"""
     success_count: int = 0
     fail_count: int = 0
-    latencies: List[float] = field(default_factory=list)
+    latencies: Deque[float] = field(default_factory=_window)
+    tokens_per_second: Deque[float] = field(default_factory=_window)
+    outcomes: Deque[bool] = field(default_factory=_window)
     last_success: Optional[datetime] = None
 
+    def record(self, success: bool, latency: float, tokens_per_second: Optional[float] = None):
+        if success:
+            self.success_count += 1
+            self.last_success = datetime.now()
+        else:
+            self.fail_count += 1
+        self.outcomes.append(success)
+        # Failed calls can return early; only successful ones say how fast a backend is
+        if success:
+            self.latencies.append(latency)
+        if tokens_per_second is not None:
+            self.tokens_per_second.append(tokens_per_second)
+
+    def recent_outcomes(self) -> Tuple[int, int]:
+        successes = sum(self.outcomes)
+        return successes, len(self.outcomes) - successes
+
+    def latency_percentiles(self) -> Optional[Tuple[float, float]]:
+        """(p50, p95) over the window, None before any successful call"""
+        if not self.latencies:
+            return None
+        p50, p95 = np.percentile(np.fromiter(self.latencies, dtype=float), [50, 95])
+        return float(p50), float(p95)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "success_count": self.success_count,
+            "fail_count": self.fail_count,
+            "latencies": list(self.latencies),
+            "tokens_per_second": list(self.tokens_per_second),
+            "outcomes": [int(outcome) for outcome in self.outcomes],
+            "last_success": self.last_success.isoformat() if self.last_success else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelMetrics":
+        metrics = cls(
+            success_count=data.get("success_count", 0),
+            fail_count=data.get("fail_count", 0),
+            last_success=datetime.fromisoformat(data["last_success"]) if data.get("last_success") else None
+        )
+        metrics.latencies.extend(data.get("latencies", []))
+        metrics.tokens_per_second.extend(data.get("tokens_per_second", []))
+        metrics.outcomes.extend(bool(outcome) for outcome in data.get("outcomes", []))
+        return metrics
+
+class RoutedModel:
+    """Wrap a model that does not publish InferenceRecords so routed calls are measured"""
+
+    def __init__(self, model: Any, model_type: ModelType, selector: "ModelSelector"):
+        self.model = model
+        self.model_type = model_type
+        self.selector = selector
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        start = time.perf_counter()
+        result = None
+        try:
+            result = self.model.generate(prompt, task=task)
+            return result
+        finally:
+            self.selector.update_performance(
+                self.model_type, result is not None, time.perf_counter() - start, task=task
+            )
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await self.model.agenerate(prompt, task=task)
+            return result
+        finally:
+            self.selector.update_performance(
+                self.model_type, result is not None, time.perf_counter() - start, task=task
+            )
+
 class ModelSelector:
-    def __init__(self):
-        self._model_instances: Dict[ModelType, Any] = {}
+    """Route each task to one of Config.ROUTING_MODELS.
+
+    Routing is a Thompson-sampling bandit over per-(model, task) ring
+    buffers: a success rate drawn from Beta(successes + 1, failures + 1)
+    is multiplied by a latency score built from p50/p95 and by capability
+    fit. Metrics are saved to Config.CACHE_DIR so routing survives
+    restarts.
+    """
+
+    def __init__(self, metrics_path: Optional[Path] = None, model_manager: Optional[ModelManager] = None):
         self.metrics = {model_type: ModelMetrics() for model_type in ModelType}
+        self.task_metrics: Dict[Tuple[ModelType, TaskType], ModelMetrics] = defaultdict(ModelMetrics)
+        self.routing_models = parse_model_types(Config.ROUTING_MODELS or Config.MODEL_BACKEND) or [ModelType.GEMINI]
+        self.metrics_path = Path(metrics_path or Config.CACHE_DIR / "routing_metrics.json")
+        self._metrics_lock = threading.Lock()
+        self._updates_since_save = 0
+        self._rng = np.random.default_rng()
         self.capabilities = {
             ModelType.PHI: ModelCapability(
                 name="microsoft/phi-2",
                 strengths=["teaching", "reflection"],
                 max_tokens=2048,
                 avg_latency=2.0,
-                base_weight=1.0  # Default fallback
+                base_weight=1.0,  # Default fallback
+                memory_mb=11000
             ),
             ModelType.GEMINI: ModelCapability(
                 name="gemini-pro",
@@ -48,15 +157,45 @@ class ModelSelector:
                 strengths=["teaching", "reflection"],
                 max_tokens=4096,
                 avg_latency=3.0,
-                base_weight=0.7
+                base_weight=0.7,
+                memory_mb=26000
+            ),
+            ModelType.ONNX: ModelCapability(
+                name="microsoft/phi-2 (onnxruntime)",
+                strengths=["teaching", "reflection"],
+                max_tokens=2048,
+                avg_latency=1.5,
+                base_weight=0.9,
+                memory_mb=11000
+            ),
+            ModelType.REMOTE: ModelCapability(
+                name="OpenAI-compatible server",
+                strengths=["teaching", "reflection"],
+                max_tokens=2048,
+                avg_latency=2.0,
+                base_weight=0.9
             )
         }
         
-        self.performance_history = defaultdict(list)
         self.task_affinity = self._initialize_task_affinity()
         self.models: Dict[ModelType, Any] = {}
         self.default_model = ModelType.GEMINI
 
+        # Routed and directly requested models are the same instances; local
+        # ones share the manager's RAM budget
+        self.model_manager = model_manager or ModelManager()
+        self.residency = self.model_manager.residency
+        for model_type, capability in self.capabilities.items():
+            if capability.memory_mb:
+                self.residency.size_estimates.setdefault(model_type, capability.memory_mb)
+
+        # Measured local inference feeds the same metrics as manual updates
+        self.inference_stats = InferenceStats.shared()
+        self.inference_stats.subscribe(self._record_inference)
+
+        self.load_metrics()
+        atexit.register(self.save_metrics)
+
     def _initialize_task_affinity(self) -> Dict:
         return {
             TaskType.TEACHING.value: {
@@ -78,46 +217,101 @@ class ModelSelector:
                 "required_capabilities": ["reflection"],
                 "token_importance": 0.2,
                 "latency_importance": 0.1
+            },
+            TaskType.VERSE_ANALYSIS.value: {
+                "required_capabilities": ["analysis"],
+                "token_importance": 0.3,
+                "latency_importance": 0.3
+            },
+            TaskType.EXTRACTION.value: {
+                "required_capabilities": ["analysis"],
+                "token_importance": 0.1,
+                "latency_importance": 0.5
             }
         }
 
-    def select_model(self, task: TaskType, context: Optional[Dict] = None) -> ModelType:
-        """Always return Gemini for now"""
-        logging.info("Using Gemini for all tasks")
-        return ModelType.GEMINI
+    def select_model(self, task: TaskType, exclude: Iterable[ModelType] = ()) -> Optional[ModelType]:
+        """Pick the routing candidate with the best sampled score for this task"""
+        candidates = [m for m in self.routing_models if m not in set(exclude)]
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
 
-    def _initialize_model(self, model_type: ModelType) -> Optional[Any]:
-        """Initialize a new model instance"""
-        try:
-            if model_type == ModelType.PHI:
-                return HuggingFaceLLM(model_id="microsoft/phi-2")
-            elif model_type == ModelType.GEMINI:
-                return GeminiLLM(api_key=Config.GEMINI_API_KEY)
-            elif model_type == ModelType.LLAMA:
-                return HuggingFaceLLM(model_id="meta-llama/Llama-2-7b-chat-hf")
-            return None
-        except Exception as e:
-            logging.error(f"Model initialization error for {model_type}: {str(e)}")
-            return None
+        # Occasionally try a random backend so stale latency estimates get refreshed
+        if random.random() < Config.ROUTING_EXPLORATION:
+            choice = random.choice(candidates)
+            logging.debug(f"Routing {task.name} to {choice.name} (exploration)")
+            return choice
+
+        scores = {model_type: self._sample_score(model_type, task) for model_type in candidates}
+        choice = max(scores, key=scores.get)
+        logging.debug(
+            f"Routing {task.name} to {choice.name}: "
+            + ", ".join(f"{m.name}={score:.3f}" for m, score in scores.items())
+        )
+        return choice
+
+    def _sample_score(self, model_type: ModelType, task: TaskType) -> float:
+        capability = self.capabilities[model_type]
+        affinity = self.task_affinity.get(task.value, {})
+
+        # .get() rather than indexing: a defaultdict insert here would race save_metrics()
+        with self._metrics_lock:
+            metrics = self.task_metrics.get((model_type, task))
+            successes, failures = metrics.recent_outcomes() if metrics is not None else (0, 0)
+        success_sample = self._rng.beta(successes + 1, failures + 1)
+
+        p50, p95 = self.get_latency_profile(model_type, task)
+        latency_score = 1.0 / (1.0 + 0.5 * (p50 + p95))
+
+        fit = self._calculate_capability_score(
+            capability.strengths, affinity.get("required_capabilities", [])
+        )
+        # Capability is a tie-breaker; health and speed decide
+        return capability.base_weight * success_sample * latency_score * (0.75 + 0.25 * fit)
+
+    def get_latency_profile(self, model_type: ModelType, task: Optional[TaskType] = None) -> Tuple[float, float]:
+        """(p50, p95) for a model on a task, falling back to all tasks, then the nominal latency"""
+        with self._metrics_lock:
+            if task is not None:
+                metrics = self.task_metrics.get((model_type, task))
+                if metrics is not None and len(metrics.latencies) >= 3:
+                    return metrics.latency_percentiles()
+            percentiles = self.metrics[model_type].latency_percentiles()
+        if percentiles:
+            return percentiles
+        nominal = self.capabilities[model_type].avg_latency
+        return nominal, nominal
 
     def get_model(self, model_type: ModelType) -> Optional[Any]:
         """Get or create model instance"""
-        if model_type not in self._model_instances:
-            model = self._initialize_model(model_type)
-            if model:
-                self._model_instances[model_type] = model
-            else:
-                return None
-        return self._model_instances.get(model_type)
-
-    def select_and_get_model(self, task: TaskType, context: Optional[Dict] = None) -> Optional[Any]:
-        """Get initialized Gemini model"""
+        return self.model_manager.get_model(model_type)
+
+    @contextmanager
+    def use_model(self, model_type: ModelType) -> Iterator[Optional[Any]]:
+        """Get a model and keep it from being evicted while the block runs"""
+        if model_type in LOCAL_MODELS:
+            with self.residency.acquire(model_type) as model:
+                yield model
+        else:
+            yield self.get_model(model_type)
+
+    def select_and_get_model(self, task: TaskType) -> Optional[Any]:
+        """Route a task and return a ready model, falling back to the next candidate"""
         try:
-            model = self.get_model(ModelType.GEMINI)
-            if not model:
-                logging.error("Failed to initialize Gemini model")
-                raise Exception("Model initialization failed")
-            return model
+            tried = []
+            while True:
+                model_type = self.select_model(task, exclude=tried)
+                if model_type is None:
+                    raise Exception(f"No model available for {task.name}")
+                model = self.get_model(model_type)
+                if model:
+                    # Local models report through InferenceStats already
+                    if hasattr(model, "inference_stats"):
+                        return model
+                    return RoutedModel(model, model_type, self)
+                logging.error(f"Failed to initialize {model_type.name} model")
+                self.update_performance(model_type, False, 0.0, task=task)
+                tried.append(model_type)
             
         except Exception as e:
             logging.error(f"Model selection failed: {str(e)}")
@@ -129,45 +323,92 @@ class ModelSelector:
         matches = sum(1 for cap in required_capabilities if cap in model_strengths)
         return matches / len(required_capabilities)
 
-    def _calculate_performance_score(self, model_type: ModelType, latency_importance: float) -> float:
+    def get_latency(self, model_type: ModelType) -> float:
+        """Recent measured latency, or the nominal capability value before any calls"""
         metrics = self.metrics[model_type]
-        total_attempts = metrics.success_count + metrics.fail_count
-        
-        if total_attempts == 0:
-            return 0.5  # Default score for new models
-            
-        success_rate = metrics.success_count / total_attempts
-        avg_latency = np.mean(metrics.latencies[-20:]) if metrics.latencies else 3.0
-        latency_score = 1.0 / (1.0 + avg_latency)
-        
-        return (success_rate * (1 - latency_importance) + 
-                latency_score * latency_importance)
+        if metrics.latencies:
+            return float(np.mean(list(metrics.latencies)[-20:]))
+        return self.capabilities[model_type].avg_latency
 
-    def _calculate_context_score(self, capability: ModelCapability, 
-                               context: Optional[Dict], token_importance: float) -> float:
-        if not context:
-            return 0.5
-            
-        input_length = len(str(context.get('topic', '')))
-        token_capacity = min(1.0, capability.max_tokens / 4096)  # Normalize to 0-1
-        
-        return token_capacity * token_importance + 0.5 * (1 - token_importance)
+    def get_performance_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model success rate, latency and throughput for routing and capacity planning"""
+        summary = {}
+        # Snapshot under the lock: update_performance() appends from worker threads
+        with self._metrics_lock:
+            for model_type, metrics in self.metrics.items():
+                total_attempts = metrics.success_count + metrics.fail_count
+                summary[model_type.name] = {
+                    "calls": total_attempts,
+                    "success_rate": metrics.success_count / total_attempts if total_attempts else None,
+                    "latency": self.get_latency(model_type),
+                    "latency_measured": bool(metrics.latencies),
+                    "tokens_per_second": float(np.mean(list(metrics.tokens_per_second)[-20:])) if metrics.tokens_per_second else None,
+                    "tasks": {
+                        task.name: {
+                            "recent_success_rate": task_metrics.recent_outcomes()[0] / len(task_metrics.outcomes)
+                            if task_metrics.outcomes else None,
+                            "latency_p50_p95": task_metrics.latency_percentiles()
+                        }
+                        for (metrics_model, task), task_metrics in self.task_metrics.items()
+                        if metrics_model == model_type
+                    }
+                }
+        for model_type in self.metrics:
+            summary[model_type.name]["inference"] = self.inference_stats.summary(model_type)
+        return summary
+
+    def _record_inference(self, record: InferenceRecord):
+        if record.model_type in self.metrics:
+            self.update_performance(
+                record.model_type, record.success, record.total_seconds,
+                tokens_per_second=record.tokens_per_second if record.success else None,
+                task=record.task
+            )
 
-    def _calculate_recency(self, last_used: Optional[datetime]) -> float:
-        if not last_used:
-            return 0.5
-        hours_ago = (datetime.now() - last_used).total_seconds() / 3600
-        return 1.0 / (1.0 + hours_ago)  # Decay over time
+    def update_performance(self, model: ModelType, success: bool, latency: float,
+                           tokens_per_second: Optional[float] = None,
+                           task: Optional[TaskType] = None):
+        with self._metrics_lock:
+            self.metrics[model].record(success, latency, tokens_per_second)
+            if task is not None:
+                self.task_metrics[(model, task)].record(success, latency, tokens_per_second)
+            self._updates_since_save += 1
+            save = self._updates_since_save >= 20
+        if save:
+            self.save_metrics()
 
-    def update_performance(self, model: ModelType, success: bool, latency: float):
-        metrics = self.metrics[model]
-        if success:
-            metrics.success_count += 1
-            metrics.last_success = datetime.now()
-        else:
-            metrics.fail_count += 1
-        metrics.latencies.append(latency)
-        
-        # Keep only last 100 latency measurements
-        if len(metrics.latencies) > 100:
-            metrics.latencies.pop(0)
\ No newline at end of file
+    def save_metrics(self):
+        """Write routing metrics atomically so a crash never leaves a torn file"""
+        with self._metrics_lock:
+            data = {
+                "models": {m.name: metrics.to_dict() for m, metrics in self.metrics.items()},
+                "tasks": {
+                    f"{m.name}:{task.name}": metrics.to_dict()
+                    for (m, task), metrics in self.task_metrics.items()
+                }
+            }
+            self._updates_since_save = 0
+        try:
+            self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.metrics_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(data))
+            os.replace(tmp_path, self.metrics_path)
+        except OSError as e:
+            logging.warning(f"Failed to save routing metrics: {str(e)}")
+
+    def load_metrics(self):
+        """Restore routing metrics saved by a previous run"""
+        if not self.metrics_path.exists():
+            return
+        try:
+            data = json.loads(self.metrics_path.read_text())
+            for name, metrics in data.get("models", {}).items():
+                if name in ModelType.__members__:
+                    self.metrics[ModelType[name]] = ModelMetrics.from_dict(metrics)
+            for key, metrics in data.get("tasks", {}).items():
+                model_name, _, task_name = key.partition(":")
+                if model_name in ModelType.__members__ and task_name in TaskType.__members__:
+                    self.task_metrics[(ModelType[model_name], TaskType[task_name])] = ModelMetrics.from_dict(metrics)
+            logging.debug(f"Loaded routing metrics from {self.metrics_path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable routing metrics: {str(e)}")
\ No newline at end of file
@@ -1,11 +1,33 @@
+import logging
 from enum import Enum, auto
+from typing import List
 
 class ModelType(Enum):
     """Available model types"""
     GEMINI = auto()
+    PHI = auto()
+    LLAMA = auto()
+    ONNX = auto()
+    REMOTE = auto()  # OpenAI-compatible inference server
 
 class TaskType(Enum):
     """Task categories for model selection"""
     TEACHING = auto()
     REFLECTION = auto()
-    VERSE_ANALYSIS = auto()
\ No newline at end of file
+    VERSE_ANALYSIS = auto()
+    SEARCH = auto()
+    ANALYSIS = auto()
+    EXTRACTION = auto()  # Short lists pulled out of generated text
+
+def parse_model_types(names: str) -> List[ModelType]:
+    """Parse a comma-separated list of ModelType names; repeats are kept"""
+    models = []
+    for name in names.split(","):
+        name = name.strip().upper()
+        if not name:
+            continue
+        if name in ModelType.__members__:
+            models.append(ModelType[name])
+        else:
+            logging.warning(f"Ignoring unknown model type '{name}'")
+    return models
\ No newline at end of file
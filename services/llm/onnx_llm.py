@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Optional, Tuple
+from .model_types import ModelType, TaskType
+from .response_cache import ResponseCache
+from .inference_stats import GenerationTimer, InferenceStats
+from .hf_llm import PROMPT_PREFIX, PROMPT_SUFFIX
+from config.settings import Config
+
+class OnnxLLM:
+    """Local causal LM served by ONNX Runtime's CPU execution provider.
+
+    The model is exported to ONNX once with optimum and stored under
+    Config.CACHE_DIR; later runs load the saved graph directly.
+    """
+
+    def __init__(self, model_id: str = None):
+        try:
+            try:
+                import onnxruntime as ort
+                from optimum.onnxruntime import ORTModelForCausalLM
+                from transformers import AutoTokenizer
+            except ImportError as e:
+                raise ImportError(
+                    "The ONNX backend requires optimum and onnxruntime: "
+                    "pip install 'biblia[onnx]'"
+                ) from e
+
+            self.model_type = ModelType.ONNX
+            self.model_id = model_id or Config.ONNX_MODEL_ID
+            self.export_dir = Config.CACHE_DIR / "onnx" / self.model_id.replace("/", "--")
+
+            session_options = ort.SessionOptions()
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if Config.ONNX_NUM_THREADS:
+                session_options.intra_op_num_threads = Config.ONNX_NUM_THREADS
+
+            if (self.export_dir / "config.json").exists():
+                source, export = self.export_dir, False
+            else:
+                logging.info(f"Exporting {self.model_id} to ONNX (one-time)")
+                source, export = self.model_id, True
+
+            self.model = ORTModelForCausalLM.from_pretrained(
+                source,
+                export=export,
+                provider="CPUExecutionProvider",
+                session_options=session_options,
+                use_cache=True
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(source, use_fast=True)
+
+            if export:
+                self.model.save_pretrained(self.export_dir)
+                self.tokenizer.save_pretrained(self.export_dir)
+
+            self.generation_kwargs = {
+                'max_new_tokens': 256,
+                'do_sample': True,
+                'temperature': 0.8,
+                'top_p': 0.92,
+                'top_k': 50,
+                'repetition_penalty': 1.2,
+                'no_repeat_ngram_size': 3
+            }
+            self.cache = ResponseCache.shared() if Config.RESPONSE_CACHE_ENABLED else None
+            self.inference_stats = InferenceStats.shared()
+
+            logging.info(f"Successfully loaded {self.model_id} with ONNX Runtime")
+
+        except Exception as e:
+            logging.error(f"Failed to initialize ONNX model: {str(e)}")
+            raise
+
+    def _format_prompt(self, prompt: str) -> str:
+        return PROMPT_PREFIX + PROMPT_SUFFIX.format(prompt=prompt)
+
+    def _cache_lookup(self, formatted_prompt: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return (cache_key, cached_response) for a formatted prompt"""
+        if not self.cache:
+            return None, None
+        cache_key = ResponseCache.make_key(formatted_prompt, f"onnx:{self.model_id}", self.generation_kwargs)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.debug(f"Response cache hit for {self.model_id}")
+        return cache_key, cached
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        try:
+            formatted_prompt = self._format_prompt(prompt)
+            cache_key, cached = self._cache_lookup(formatted_prompt)
+            if cached is not None:
+                return cached
+
+            inputs = self.tokenizer(formatted_prompt, return_tensors="pt", return_token_type_ids=False)
+            prompt_tokens = inputs["input_ids"].shape[1]
+            timer = GenerationTimer()
+            try:
+                output_ids = self.model.generate(
+                    **inputs,
+                    **self.generation_kwargs,
+                    logits_processor=timer.processors(),
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+            except Exception:
+                self.inference_stats.record(timer.finish(
+                    self.model_id, self.model_type, task, prompt_tokens=prompt_tokens, success=False
+                ))
+                raise
+            self.inference_stats.record(timer.finish(
+                self.model_id, self.model_type, task,
+                prompt_tokens=prompt_tokens,
+                generated_tokens=output_ids.shape[1] - prompt_tokens
+            ))
+            text = self.tokenizer.decode(
+                output_ids[0, inputs["input_ids"].shape[1]:],
+                skip_special_tokens=True
+            )
+            text = text.split("Generated using")[0].strip()
+            if not text:
+                return None
+
+            if cache_key:
+                self.cache.set(cache_key, text, task=task)
+            return text
+
+        except Exception as e:
+            logging.error(f"ONNX generation error: {str(e)}")
+            return None
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Run generate() in a worker thread so the event loop stays responsive.
+
+        to_thread() carries the caller's contextvars (usage command, request
+        priority) into the thread; run_in_executor() would drop them.
+        """
+        return await asyncio.to_thread(self.generate, prompt, task=task)
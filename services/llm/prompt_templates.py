@@ -0,0 +1,342 @@
+import logging
+import re
+import string
+import textwrap
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.semantic_cache import normalize_topic
+from .generation_profiles import profile_for
+from .model_types import TaskType
+
+CHARS_PER_TOKEN = 4
+
+# Follow-up prompts (references, application, prayer) quote a teaching answer;
+# leave room for a full one so it is not cut before the model sees it
+INSIGHTS_BUDGET = profile_for(TaskType.TEACHING).max_output_tokens + 200
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), matching the quota estimates"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def compact(text: str) -> str:
+    """Dedent, trim trailing spaces and collapse runs of blank lines"""
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to about `tokens` tokens at a word boundary"""
+    limit = max(0, tokens) * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:max(0, limit - 2)]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + " …"
+
+def rank_snippets(snippets: Sequence[str], query: str) -> List[int]:
+    """Indexes of snippets by how many query terms they share; search rank breaks ties"""
+    terms = set(normalize_topic(query).split())
+
+    def overlap(index: int) -> int:
+        return len(terms & set(normalize_topic(snippets[index]).split()))
+
+    return sorted(range(len(snippets)), key=lambda i: (-overlap(i), i))
+
+@dataclass
+class PromptStats:
+    renders: int = 0
+    truncated: int = 0
+    total_tokens: int = 0
+    last_tokens: int = 0
+    max_tokens: int = 0
+
+@dataclass
+class RenderedPrompt:
+    name: str
+    text: str
+    tokens: int
+    truncated: bool = False
+    # Size the render would have had without the budget
+    requested_tokens: int = 0
+
+class PromptTemplate:
+    """A compacted str.format template with an input token budget.
+
+    When a render would exceed the budget, the snippet field keeps only the
+    snippets most relevant to the query field, then the truncatable fields
+    are shortened in order until the prompt fits.
+    """
+
+    def __init__(self, name: str, template: str, token_budget: Optional[int] = None,
+                 truncate: Sequence[str] = (), snippets: Optional[str] = None,
+                 query: Optional[str] = None, max_snippets: Optional[int] = None):
+        self.name = name
+        self.template = compact(template)
+        self.fields = {field for _, field, _, _ in string.Formatter().parse(self.template) if field}
+        self.token_budget = token_budget
+        self.truncate = tuple(truncate)
+        self.snippets = snippets
+        self.query = query
+        self.max_snippets = max_snippets
+        unknown = (set(self.truncate) | {snippets, query}) - self.fields - {None}
+        if unknown:
+            raise ValueError(f"Prompt {name} has no field(s) {', '.join(sorted(unknown))}")
+
+    def _select_snippets(self, snippets: Sequence[str], query: str,
+                         budget: Optional[int]) -> Tuple[str, bool]:
+        """Most relevant snippets that fit, and whether any were dropped for the budget"""
+        snippets = [compact(s) for s in snippets if s and s.strip()]
+        chosen, used, dropped = [], 0, False
+        for index in rank_snippets(snippets, query):
+            if self.max_snippets is not None and len(chosen) >= self.max_snippets:
+                break
+            cost = estimate_tokens(f"- {snippets[index]}\n")
+            if budget is not None and used + cost > budget:
+                dropped = True
+                continue
+            chosen.append(index)
+            used += cost
+        # Keep search order so the prompt reads naturally
+        return "\n".join(f"- {snippets[i]}" for i in sorted(chosen)), dropped
+
+    def render(self, **values: Any) -> RenderedPrompt:
+        values = {name: compact(str(value)) if isinstance(value, str) else value
+                  for name, value in values.items()}
+        flexible = set(self.truncate) | ({self.snippets} if self.snippets else set())
+        fixed = estimate_tokens(self.template.format(**{
+            **values, **{name: "" for name in flexible}
+        }))
+        remaining = None if self.token_budget is None else max(0, self.token_budget - fixed)
+        requested = fixed + sum(
+            estimate_tokens("\n".join(f"- {s}" for s in values.get(name) or []) if name == self.snippets
+                            else str(values.get(name, "")))
+            for name in flexible
+        )
+
+        truncated = False
+        if self.snippets:
+            query = str(values.get(self.query, "")) if self.query else ""
+            values[self.snippets], truncated = self._select_snippets(
+                values.get(self.snippets) or [], query, remaining
+            )
+            if remaining is not None:
+                remaining = max(0, remaining - estimate_tokens(values[self.snippets]))
+
+        for name in self.truncate:
+            text = str(values.get(name, ""))
+            if remaining is not None:
+                shortened = truncate_to_tokens(text, remaining)
+                truncated = truncated or shortened != text
+                text = shortened
+                remaining = max(0, remaining - estimate_tokens(text))
+            values[name] = text
+
+        text = self.template.format(**values)
+        return RenderedPrompt(self.name, text, estimate_tokens(text), truncated, requested)
+
+class PromptRegistry:
+    """Named prompt templates with token counts for every render"""
+
+    _shared: Optional["PromptRegistry"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, templates: Sequence[PromptTemplate] = ()):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._stats: Dict[str, PromptStats] = {}
+        self._lock = threading.Lock()
+        for template in templates:
+            self.register(template)
+
+    @classmethod
+    def shared(cls) -> "PromptRegistry":
+        """Get the process-wide registry holding the application's prompts"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(DEFAULT_TEMPLATES)
+            return cls._shared
+
+    def register(self, template: PromptTemplate):
+        with self._lock:
+            self._templates[template.name] = template
+            self._stats.setdefault(template.name, PromptStats())
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def render(self, name: str, **values: Any) -> str:
+        """Render a registered prompt and record its token count"""
+        rendered = self._templates[name].render(**values)
+        with self._lock:
+            stats = self._stats[name]
+            stats.renders += 1
+            stats.truncated += rendered.truncated
+            stats.total_tokens += rendered.tokens
+            stats.last_tokens = rendered.tokens
+            stats.max_tokens = max(stats.max_tokens, rendered.tokens)
+        if rendered.truncated:
+            logging.warning(
+                f"Prompt {name} truncated to its {self._templates[name].token_budget}-token budget: "
+                f"~{rendered.requested_tokens} tokens requested, {rendered.tokens} sent"
+            )
+        else:
+            logging.debug(f"Prompt {name}: {rendered.tokens} tokens")
+        return rendered.text
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "renders": stats.renders,
+                    "truncated": stats.truncated,
+                    "budget": self._templates[name].token_budget,
+                    "last_tokens": stats.last_tokens,
+                    "mean_tokens": stats.total_tokens / stats.renders if stats.renders else 0.0,
+                    "max_tokens": stats.max_tokens
+                }
+                for name, stats in self._stats.items()
+            }
+
+DEFAULT_TEMPLATES = [
+    PromptTemplate("teaching", """
+        Provide biblical teachings and insights about: {topic}
+
+        Please include:
+        1. Key biblical principles
+        2. Relevant scripture references
+        3. Practical applications
+        4. Spiritual wisdom
+        5. Examples from biblical narratives
+
+        Format the response with clear sections and scripture citations.
+        Focus on providing deep spiritual insights while maintaining theological accuracy.
+        """, token_budget=200, truncate=("topic",)),
+    PromptTemplate("search", """
+        Please provide biblical insights and references about: {topic}
+        Include relevant scripture verses and theological context.
+        Focus on practical application and spiritual understanding.
+        """, token_budget=100, truncate=("topic",)),
+    PromptTemplate("search_result_insight", """
+        Based on this search result about "{topic}":
+        {snippet}
+
+        Provide:
+        1. Biblical perspective
+        2. Key spiritual insights
+        3. Relevant scripture references
+        """, token_budget=400, truncate=("topic", "snippet")),
+    PromptTemplate("passage_analysis", """
+        Analyze this biblical passage:
+        {passage}
+
+        Provide:
+        1. Historical Context
+        2. Key Themes
+        3. Theological Significance
+        4. Practical Applications
+        5. Cross References
+        """, token_budget=2000, truncate=("passage",)),
+    PromptTemplate("search_analysis", """
+        Analyze biblically: {topic}
+        Based on these sources:
+        {snippets}
+
+        Consider:
+        1. Biblical perspective
+        2. Key theological points
+        3. Scripture references
+        4. Practical application
+        """, token_budget=400, snippets="snippets", query="topic", max_snippets=3),
+    PromptTemplate("teaching_structured", """
+        Teach biblically on: {topic}
+        Based on these sources:
+        {snippets}
+
+        Respond with only a JSON object, no prose or code fences, with these keys:
+        "insights": markdown string covering the biblical perspective, key theological points and scripture
+        "references": array of Bible verse references, e.g. ["John 3:16", "Romans 8:28"]
+        "application": markdown string with personal application, daily life implementation and spiritual growth steps
+        "prayer": markdown string with prayer points for personal transformation, spiritual understanding,
+        practical application and community impact
+        """, token_budget=500, snippets="snippets", query="topic", max_snippets=3),
+    PromptTemplate("references", """
+        Extract all Bible verse references from this text:
+        {text}
+
+        Return only the references, one per line.
+        Example format:
+        John 3:16
+        Romans 8:28
+        """, token_budget=INSIGHTS_BUDGET, truncate=("text",)),
+    PromptTemplate("application", """
+        Based on these biblical insights:
+        {insights}
+
+        Generate practical application points including:
+        1. Personal application
+        2. Daily life implementation
+        3. Spiritual growth steps
+        """, token_budget=INSIGHTS_BUDGET, truncate=("insights",)),
+    PromptTemplate("prayer", """
+        Based on the topic '{topic}' and these insights:
+        {insights}
+
+        Create focused prayer points covering:
+        1. Personal transformation
+        2. Spiritual understanding
+        3. Practical application
+        4. Community impact
+        """, token_budget=INSIGHTS_BUDGET, truncate=("topic", "insights")),
+    PromptTemplate("verse_reflection",
+                   "Provide a deep spiritual reflection on this verse: {text} ({reference})",
+                   token_budget=300, truncate=("text",)),
+    PromptTemplate("devotional", """
+        Create a short devotional for this verse:
+        {text} - {reference}
+
+        Include:
+        1. Brief explanation
+        2. Life application
+        3. Prayer point
+        """, token_budget=300, truncate=("text",)),
+    PromptTemplate("reflect", """
+        Reflect deeply on this {content_type}:
+        {content}
+
+        Format your response exactly as follows:
+
+        INSIGHTS:
+        [Your spiritual insights here]
+
+        APPLICATION:
+        [Your personal application points here]
+
+        PRAYER:
+        [Your prayer focus here]
+        """, token_budget=1500, truncate=("content",)),
+    PromptTemplate("search_reflection", """
+        Provide a spiritual reflection on: {topic}
+        Based on: {insights}
+
+        Consider:
+        1. Spiritual significance
+        2. Personal application
+        3. Prayer points
+        4. Meditation focus
+        """, token_budget=INSIGHTS_BUDGET, truncate=("topic", "insights")),
+    PromptTemplate("summary", """
+        Provide a biblical analysis of this text:
+        {text}
+
+        Include:
+        - Main theological themes
+        - Key spiritual principles
+        - Biblical cross-references
+        - Practical applications
+        """, token_budget=2000, truncate=("text",)),
+    PromptTemplate("key_points", "Extract the key theological points from this analysis: {text}",
+                   token_budget=1500, truncate=("text",)),
+    PromptTemplate("find_references", "List all Bible verse references from this text: {text}",
+                   token_budget=2200, truncate=("text",)),
+]
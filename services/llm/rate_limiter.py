@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+class Priority(IntEnum):
+    """Lower values are served first"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+_current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "request_priority", default=Priority.NORMAL
+)
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Run the enclosed model calls at the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+def is_throttled(error: Exception) -> bool:
+    """Whether an API error is a quota rejection (HTTP 429)"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or getattr(error, "code", None) == 429
+
+class TokenBucket:
+    """Refills continuously at capacity per period; callers hold the limiter lock"""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter with a priority queue.
+
+    Callers reserve one request and an estimated token count; only the
+    highest-priority waiter (first come first served within a priority)
+    may take from the buckets, so interactive commands overtake queued
+    background work. Once a response reports its real token usage the
+    estimate is reconciled, and a 429 from the API drains the buckets so
+    callers back off together instead of retrying into the quota.
+    """
+
+    _shared: Dict[str, "RateLimiter"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 name: str = "rate-limiter", period: float = 60.0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, period)
+        self.tokens = TokenBucket(tokens_per_minute, period)
+        self.granted = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.throttled = 0
+        self.wait_times = deque(maxlen=200)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def shared(cls, name: str, requests_per_minute: float, tokens_per_minute: float) -> "RateLimiter":
+        """Get the process-wide limiter for a quota (e.g. one API key)"""
+        with cls._shared_lock:
+            if name not in cls._shared:
+                cls._shared[name] = cls(requests_per_minute, tokens_per_minute, name=name)
+            return cls._shared[name]
+
+    def acquire(self, tokens: float = 0, priority: Optional[Priority] = None,
+                timeout: Optional[float] = None, cancel: Optional[threading.Event] = None) -> bool:
+        """Wait for quota; False if it did not become available within timeout.
+
+        Setting `cancel` (under the limiter lock, see aacquire) abandons the wait.
+        """
+        priority = current_priority() if priority is None else priority
+        entry = (int(priority), next(self._sequence))
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                if cancel is not None and cancel.is_set():
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self.cancelled += 1
+                    self._condition.notify_all()
+                    return False
+                if self._queue[0] == entry:
+                    wait = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+                    if wait == 0:
+                        heapq.heappop(self._queue)
+                        self.requests.tokens -= 1
+                        self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                        self.granted += 1
+                        self.wait_times.append(now - started)
+                        self._condition.notify_all()
+                        return True
+                else:
+                    # Woken when the head of the queue changes
+                    wait = None
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        self.timed_out += 1
+                        self._condition.notify_all()
+                        logging.warning(f"{self.name}: gave up after waiting {now - started:.1f}s for quota")
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    async def aacquire(self, tokens: float = 0, priority: Optional[Priority] = None,
+                       timeout: Optional[float] = None) -> bool:
+        """Async variant of acquire(); waits in a worker thread.
+
+        Cancelling the caller withdraws it from the queue, and gives back
+        quota that was granted just before the cancellation arrived.
+        """
+        priority = current_priority() if priority is None else priority
+        cancel = threading.Event()
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, tokens, priority, timeout, cancel))
+        try:
+            # Shielded so the thread's answer is still seen after a cancellation
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            with self._condition:
+                cancel.set()
+                self._condition.notify_all()
+            waiter.add_done_callback(lambda future: self._refund_abandoned(future, tokens))
+            raise
+
+    def _refund_abandoned(self, future: "asyncio.Future[bool]", tokens: float):
+        """Return a grant nobody is waiting for any more"""
+        if future.cancelled() or future.exception() is not None or not future.result():
+            return
+        with self._condition:
+            self.requests.tokens = min(self.requests.capacity, self.requests.tokens + 1)
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + min(tokens, self.tokens.capacity))
+            self.granted -= 1
+            self.cancelled += 1
+            self._condition.notify_all()
+
+    def reconcile(self, estimated_tokens: float, actual_tokens: Optional[float]):
+        """Correct the token bucket once real usage is known"""
+        if actual_tokens is None:
+            return
+        with self._condition:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimated_tokens - actual_tokens)
+            self._condition.notify_all()
+
+    def penalize(self):
+        """Empty the buckets after the API rejected a call for quota"""
+        with self._condition:
+            self.throttled += 1
+            self.requests.tokens = min(self.requests.tokens, 0)
+            self.tokens.tokens = min(self.tokens.tokens, 0)
+        logging.warning(f"{self.name}: quota exceeded, backing off")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            waits = np.fromiter(self.wait_times, dtype=float)
+            return {
+                "queue_depth": len(self._queue),
+                "queued_by_priority": {
+                    p.name: sum(1 for entry in self._queue if entry[0] == p) for p in Priority
+                },
+                "granted": self.granted,
+                "timed_out": self.timed_out,
+                "cancelled": self.cancelled,
+                "throttled": self.throttled,
+                "requests_available": self.requests.tokens,
+                "tokens_available": self.tokens.tokens,
+                "wait_p50": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                "wait_p95": float(np.percentile(waits, 95)) if len(waits) else 0.0
+            }
@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .model_types import ModelType, TaskType
+from .response_cache import ResponseCache
+from .streaming import StreamMetrics
+from .generation_profiles import DEFAULT_PROFILE, profile_for
+from .usage_ledger import UsageLedger
+from config.settings import Config
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+def parse_endpoints(endpoints: str) -> List[str]:
+    """Comma-separated server URLs -> base URLs ending in /v1"""
+    parsed = []
+    for endpoint in endpoints.split(","):
+        endpoint = endpoint.strip().rstrip("/")
+        if not endpoint:
+            continue
+        if not endpoint.endswith("/v1"):
+            endpoint += "/v1"
+        parsed.append(endpoint)
+    return parsed
+
+class RemoteLLM:
+    """Client for OpenAI-compatible inference servers (llama.cpp server, vLLM, ...).
+
+    Requests go round-robin across the configured endpoints over one
+    pooled keep-alive session. Each endpoint has its own circuit breaker;
+    an endpoint that fails or is tripped is skipped in favour of the next.
+    """
+
+    def __init__(self, endpoints: List[str], model_id: Optional[str] = None,
+                 api_key: Optional[str] = None, pool_size: Optional[int] = None):
+        endpoints = parse_endpoints(",".join(endpoints))
+        if not endpoints:
+            raise ValueError("RemoteLLM needs at least one endpoint")
+        self.model_type = ModelType.REMOTE
+        self.model_id = model_id or Config.REMOTE_MODEL
+        self.endpoints = endpoints
+        # Used when no task is given; otherwise the task's generation profile applies
+        self.generation_config = DEFAULT_PROFILE.openai_params()
+        self.usage_ledger = UsageLedger.shared()
+        self.cache = ResponseCache.shared() if Config.RESPONSE_CACHE_ENABLED else None
+        self.stream_metrics = deque(maxlen=100)
+
+        self.session = requests.Session()
+        # Keep-alive connections per endpoint host, enough for concurrent callers
+        adapter = HTTPAdapter(pool_connections=len(endpoints), pool_maxsize=pool_size or Config.REMOTE_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        api_key = api_key if api_key is not None else Config.REMOTE_API_KEY
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+        self.breakers = {
+            endpoint: CircuitBreaker.get(f"remote:{endpoint}", max_timeout=Config.REMOTE_TIMEOUT)
+            for endpoint in endpoints
+        }
+        self._next_endpoint = itertools.count()
+        self._lock = threading.Lock()
+        logging.info(f"Initialized remote model {self.model_id} on {len(endpoints)} endpoint(s)")
+
+    def _endpoint_order(self) -> List[str]:
+        """All endpoints, starting at the next one in round-robin order"""
+        with self._lock:
+            start = next(self._next_endpoint) % len(self.endpoints)
+        return self.endpoints[start:] + self.endpoints[:start]
+
+    def _generation_config(self, task: Optional[TaskType]) -> Dict[str, Any]:
+        return profile_for(task).openai_params() if task else self.generation_config
+
+    def _payload(self, prompt: str, task: Optional[TaskType], stream: bool = False) -> Dict[str, Any]:
+        payload = {
+            "model": self.model_id,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": stream,
+            **self._generation_config(task)
+        }
+        if stream:
+            # Servers that support it report token usage in a final chunk
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _cache_lookup(self, prompt: str, task: Optional[TaskType]):
+        if not self.cache:
+            return None, None
+        cache_key = ResponseCache.make_key(prompt, self.model_id, self._generation_config(task))
+        return cache_key, self.cache.get(cache_key)
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]], task: Optional[TaskType], latency: float):
+        usage = usage or {}
+        self.usage_ledger.record(self.model_id, task, usage.get("prompt_tokens"),
+                                 usage.get("completion_tokens"), latency)
+
+    def _post(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.post(
+            f"{endpoint}/chat/completions", json=payload, timeout=self.breakers[endpoint].timeout()
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        cache_key, cached = self._cache_lookup(prompt, task)
+        if cached is not None:
+            return cached
+
+        payload = self._payload(prompt, task)
+        for endpoint in self._endpoint_order():
+            try:
+                started = time.perf_counter()
+                data = self.breakers[endpoint].call(self._post, endpoint, payload)
+                self._record_usage(data.get("usage"), task, time.perf_counter() - started)
+                content = data["choices"][0]["message"]["content"]
+                if content and cache_key:
+                    self.cache.set(cache_key, content, task=task)
+                return content
+            except CircuitOpenError:
+                continue
+            except Exception as e:
+                logging.error(f"Remote generation error ({endpoint}): {str(e)}")
+        logging.error(f"No remote endpoint could serve {self.model_id}")
+        return None
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        """Async variant of generate(); the pooled session is blocking, so it runs in a thread"""
+        return await asyncio.to_thread(self.generate, prompt, task)
+
+    def generate_stream(self, prompt: str, task: Optional[TaskType] = None) -> Iterator[str]:
+        """Yield text chunks from the server's server-sent events"""
+        metrics = StreamMetrics(model_id=self.model_id)
+        self.stream_metrics.append(metrics)
+
+        cache_key, cached = self._cache_lookup(prompt, task)
+        if cached is not None:
+            metrics.mark_chunk(cached)
+            metrics.finish()
+            yield cached
+            return
+
+        parts = []
+        for endpoint in self._endpoint_order():
+            breaker = self.breakers[endpoint]
+            if not breaker.allow_request():
+                continue
+            try:
+                started = time.perf_counter()
+                usage = None
+                with self.session.post(
+                    f"{endpoint}/chat/completions", json=self._payload(prompt, task, stream=True),
+                    timeout=breaker.timeout(), stream=True
+                ) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        event = json.loads(data)
+                        usage = event.get("usage") or usage
+                        choices = event.get("choices") or [{}]
+                        text = choices[0].get("delta", {}).get("content")
+                        if not text:
+                            continue
+                        metrics.mark_chunk(text)
+                        parts.append(text)
+                        yield text
+                breaker.record_success()
+                self._record_usage(usage, task, time.perf_counter() - started)
+                break
+            except GeneratorExit:
+                breaker.record_success()
+                raise
+            except Exception as e:
+                breaker.record_error(e)
+                logging.error(f"Remote streaming error ({endpoint}): {str(e)}")
+                if parts:
+                    # Part of the answer is already out; restarting elsewhere would repeat it
+                    break
+
+        metrics.finish()
+        content = "".join(parts)
+        if content and cache_key:
+            self.cache.set(cache_key, content, task=task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {endpoint: breaker.get_stats() for endpoint, breaker in self.breakers.items()}
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,311 @@
+import ctypes
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .model_types import ModelType, TaskType
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process, in MB (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _meminfo_mb(field_name: str) -> Optional[float]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_memory_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, in MB (Linux only)"""
+    return _meminfo_mb("MemAvailable")
+
+def total_memory_mb() -> Optional[float]:
+    """MemTotal from /proc/meminfo, in MB (Linux only)"""
+    return _meminfo_mb("MemTotal")
+
+def model_weights_mb(model: Any) -> float:
+    """Size of the torch weights held by a local LLM wrapper"""
+    modules = [
+        getattr(getattr(model, "pipe", None), "model", None),
+        getattr(model, "draft_model", None)
+    ]
+    total = 0
+    for module in modules:
+        if module is None or not hasattr(module, "state_dict"):
+            continue
+        for tensor in module.state_dict().values():
+            if hasattr(tensor, "element_size"):
+                total += tensor.numel() * tensor.element_size()
+    return total / (1024 * 1024)
+
+def release_free_memory():
+    """Return freed heap pages to the OS (glibc keeps them otherwise)"""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+@dataclass
+class ResidentModel:
+    model: Any
+    size_mb: float
+    loaded_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    pins: int = 0
+
+class ModelResidencyManager:
+    """Keep local models in memory within a RAM budget.
+
+    Models load on first use. Unpinned models are evicted least recently
+    used first when a new model would exceed the budget (or free system
+    memory drops below min_free_mb), and after idle_timeout seconds
+    without use. Models pinned via acquire() are never evicted.
+    """
+
+    def __init__(self, loader: Callable[[ModelType], Any], memory_budget_mb: float,
+                 idle_timeout: float = 0, min_free_mb: float = 0,
+                 size_estimates: Optional[Dict[ModelType, float]] = None,
+                 check_interval: float = 30.0):
+        self.loader = loader
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+        self.min_free_mb = min_free_mb
+        # Replaced by measured sizes once a model has been loaded
+        self.size_estimates: Dict[ModelType, float] = dict(size_estimates or {})
+        self.evictions = 0
+        self._resident: Dict[ModelType, ResidentModel] = {}
+        # Set when an in-progress load finishes; loads run outside the lock
+        self._loading: Dict[ModelType, threading.Event] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+
+        self._reaper = None
+        if idle_timeout > 0:
+            self._reaper = threading.Thread(
+                target=self._reap_idle, args=(check_interval,), name="model-residency", daemon=True
+            )
+            self._reaper.start()
+
+    @property
+    def resident_mb(self) -> float:
+        with self._lock:
+            return sum(entry.size_mb for entry in self._resident.values())
+
+    def is_resident(self, model_type: ModelType) -> bool:
+        with self._lock:
+            return model_type in self._resident
+
+    def peek(self, model_type: ModelType) -> Optional[Any]:
+        """The model if it is resident, without loading it or counting a use"""
+        with self._lock:
+            entry = self._resident.get(model_type)
+            return entry.model if entry is not None else None
+
+    def get(self, model_type: ModelType) -> Optional[Any]:
+        """Return a resident model, loading it (and evicting others) if needed"""
+        entry = self._entry(model_type)
+        return entry.model if entry is not None else None
+
+    @contextmanager
+    def acquire(self, model_type: ModelType) -> Iterator[Optional[Any]]:
+        """Pin a model for the duration of a call so it cannot be evicted"""
+        entry = self._entry(model_type, pin=True)
+        try:
+            yield entry.model if entry is not None else None
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.pins -= 1
+                    entry.last_used = time.monotonic()
+
+    def _entry(self, model_type: ModelType, pin: bool = False) -> Optional[ResidentModel]:
+        """Resident entry for a model, loading it or waiting for a load already under way"""
+        with self._lock:
+            entry = self._resident.get(model_type)
+            loading = self._loading.get(model_type)
+            if entry is None and loading is None:
+                needed = self.size_estimates.get(model_type, 0.0)
+                if not self._make_room(needed):
+                    logging.error(
+                        f"Cannot load {model_type.name}: needs ~{needed:.0f}MB, "
+                        f"{self.resident_mb:.0f}MB of {self.memory_budget_mb:.0f}MB budget is pinned"
+                    )
+                    return None
+                self._loading[model_type] = threading.Event()
+            elif entry is not None:
+                return self._touch(entry, pin)
+
+        if loading is not None:
+            loading.wait()
+            with self._lock:
+                entry = self._resident.get(model_type)
+                # None if the other load failed
+                return self._touch(entry, pin) if entry is not None else None
+
+        entry = None
+        try:
+            entry = self._load(model_type)
+        finally:
+            with self._lock:
+                if entry is not None:
+                    self._resident[model_type] = entry
+                    self._touch(entry, pin)
+                self._loading.pop(model_type).set()
+        if entry is not None:
+            logging.info(
+                f"Loaded {model_type.name} ({entry.size_mb:.0f}MB); "
+                f"{self.resident_mb:.0f}/{self.memory_budget_mb:.0f}MB resident"
+            )
+        return entry
+
+    @staticmethod
+    def _touch(entry: ResidentModel, pin: bool) -> ResidentModel:
+        entry.last_used = time.monotonic()
+        if pin:
+            entry.pins += 1
+        return entry
+
+    def _load(self, model_type: ModelType) -> Optional[ResidentModel]:
+        """Build a model without holding the lock; room was made when the load was claimed"""
+        rss_before = current_rss_mb()
+        model = self.loader(model_type)
+        if model is None:
+            return None
+        rss_after = current_rss_mb()
+        rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else 0.0
+
+        size_mb = max(model_weights_mb(model), rss_delta, 0.0)
+        self.size_estimates[model_type] = size_mb
+        return ResidentModel(model=model, size_mb=size_mb)
+
+    @property
+    def _loading_mb(self) -> float:
+        """Room claimed by loads in progress"""
+        return sum(self.size_estimates.get(model_type, 0.0) for model_type in self._loading)
+
+    def _under_pressure(self, needed_mb: float) -> bool:
+        if self.memory_budget_mb and self.resident_mb + self._loading_mb + needed_mb > self.memory_budget_mb:
+            return True
+        available = available_memory_mb()
+        return bool(self.min_free_mb and available is not None and available - needed_mb < self.min_free_mb)
+
+    def _make_room(self, needed_mb: float) -> bool:
+        """Evict LRU unpinned models until needed_mb fits; False if it cannot"""
+        while self._under_pressure(needed_mb):
+            candidates = [(entry.last_used, model_type) for model_type, entry in self._resident.items()
+                          if entry.pins == 0]
+            if not candidates:
+                # A lone model always gets a chance; pinned ones cannot make room
+                return not self._resident and not self._loading
+            _, model_type = min(candidates, key=lambda c: c[0])
+            self.evict(model_type, reason="memory pressure")
+        return True
+
+    def evict(self, model_type: ModelType, reason: str = "requested") -> bool:
+        """Release a resident model unless it is pinned"""
+        with self._lock:
+            entry = self._resident.get(model_type)
+            if entry is None or entry.pins > 0:
+                return False
+            del self._resident[model_type]
+            self.evictions += 1
+
+        close = getattr(entry.model, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logging.warning(f"Error closing {model_type.name}: {str(e)}")
+        del entry
+        release_free_memory()
+        logging.info(f"Evicted {model_type.name} ({reason})")
+        return True
+
+    def evict_idle(self) -> int:
+        """Evict unpinned models unused for longer than idle_timeout"""
+        if self.idle_timeout <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            idle = [model_type for model_type, entry in self._resident.items()
+                    if entry.pins == 0 and now - entry.last_used > self.idle_timeout]
+        return sum(self.evict(model_type, reason="idle") for model_type in idle)
+
+    def _reap_idle(self, interval: float):
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "budget_mb": self.memory_budget_mb,
+                "resident_mb": self.resident_mb,
+                "available_mb": available_memory_mb(),
+                "evictions": self.evictions,
+                "models": {
+                    model_type.name: {
+                        "size_mb": entry.size_mb,
+                        "pins": entry.pins,
+                        "idle_seconds": now - entry.last_used
+                    }
+                    for model_type, entry in self._resident.items()
+                }
+            }
+
+    def close(self):
+        self._stop.set()
+        for model_type in list(self._resident):
+            self.evict(model_type, reason="shutdown")
+
+class PinnedModel:
+    """Handle to a resident model that pins it for the length of each call.
+
+    Eviction closes a model, so a handle resolves the model on every call
+    rather than holding one that may have been evicted (and reloaded).
+    Only the generate methods load an evicted model; other attributes
+    (and hasattr() probes) see the model only while it is resident.
+    """
+
+    def __init__(self, residency: ModelResidencyManager, model_type: ModelType):
+        self.residency = residency
+        self.model_type = model_type
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "generate_stream":
+            model = self.residency.get(self.model_type)
+            if hasattr(model, name):
+                return self._generate_stream
+            raise AttributeError(name)
+        model = self.residency.peek(self.model_type)
+        if model is None:
+            raise AttributeError(f"{self.model_type.name} is not resident; {name} is unavailable")
+        return getattr(model, name)
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        with self.residency.acquire(self.model_type) as model:
+            return model.generate(prompt, task=task) if model is not None else None
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        with self.residency.acquire(self.model_type) as model:
+            return await model.agenerate(prompt, task=task) if model is not None else None
+
+    def _generate_stream(self, prompt: str, task: Optional[TaskType] = None) -> Iterator[str]:
+        with self.residency.acquire(self.model_type) as model:
+            if model is not None:
+                yield from model.generate_stream(prompt, task=task)
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config.settings import Config
+from .model_types import TaskType
+
+# Time-to-live per task type, in seconds
+DEFAULT_TTLS: Dict[TaskType, int] = {
+    TaskType.TEACHING: 7 * 24 * 3600,
+    TaskType.REFLECTION: 24 * 3600,
+    TaskType.VERSE_ANALYSIS: 24 * 3600,
+}
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class ResponseCache:
+    """Content-addressed prompt -> response cache stored in SQLite.
+
+    The database runs in WAL mode so several CLI and server processes can
+    share one cache file under Config.CACHE_DIR.
+    """
+
+    _shared: Dict[Path, "ResponseCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Optional[Path] = None,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 ttls: Optional[Dict[TaskType, int]] = None,
+                 default_ttl: Optional[int] = None):
+        self.path = Path(path or Config.CACHE_DIR / "responses.sqlite3")
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or Config.RESPONSE_CACHE_MAX_MB * 1024 * 1024
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl or Config.RESPONSE_CACHE_DEFAULT_TTL
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    @classmethod
+    def shared(cls, path: Optional[Path] = None) -> "ResponseCache":
+        """Get the process-wide cache instance for a cache file"""
+        path = Path(path or Config.CACHE_DIR / "responses.sqlite3")
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path=path)
+            return cls._shared[path]
+
+    @staticmethod
+    def make_key(prompt: str, model_id: str, generation_config: Dict[str, Any]) -> str:
+        """Build a stable key from prompt, model and generation settings"""
+        payload = json.dumps({
+            "prompt": prompt,
+            "model_id": model_id,
+            "generation_config": generation_config
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        # Connections must not be shared with forked children
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                task TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_accessed "
+            "ON responses (last_accessed)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        """Add to a shared counter; part of the caller's transaction, if any"""
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _count(self, name: str, amount: int = 1):
+        """Add to this process's counter; call once the write has committed"""
+        with self._stats_lock:
+            setattr(self.stats, name, getattr(self.stats, name) + amount)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached response or None on miss/expiry"""
+        try:
+            conn = self._connection()
+            now = time.time()
+            row = conn.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self._bump(conn, "misses")
+                self._count("misses")
+                return None
+
+            response, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bump(conn, "misses")
+                self._count("misses")
+                return None
+
+            conn.execute(
+                "UPDATE responses SET last_accessed = ? WHERE key = ?",
+                (now, key)
+            )
+            self._bump(conn, "hits")
+            self._count("hits")
+            return response
+
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache read failed: {str(e)}")
+            return None
+
+    def set(self, key: str, response: str, task: Optional[TaskType] = None):
+        """Store a response and evict least-recently-used entries over the limits"""
+        if not response:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            ttl = self.ttls.get(task, self.default_ttl)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, response, size, task, created_at, expires_at, last_accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, response, len(response.encode('utf-8')),
+                     task.name if task else None, now, now + ttl, now)
+                )
+                evicted = self._evict(conn, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            # Only once committed: a rolled-back eviction did not happen
+            if evicted:
+                self._count("evictions", evicted)
+
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache write failed: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """Drop expired entries, then LRU entries until within size limits; returns how many"""
+        evicted = conn.execute(
+            "DELETE FROM responses WHERE expires_at <= ?", (now,)
+        ).rowcount
+
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+        while count > self.max_entries or total_bytes > self.max_bytes:
+            row = conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_accessed ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            count -= 1
+            total_bytes -= row[1]
+            evicted += 1
+
+        if evicted:
+            self._bump(conn, "evictions", evicted)
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and across all processes"""
+        try:
+            conn = self._connection()
+            totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache stats failed: {str(e)}")
+            totals, entries, total_bytes = {}, 0, 0
+
+        return {
+            "process": {
+                "hits": self.stats.hits,
+                "misses": self.stats.misses,
+                "evictions": self.stats.evictions,
+                "hit_rate": self.stats.hit_rate
+            },
+            "global": {
+                "hits": totals.get("hits", 0),
+                "misses": totals.get("misses", 0),
+                "evictions": totals.get("evictions", 0)
+            },
+            "entries": entries,
+            "bytes": total_bytes
+        }
+
+    def clear(self):
+        """Remove all cached responses"""
+        conn = self._connection()
+        conn.execute("DELETE FROM responses")
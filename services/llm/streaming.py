@@ -0,0 +1,51 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+@dataclass
+class StreamMetrics:
+    """Latency metrics for a single streamed generation"""
+    model_id: str
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    tokens: int = 0
+    chars: int = 0
+
+    def mark_chunk(self, text: str, tokens: Optional[int] = None):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chars += len(text)
+        # Fall back to a rough chars-per-token estimate when the backend has no count
+        self.tokens = tokens if tokens is not None else max(1, self.chars // 4)
+
+    def finish(self, tokens: Optional[int] = None):
+        self.finished_at = time.perf_counter()
+        if tokens is not None:
+            self.tokens = tokens
+        logging.info(
+            f"{self.model_id} stream: ttft={self.time_to_first_token or 0:.2f}s, "
+            f"{self.tokens} tokens, {self.tokens_per_second:.1f} tokens/s"
+        )
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or self.finished_at is None:
+            return 0.0
+        elapsed = self.finished_at - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else float(self.tokens)
+
+    def to_dict(self) -> dict:
+        return {
+            "model_id": self.model_id,
+            "time_to_first_token": self.time_to_first_token,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second
+        }
@@ -0,0 +1,127 @@
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Field name -> expected JSON type for a complete teaching
+TEACHING_SCHEMA: Dict[str, type] = {
+    "insights": str,
+    "references": list,
+    "application": str,
+    "prayer": str,
+}
+
+_BOOK = r"(?:[1-3]\s?)?[A-Z][a-z]+(?:\sof\s[A-Z][a-z]+)?"
+REFERENCE_PATTERN = re.compile(rf"\b{_BOOK}\s\d{{1,3}}:\d{{1,3}}(?:[-–]\d{{1,3}})?\b")
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+@dataclass
+class StructuredResult:
+    """Fields that passed validation plus the names of those that did not"""
+    data: Dict[str, Any] = field(default_factory=dict)
+    missing: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """Parse the first JSON object in a model response, tolerating fences and chatter"""
+    if not text:
+        return None
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        # Trailing commentary with braces of its own: retry on the outermost span
+        end = text.rfind("}")
+        try:
+            value = json.loads(text[start:end + 1])
+        except ValueError as e:
+            logging.warning(f"Structured response is not valid JSON: {str(e)}")
+            return None
+    return value if isinstance(value, dict) else None
+
+def _coerce(value: Any, expected: type) -> Any:
+    """Accept the near misses models commonly produce; None if unusable"""
+    if expected is list:
+        if isinstance(value, str):
+            value = [line.strip(" -•*\t") for line in value.splitlines()]
+        if not isinstance(value, list):
+            return None
+        items = [str(item).strip() for item in value if str(item).strip()]
+        return items or None
+    if expected is str:
+        if isinstance(value, list):
+            value = "\n".join(f"- {item}" for item in value)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return value.strip()
+    return value if isinstance(value, expected) else None
+
+def parse_structured(text: str, schema: Dict[str, type] = TEACHING_SCHEMA) -> StructuredResult:
+    """Validate a response against a schema field by field"""
+    result = StructuredResult()
+    parsed = extract_json(text) or {}
+    for name, expected in schema.items():
+        value = _coerce(parsed.get(name), expected)
+        if value is None:
+            result.missing.append(name)
+        else:
+            result.data[name] = value
+    return result
+
+def stream_json_field(chunks: Iterable[str], name: str, raw: List[str]) -> Iterator[str]:
+    """Yield the decoded text of one JSON string field while the object is still streaming.
+
+    Every chunk is appended to raw, so the caller can parse the complete
+    response once the stream ends. Nothing is yielded if the field is not
+    a string; parse_structured() still has the final word.
+    """
+    key = re.compile(rf'"{re.escape(name)}"\s*:\s*"')
+    seen = ""       # text before the field's value starts
+    escape = ""     # an escape sequence split across chunks
+    state = "key"
+    for chunk in chunks:
+        raw.append(chunk)
+        if state == "done":
+            continue
+        if state == "key":
+            seen += chunk
+            match = key.search(seen)
+            if not match:
+                continue
+            state, chunk = "value", seen[match.end():]
+        out = []
+        for char in chunk:
+            if state == "done":
+                break
+            if escape or char == "\\":
+                escape += char
+                # \uXXXX (plus its low half for surrogate pairs) or a one-letter escape
+                if escape.startswith("\\u"):
+                    high_surrogate = escape[2:4].lower() in ("d8", "d9", "da", "db")
+                    if len(escape) < 6 or (high_surrogate and len(escape) < 12):
+                        continue
+                elif len(escape) < 2:
+                    continue
+                try:
+                    out.append(json.loads(f'"{escape}"'))
+                except ValueError:
+                    pass
+                escape = ""
+            elif char == '"':
+                state = "done"
+            else:
+                out.append(char)
+        if out:
+            yield "".join(out)
+
+def find_references(text: str) -> List[str]:
+    """Bible references mentioned in free text, in order of first appearance"""
+    return list(dict.fromkeys(match.group(0) for match in REFERENCE_PATTERN.finditer(text or "")))
@@ -0,0 +1,155 @@
+import contextvars
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import Config
+from .model_types import TaskType
+
+# (command name, command id) of the command currently running in this context
+_current_command: contextvars.ContextVar[Optional[Tuple[str, int]]] = contextvars.ContextVar(
+    "usage_command", default=None
+)
+
+def default_prices() -> Dict[str, Tuple[float, float]]:
+    """model_id -> (input, output) USD per million tokens; unlisted models are free"""
+    return {
+        "gemini-1.5-flash": (Config.GEMINI_INPUT_PRICE, Config.GEMINI_OUTPUT_PRICE),
+    }
+
+@dataclass
+class UsageRecord:
+    """Tokens, latency and cost of one model call"""
+    model_id: str
+    task: Optional[str]
+    input_tokens: int
+    output_tokens: int
+    latency: float
+    cost: float
+    command: Optional[str] = None
+    command_id: Optional[int] = None
+    session_id: str = ""
+    timestamp: float = field(default_factory=time.time)
+
+def _totals(records: List[UsageRecord]) -> Dict[str, Any]:
+    return {
+        "calls": len(records),
+        "input_tokens": sum(r.input_tokens for r in records),
+        "output_tokens": sum(r.output_tokens for r in records),
+        "latency": sum(r.latency for r in records),
+        "cost": sum(r.cost for r in records),
+    }
+
+class UsageLedger:
+    """Per-command and per-session record of model usage and estimated spend.
+
+    Model clients call record() after each API call; local models report
+    through InferenceStats (see record_inference). Calls made inside
+    command() are attributed to that command. Records are kept in memory
+    for this session and appended to a JSON-lines file under
+    Config.CACHE_DIR so spend can be compared across sessions.
+    """
+
+    _shared: Optional["UsageLedger"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Optional[Path] = None,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_records: int = 10000, persist: Optional[bool] = None):
+        self.path = Path(path) if path else Config.CACHE_DIR / "usage_ledger.jsonl"
+        self.persist = Config.USAGE_LEDGER_ENABLED if persist is None else persist
+        self.prices = default_prices() if prices is None else prices
+        self.session_id = uuid.uuid4().hex[:12]
+        self._records = deque(maxlen=max_records)
+        self._command_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "UsageLedger":
+        """Get the process-wide ledger"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @contextmanager
+    def command(self, name: str) -> Iterator[int]:
+        """Attribute model calls made in the enclosed block to one command run"""
+        command_id = next(self._command_ids)
+        token = _current_command.set((name, command_id))
+        try:
+            yield command_id
+        finally:
+            _current_command.reset(token)
+
+    def estimate_cost(self, model_id: str, input_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = self.prices.get(model_id, (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def record(self, model_id: str, task: Optional[TaskType], input_tokens: Optional[int],
+               output_tokens: Optional[int], latency: float) -> UsageRecord:
+        command, command_id = _current_command.get() or (None, None)
+        input_tokens, output_tokens = int(input_tokens or 0), int(output_tokens or 0)
+        record = UsageRecord(
+            model_id=model_id,
+            task=task.name if task else None,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            latency=latency,
+            cost=self.estimate_cost(model_id, input_tokens, output_tokens),
+            command=command,
+            command_id=command_id,
+            session_id=self.session_id
+        )
+        with self._lock:
+            self._records.append(record)
+        if self.persist:
+            self._append(record)
+        return record
+
+    def record_inference(self, record) -> Optional[UsageRecord]:
+        """InferenceStats subscriber for local model calls"""
+        if not record.success:
+            return None
+        return self.record(record.model_id, record.task, record.prompt_tokens,
+                           record.generated_tokens, record.total_seconds)
+
+    def records(self, command_id: Optional[int] = None) -> List[UsageRecord]:
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if command_id is None or r.command_id == command_id]
+
+    def command_totals(self, command_id: int) -> Dict[str, Any]:
+        return _totals(self.records(command_id))
+
+    def summary(self, by: str = "command") -> Dict[str, Dict[str, Any]]:
+        """Session totals grouped by a record field: command, task or model_id"""
+        groups: Dict[str, List[UsageRecord]] = {}
+        for record in self.records():
+            groups.setdefault(str(getattr(record, by)), []).append(record)
+        return {name: _totals(records) for name, records in groups.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "session": _totals(self.records()),
+            "by_command": self.summary("command"),
+            "by_task": self.summary("task"),
+            "by_model": self.summary("model_id"),
+        }
+
+    def _append(self, record: UsageRecord):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(asdict(record)) + "\n")
+        except OSError as e:
+            logging.warning(f"Failed to write usage ledger: {str(e)}")
@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+class ModelWarmup:
+    """Load a model and run one dummy generation in a background thread.
+
+    Started before the command prompt appears, so weight loading and the
+    first (slowest) forward pass overlap with the user typing a command.
+    """
+
+    def __init__(self, loader: Callable[[], Any], name: str = "model"):
+        self.loader = loader
+        self.name = name
+        self.model = None
+        self.error: Optional[Exception] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"warmup-{name}", daemon=True)
+
+    def start(self) -> "ModelWarmup":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            self.model = self.loader()
+            self.load_seconds = time.perf_counter() - start
+            if self.model is None:
+                raise RuntimeError(f"{self.name} failed to load")
+
+            # Models without a warmup() hook (e.g. worker pools) are only loaded
+            warmup = getattr(self.model, "warmup", None)
+            if warmup is not None:
+                start = time.perf_counter()
+                warmup()
+                self.warmup_seconds = time.perf_counter() - start
+            logging.info(
+                f"Background warm-up of {self.name} done: load {self.load_seconds:.2f}s"
+                + (f", first generation {self.warmup_seconds:.2f}s" if self.warmup_seconds is not None else "")
+            )
+        except Exception as e:
+            self.error = e
+            logging.error(f"Background warm-up of {self.name} failed: {str(e)}")
+        finally:
+            self.ready.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """Block until warm-up finishes and return the loaded model (or None)"""
+        self.ready.wait(timeout)
+        return self.model
+
+    def get_stats(self):
+        return {
+            "ready": self.ready.is_set(),
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": str(self.error) if self.error else None
+        }
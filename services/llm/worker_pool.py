@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .model_types import TaskType
+from .hf_llm import HuggingFaceLLM
+from .inference_stats import InferenceStats
+from config.settings import Config
+
+# Sent by a worker once its model has loaded (or failed to), before any results
+_READY = "ready"
+
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def _split_cores(cores: List[int], num_workers: int, per_worker: int = 0) -> List[List[int]]:
+    """Give each worker a disjoint, contiguous slice of cores"""
+    per_worker = per_worker or max(1, len(cores) // num_workers)
+    core_sets = []
+    for i in range(num_workers):
+        # Wrap around (sharing cores) when there are more workers than cores
+        start = (i * per_worker) % len(cores)
+        core_sets.append(cores[start:start + per_worker] or cores[:per_worker])
+    return core_sets
+
+def _worker_main(index: int, cores: List[int], requests, results, llm_factory: Callable[[], Any]):
+    """Model worker loop: pin to cores, load the model, then serve generate() requests"""
+    import torch
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(max(1, len(cores)))
+
+    try:
+        llm = llm_factory()
+    except Exception as e:
+        results.put((_READY, index, None, str(e)))
+        return
+    # Requests arrive one at a time, so the micro-batch scheduler would only add wait
+    if getattr(llm, "scheduler", None) is not None:
+        llm.scheduler.close()
+        llm.scheduler = None
+    results.put((_READY, index, (getattr(llm, "model_type", None), getattr(llm, "model_id", None)), None))
+
+    # Inference records are sent back with each result for the parent's stats
+    records = []
+    InferenceStats.shared().subscribe(records.append)
+
+    logging.info(f"Model worker {index} (pid {os.getpid()}) serving on cores {cores}")
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, prompt, task = item
+        records.clear()
+        try:
+            text = llm.generate(prompt, task=task)
+            results.put((request_id, text, None, list(records)))
+        except Exception as e:
+            results.put((request_id, None, str(e), list(records)))
+
+class LocalModelWorkerPool:
+    """Serve generate() from several local model processes.
+
+    Workers are started with forkserver (spawn where it is unavailable)
+    and each loads the model itself: forking a process that already runs
+    threads (warmup, idle reaper, event loop) can deadlock on locks held
+    at fork time. Memory-mapped safetensors weights (Config.HF_MMAP_WEIGHTS)
+    are still shared through the page cache. Each worker is pinned to its
+    own slice of cores with a matching torch thread count, and requests go
+    to the worker with the fewest outstanding requests.
+    """
+
+    def __init__(self, llm_factory: Callable[[], Any], num_workers: int,
+                 threads_per_worker: int = 0, liveness_interval: float = 1.0):
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+            # The single-threaded server imports torch/transformers once; workers fork from it
+            ctx.set_forkserver_preload([__name__])
+        else:
+            ctx = multiprocessing.get_context("spawn")
+        # Workers' records are republished here, so routing must not measure calls again
+        self.inference_stats = InferenceStats.shared()
+
+        self.num_workers = num_workers
+        self.core_sets = _split_cores(_available_cores(), num_workers, threads_per_worker)
+        self._results = ctx.Queue()
+        self._queues = []
+        self._processes = []
+        for index, cores in enumerate(self.core_sets):
+            requests = ctx.Queue()
+            process = ctx.Process(
+                target=_worker_main,
+                args=(index, cores, requests, self._results, llm_factory),
+                name=f"model-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._queues.append(requests)
+            self._processes.append(process)
+
+        self.liveness_interval = liveness_interval
+        self._dead: Set[int] = set()
+        self.model_type, self.model_id = self._wait_until_loaded()
+        self.liveness_interval = liveness_interval
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._assigned: Dict[int, int] = {}
+        self.outstanding = [0] * num_workers
+        self.served = [0] * num_workers
+        self._collector = threading.Thread(target=self._collect, name="model-worker-results", daemon=True)
+        self._collector.start()
+        logging.info(f"Started {num_workers} model workers for {self.model_id} on cores {self.core_sets}")
+
+    def _wait_until_loaded(self) -> Tuple[Any, str]:
+        """Block until every worker has loaded its model; raises if none could"""
+        info, errors, waiting = None, [], set(range(self.num_workers))
+        while waiting:
+            try:
+                _, index, loaded, error = self._results.get(timeout=self.liveness_interval)
+            except queue.Empty:
+                for index in list(waiting):
+                    if not self._processes[index].is_alive():
+                        waiting.discard(index)
+                        errors.append(f"worker {index} exited with code {self._processes[index].exitcode}")
+                        self._dead.add(index)
+                continue
+            waiting.discard(index)
+            if error is not None:
+                errors.append(error)
+                self._dead.add(index)
+            else:
+                info = info or loaded
+        if info is None:
+            self._stop_workers(timeout=1.0)
+            raise RuntimeError(f"No model worker could load the model: {'; '.join(errors)}")
+        for error in errors:
+            logging.error(f"Model worker failed to load: {error}")
+        model_type, model_id = info
+        return model_type, model_id or "local-worker-pool"
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._results.get(timeout=self.liveness_interval)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if item is None:
+                break
+            request_id, text, error, records = item
+            for record in records:
+                self.inference_stats.record(record)
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+                worker = self._assigned.pop(request_id, None)
+                if worker is not None:
+                    self.outstanding[worker] -= 1
+                    self.served[worker] += 1
+            if future is None:
+                continue
+            if error:
+                logging.error(f"Model worker generation error: {error}")
+                future.set_result(None)
+            else:
+                future.set_result(text)
+
+    def _check_workers(self):
+        """Fail requests held by workers that have died so their callers do not hang"""
+        with self._lock:
+            for worker, process in enumerate(self._processes):
+                if worker not in self._dead and not process.is_alive():
+                    self._dead.add(worker)
+                    logging.error(f"Model worker {worker} exited with code {process.exitcode}")
+            lost = [request_id for request_id, worker in self._assigned.items() if worker in self._dead]
+            futures = [self._pending.pop(request_id) for request_id in lost]
+            for request_id in lost:
+                self.outstanding[self._assigned.pop(request_id)] -= 1
+        for future in futures:
+            future.set_result(None)
+
+    def _fail_pending(self):
+        with self._lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+            self._assigned.clear()
+            self.outstanding = [0] * self.num_workers
+        for future in futures:
+            future.set_result(None)
+
+    def submit(self, prompt: str, task: Optional[TaskType] = None) -> Future:
+        """Send a request to the least-loaded live worker"""
+        future = Future()
+        with self._lock:
+            workers = [i for i in range(self.num_workers) if i not in self._dead]
+            if self._closed or not workers:
+                logging.error("No model worker available")
+                future.set_result(None)
+                return future
+            request_id = next(self._ids)
+            worker = min(workers, key=lambda i: self.outstanding[i])
+            self.outstanding[worker] += 1
+            self._pending[request_id] = future
+            self._assigned[request_id] = worker
+        self._queues[worker].put((request_id, prompt, task))
+        return future
+
+    def generate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        return self.submit(prompt, task=task).result()
+
+    async def agenerate(self, prompt: str, task: Optional[TaskType] = None) -> Optional[str]:
+        return await asyncio.wrap_future(self.submit(prompt, task=task))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "core_sets": self.core_sets,
+                "outstanding": list(self.outstanding),
+                "served": list(self.served),
+                "alive": [p.is_alive() for p in self._processes]
+            }
+
+    def _stop_workers(self, timeout: float):
+        for requests in self._queues:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+
+    def close(self, timeout: float = 10.0):
+        with self._lock:
+            self._closed = True
+        self._stop_workers(timeout)
+        self._results.put(None)
+        self._collector.join(timeout)
+        # Anything the workers did not answer before exiting
+        self._fail_pending()
+
+def create_local_llm(model_id: str) -> Any:
+    """Build a local HF model, behind a worker pool when several workers are configured"""
+    if Config.HF_NUM_WORKERS > 1:
+        return LocalModelWorkerPool(
+            functools.partial(HuggingFaceLLM, model_id=model_id),
+            num_workers=Config.HF_NUM_WORKERS,
+            threads_per_worker=Config.HF_THREADS_PER_WORKER
+        )
+    return HuggingFaceLLM(model_id=model_id)
@@ -1,26 +1,85 @@
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 from .llm.gemini_llm import GeminiLLM
+from .llm.worker_pool import create_local_llm
+from .llm.onnx_llm import OnnxLLM
+from .llm.remote_llm import RemoteLLM, parse_endpoints
 from .llm.model_types import ModelType
+from .llm.residency import ModelResidencyManager, PinnedModel, total_memory_mb
 from config.settings import Config
 import logging
+import threading
+
+# Models held in process memory and managed by the residency manager
+LOCAL_MODELS = {ModelType.PHI, ModelType.LLAMA, ModelType.ONNX}
 
 class ModelManager:
+    """Process-wide owner of model instances.
+
+    Local models live in one ModelResidencyManager, so every caller shares
+    the same copy and the RAM budget; callers get a PinnedModel handle.
+    Remote models are created once and kept.
+    """
     _instance = None
     _models: Dict = {}
+    _locks: Dict = {}
+    _locks_guard = threading.Lock()
+    _residency: Optional[ModelResidencyManager] = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ModelManager, cls).__new__(cls)
         return cls._instance
 
+    def _lock_for(self, model_type: ModelType) -> threading.Lock:
+        # One lock per model type so a background load does not block other models
+        with self._locks_guard:
+            return self._locks.setdefault(model_type, threading.Lock())
+
+    @property
+    def residency(self) -> ModelResidencyManager:
+        """The RAM-budgeted store all local models are loaded through"""
+        with self._locks_guard:
+            if ModelManager._residency is None:
+                ModelManager._residency = ModelResidencyManager(
+                    self._create_model,
+                    memory_budget_mb=Config.MODEL_MEMORY_BUDGET_MB or 0.8 * (total_memory_mb() or 0),
+                    idle_timeout=Config.MODEL_IDLE_TIMEOUT,
+                    min_free_mb=Config.MODEL_MIN_FREE_MB
+                )
+            return ModelManager._residency
+
+    @staticmethod
+    def _create_model(model_type: ModelType) -> Optional[Any]:
+        try:
+            if model_type == ModelType.GEMINI:
+                return GeminiLLM(api_keys=Config.gemini_api_keys())
+            elif model_type == ModelType.PHI:
+                return create_local_llm("microsoft/phi-2")
+            elif model_type == ModelType.LLAMA:
+                return create_local_llm("meta-llama/Llama-2-7b-chat-hf")
+            elif model_type == ModelType.ONNX:
+                return OnnxLLM(model_id=Config.ONNX_MODEL_ID)
+            elif model_type == ModelType.REMOTE:
+                return RemoteLLM(endpoints=parse_endpoints(Config.REMOTE_ENDPOINTS))
+            return None
+        except Exception as e:
+            logging.error(f"Failed to initialize model {model_type}: {str(e)}")
+            return None
+
     def get_model(self, model_type: ModelType):
         """Get or create model instance"""
-        if model_type not in self._models:
-            try:
-                if model_type == ModelType.GEMINI:
-                    self._models[model_type] = GeminiLLM(api_key=Config.GEMINI_API_KEY)
-                logging.info(f"Initialized model: {model_type}")
-            except Exception as e:
-                logging.error(f"Failed to initialize model {model_type}: {str(e)}")
+        if model_type in LOCAL_MODELS:
+            # Calls through the handle pin the model so eviction cannot close it mid-generation
+            if self.residency.get(model_type) is None:
                 return None
-        return self._models[model_type]
\ No newline at end of file
+            return PinnedModel(self.residency, model_type)
+        if model_type in self._models:
+            return self._models[model_type]
+        with self._lock_for(model_type):
+            if model_type not in self._models:
+                model = self._create_model(model_type)
+                if model is None:
+                    return None
+                self._models[model_type] = model
+                logging.info(f"Initialized model: {model_type}")
+            return self._models[model_type]
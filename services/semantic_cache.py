@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import Config
+
+# Filler words that do not change what a teaching topic is about
+TOPIC_STOPWORDS = {
+    "a", "an", "the", "of", "on", "about", "in", "to", "for", "and", "is", "are", "me", "us",
+    "what", "does", "do", "say", "says", "tell", "teach", "teaching", "teachings", "how", "why",
+    "when", "with", "my", "our", "your", "i", "we", "it", "be",
+    "bible", "biblical", "scripture", "scriptures", "god", "gods", "lord", "lords"
+}
+
+def normalize_topic(text: str) -> str:
+    """Lowercase, drop punctuation, possessives, filler words and plurals"""
+    text = re.sub(r"[’']s\b", "", text.lower())
+    words = re.findall(r"[a-z0-9]+", text)
+    kept = [w for w in words if w not in TOPIC_STOPWORDS]
+    # Crude plural folding: "prayers" -> "prayer", but leave "faithfulness" alone
+    kept = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in kept]
+    return " ".join(kept or words)
+
+def char_ngrams(text: str, n: int = 3) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + n] for i in range(max(1, len(padded) - n + 1))]
+
+@dataclass
+class SemanticEntry:
+    topic: str
+    normalized: str
+    value: Any
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+    last_hit_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.__dict__.copy()
+
+class SemanticCache:
+    """Serve cached results for topics that mean the same thing.
+
+    Topics are normalized ("What does the Bible say about love?" and
+    "God's love" both become "love") and embedded as TF-IDF weighted
+    character trigrams hashed into a fixed number of dimensions, so small
+    wording changes still match. A lookup returns the most similar entry if its cosine similarity
+    reaches the threshold. Entries persist to a JSON file under
+    Config.CACHE_DIR.
+    """
+
+    _shared: Dict[str, "SemanticCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, name: str, path: Optional[Path] = None,
+                 threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 dimensions: int = 4096):
+        self.name = name
+        self.path = Path(path) if path else Config.CACHE_DIR / f"semantic_{name}.json"
+        self.threshold = Config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl = Config.SEMANTIC_CACHE_TTL if ttl is None else ttl
+        self.dimensions = dimensions
+        self.hits = 0
+        self.misses = 0
+        self._entries: List[SemanticEntry] = []
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def shared(cls, name: str) -> "SemanticCache":
+        """Get the process-wide cache for a namespace (e.g. "teach")"""
+        with cls._shared_lock:
+            if name not in cls._shared:
+                cls._shared[name] = cls(name)
+            return cls._shared[name]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _term_frequencies(self, normalized: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for gram in char_ngrams(normalized):
+            vector[zlib.crc32(gram.encode("utf-8")) % self.dimensions] += 1
+        # Sublinear tf so repeated grams in long topics do not dominate
+        return np.log1p(vector)
+
+    def _weighted(self, vectors: np.ndarray) -> np.ndarray:
+        """Apply smoothed IDF from the cached topics and L2-normalize rows"""
+        document_frequency = np.count_nonzero(self._vectors, axis=0)
+        idf = np.log((1 + len(self._entries)) / (1 + document_frequency)) + 1
+        weighted = vectors * idf
+        norms = np.linalg.norm(weighted, axis=-1, keepdims=True)
+        return weighted / np.where(norms == 0, 1, norms)
+
+    def _expired(self, entry: SemanticEntry, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created_at > self.ttl
+
+    def lookup(self, topic: str) -> Optional[Tuple[SemanticEntry, float]]:
+        """Best matching entry and its similarity, counting a hit or a miss"""
+        normalized = normalize_topic(topic)
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            match = None
+            if self._entries:
+                query = self._weighted(self._term_frequencies(normalized)[None, :])[0]
+                similarities = self._weighted(self._vectors) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    match = (self._entries[best], float(similarities[best]))
+
+            if match is None:
+                self.misses += 1
+                return None
+            entry, similarity = match
+            entry.hits += 1
+            entry.last_hit_at = now
+            self.hits += 1
+
+        logging.info(
+            f"Semantic cache hit for '{topic}' (matched '{entry.topic}', similarity {similarity:.2f}; "
+            f"{self.name} hit rate {self.hit_rate:.0%})"
+        )
+        return match
+
+    def get(self, topic: str) -> Optional[Any]:
+        match = self.lookup(topic)
+        return match[0].value if match else None
+
+    def set(self, topic: str, value: Any):
+        normalized = normalize_topic(topic)
+        vector = self._term_frequencies(normalized)
+        with self._lock:
+            # Replace an entry for the same normalized topic instead of duplicating it
+            for index, entry in enumerate(self._entries):
+                if entry.normalized == normalized:
+                    self._remove(index)
+                    break
+            if len(self._entries) >= self.max_entries:
+                # Drop the least used entry, oldest first among ties
+                self._remove(min(range(len(self._entries)),
+                                 key=lambda i: (self._entries[i].hits, self._entries[i].created_at)))
+            self._entries.append(SemanticEntry(topic=topic, normalized=normalized, value=value))
+            self._vectors = np.vstack([self._vectors, vector[None, :]])
+        self._save()
+
+    def _remove(self, index: int):
+        del self._entries[index]
+        self._vectors = np.delete(self._vectors, index, axis=0)
+
+    def _drop_expired(self, now: float):
+        for index in reversed(range(len(self._entries))):
+            if self._expired(self._entries[index], now):
+                self._remove(index)
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """Hit rate plus the most frequently served entries"""
+        with self._lock:
+            popular = sorted(self._entries, key=lambda e: e.hits, reverse=True)[:top]
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "threshold": self.threshold,
+                "top_entries": [
+                    {"topic": e.topic, "hits": e.hits, "last_hit_at": e.last_hit_at} for e in popular
+                ]
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        self._save()
+
+    def _save(self):
+        """Write entries atomically so a crash never leaves a torn file"""
+        with self._lock:
+            data = [entry.to_dict() for entry in self._entries]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(data, default=str))
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError) as e:
+            logging.warning(f"Failed to save semantic cache {self.name}: {str(e)}")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            entries = [SemanticEntry(**item) for item in json.loads(self.path.read_text())]
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable semantic cache {self.path}: {str(e)}")
+            return
+        now = time.time()
+        self._entries = [e for e in entries if not self._expired(e, now)][-self.max_entries:]
+        if self._entries:
+            self._vectors = np.vstack([self._term_frequencies(e.normalized) for e in self._entries])
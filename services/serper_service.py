@@ -5,6 +5,9 @@ from datetime import datetime
 import time
 from functools import lru_cache
 import logging
+from config.settings import Config
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.single_flight import SingleFlight
 
 class SerperService:
     def __init__(self, api_key: str):
@@ -14,37 +17,48 @@ class SerperService:
             'X-API-KEY': api_key,
             'Content-Type': 'application/json'
         }
-        self.timeout = 10
+        self.timeout = Config.SEARCH_TIMEOUT
         self.max_retries = 3
+        self.breaker = CircuitBreaker.get("serper", max_timeout=self.timeout)
+        self.single_flight = SingleFlight.shared()
 
-    @lru_cache(maxsize=100)
     def search(self, query: str) -> List[Dict]:
         """Perform search with enhanced result length"""
         try:
-            url = "https://google.serper.dev/search"
-            headers = {
-                'X-API-KEY': self.api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'q': f'biblical teaching {query}',
-                'num': 5,  # Number of results
-                'page': 1,
-                'type': 'search',
-                'snippetLength': 300  # Request longer snippets
-            }
-            
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get('organic', [])[:5]  # Return top 5 results
-            
+            # Concurrent identical queries share one request
+            return self.single_flight.do(("serper", query), self._search, query)
+        except CircuitOpenError as e:
+            logging.warning(str(e))
+            return []
         except Exception as e:
             logging.error(f"Search error: {str(e)}")
             return []
 
+    @lru_cache(maxsize=100)
+    def _search(self, query: str) -> List[Dict]:
+        # Raises on failure so that only successful results are cached
+        url = "https://google.serper.dev/search"
+        headers = {
+            'X-API-KEY': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'q': f'biblical teaching {query}',
+            'num': 5,  # Number of results
+            'page': 1,
+            'type': 'search',
+            'snippetLength': 300  # Request longer snippets
+        }
+        
+        data = self.breaker.call(self._post, url, headers, payload)
+        return data.get('organic', [])[:5]  # Return top 5 results
+
+    def _post(self, url: str, headers: Dict, payload: Dict) -> Dict:
+        response = requests.post(url, headers=headers, json=payload, timeout=self.breaker.timeout())
+        response.raise_for_status()
+        return response.json()
+
     def _parse_results(self, raw_results: Dict) -> List[Dict]:
         """Parse and clean search results"""
         parsed = []
@@ -68,14 +82,7 @@ class SerperService:
             "num": num_results
         }
         
-        response = requests.post(
-            endpoint,
-            headers=self.headers,
-            json=payload,
-            timeout=self.timeout
-        )
-        response.raise_for_status()
-        return self._parse_news_results(response.json())
+        return self._parse_news_results(self.breaker.call(self._post, endpoint, self.headers, payload))
 
     def _parse_news_results(self, raw_results: Dict) -> List[Dict]:
         """Parse news search results"""
@@ -89,4 +96,4 @@ class SerperService:
 
     def clear_cache(self):
         """Clear the search cache"""
-        self.search.cache_clear()
\ No newline at end of file
+        self._search.cache_clear()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+_uncoalesced: contextvars.ContextVar[bool] = contextvars.ContextVar("single_flight_uncoalesced", default=False)
+
+@contextmanager
+def uncoalesced() -> Iterator[None]:
+    """Make the enclosed calls go out on their own instead of joining identical in-flight ones.
+
+    Used for hedged attempts, which exist to race the call already in flight.
+    """
+    token = _uncoalesced.set(True)
+    try:
+        yield
+    finally:
+        _uncoalesced.reset(token)
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+@dataclass
+class _AsyncCall:
+    task: asyncio.Task
+    waiters: int = 1
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving with
+    the same key while it is in flight wait for it and receive the same
+    result (or exception). Nothing is remembered once the call finishes,
+    so this complements caching rather than replacing it.
+    """
+
+    _shared: Optional["SingleFlight"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], _AsyncCall] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    @classmethod
+    def shared(cls) -> "SingleFlight":
+        """Get the process-wide instance; keys should be namespaced per dependency"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn, or wait for an identical call already in flight on another thread"""
+        if _uncoalesced.get():
+            with self._lock:
+                self.bypassed += 1
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logging.debug(f"Joined in-flight call for {key!r}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Async variant of do(); calls are shared within one event loop.
+
+        The shared call is cancelled only when every caller waiting on it
+        has been cancelled.
+        """
+        if _uncoalesced.get():
+            with self._lock:
+                self.bypassed += 1
+            return await fn(*args, **kwargs)
+
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            call = self._async_calls.get(loop_key)
+            if call is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                call = self._async_calls[loop_key] = _AsyncCall(task=task)
+                task.add_done_callback(lambda _: self._forget(loop_key, task))
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                logging.debug(f"Joined in-flight call for {key!r}")
+
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0
+            if abandoned:
+                call.task.cancel()
+            raise
+
+    def _forget(self, loop_key: Tuple[int, Hashable], task: asyncio.Task):
+        with self._lock:
+            call = self._async_calls.get(loop_key)
+            if call is not None and call.task is task:
+                del self._async_calls[loop_key]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "bypassed": self.bypassed,
+                "in_flight": len(self._calls) + len(self._async_calls)
+            }
@@ -26,6 +26,9 @@ setup(
         "accelerate>=0.20.0",
         "rich>=12.0.0",
     ],
+    extras_require={
+        "onnx": ["optimum[onnxruntime]>=1.16.0", "onnxruntime>=1.16.0"],
+    },
     entry_points={
         'console_scripts': [
             'bible=main:main',  # Main application entry point
@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import pytest
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions
+from config.settings import Config
+from services.llm.api_key_pool import ApiKeyPool, is_auth_error
+from services.llm.gemini_llm import GeminiLLM, KeyClients
+from services.llm.generation_profiles import profile_for
+from services.llm.model_types import TaskType
+
+_pool_names = itertools.count()
+
+class FakeClient:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.error = None
+        self.calls = 0
+        self.timeouts = []
+        self.sync = self
+
+    def generate_content(self, request, retry=None, timeout=None):
+        self.timeouts.append(timeout)
+        # Apply the retry policy the way the real client does
+        return retry(self._generate)(request) if retry else self._generate(request)
+
+    def _generate(self, request):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=f"answer from {self.api_key}")]))],
+            usage_metadata={"total_token_count": 10}
+        )
+
+    def stream_generate_content(self, request, retry=None, timeout=None):
+        self.timeouts.append(timeout)
+        return iter([self._generate(request)])
+
+def make_pool(keys=("key-a", "key-b", "key-c"), **kwargs):
+    # Unique names keep the shared breakers and limiters of different tests apart
+    return ApiKeyPool(list(keys), FakeClient, requests_per_minute=60, tokens_per_minute=10000,
+                      name=f"pool-test-{next(_pool_names)}", **kwargs)
+
+class TestSelection:
+    def test_round_robin(self):
+        pool = make_pool(strategy="round_robin")
+
+        assert [pool.select().key for _ in range(4)] == ["key-a", "key-b", "key-c", "key-a"]
+
+    def test_least_loaded_prefers_idle_keys(self):
+        pool = make_pool(strategy="least_loaded")
+        first = pool.select()
+        with pool.use(first):
+            assert pool.select() is not first
+
+    def test_least_loaded_avoids_drained_quota(self):
+        pool = make_pool(keys=("key-a", "key-b"), strategy="least_loaded")
+        pool.keys[0].limiter.penalize()
+
+        assert pool.select().key == "key-b"
+
+    def test_duplicate_keys_are_merged(self):
+        assert len(make_pool(keys=("key-a", "key-a")).keys) == 1
+
+class TestHealth:
+    def test_auth_errors_remove_the_key(self):
+        pool = make_pool(keys=("key-a", "key-b"))
+        pool.record_error(pool.keys[0], exceptions.PermissionDenied("bad key"))
+
+        assert pool.keys[0].disabled
+        assert all(pool.select().key == "key-b" for _ in range(3))
+        assert pool.get_stats()["available"] == 1
+
+    def test_tripped_keys_are_skipped(self):
+        pool = make_pool(keys=("key-a", "key-b"))
+        for _ in range(pool.keys[0].breaker.failure_threshold):
+            pool.keys[0].breaker.record_failure()
+
+        assert pool.select().key == "key-b"
+
+    def test_no_key_available(self):
+        pool = make_pool(keys=("key-a",))
+        pool.record_error(pool.keys[0], exceptions.Unauthenticated("bad key"))
+
+        assert pool.select() is None
+
+    def test_is_auth_error(self):
+        assert is_auth_error(exceptions.InvalidArgument("API key not valid. reason: API_KEY_INVALID"))
+        assert not is_auth_error(exceptions.InvalidArgument("prompt too long"))
+        assert not is_auth_error(exceptions.ResourceExhausted("quota"))
+
+class TestGeminiKeyPool:
+    @pytest.fixture
+    def gemini(self, monkeypatch):
+        monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+        llm = GeminiLLM(api_keys=[f"pooled-{next(_pool_names)}-{i}" for i in range(2)])
+        for key in llm.key_pool.keys:
+            key.client = FakeClient(key.key)
+        return llm
+
+    def test_spreads_requests_across_keys(self, gemini):
+        gemini.key_pool.strategy = "round_robin"
+        for i in range(4):
+            assert gemini.generate(f"prompt {i}")
+
+        assert [key.client.calls for key in gemini.key_pool.keys] == [2, 2]
+
+    def test_throttled_key_falls_over_to_another(self, gemini):
+        throttled, healthy = gemini.key_pool.keys
+        gemini.key_pool.strategy = "round_robin"
+        throttled.client.error = exceptions.ResourceExhausted("quota exceeded")
+
+        results = [gemini.generate(f"prompt {i}") for i in range(2)]
+
+        assert results == [f"answer from {healthy.key}"] * 2
+        assert throttled.limiter.get_stats()["throttled"] >= 1
+
+    def test_throttled_call_is_not_retried_on_the_same_key(self, gemini, monkeypatch):
+        key = gemini.key_pool.keys[0]
+        monkeypatch.setattr(gemini.key_pool, "keys", [key])
+        key.client.error = exceptions.ResourceExhausted("quota exceeded")
+        settled = []
+        settle = gemini._settle_quota
+        monkeypatch.setattr(gemini, "_settle_quota", lambda *args, **kwargs: settled.append(
+            kwargs.get("error")) or settle(*args, **kwargs))
+
+        assert gemini.generate("prompt") is None
+        assert key.client.calls == 1
+        assert isinstance(settled[0], exceptions.ResourceExhausted)
+
+    def test_unavailable_is_retried(self, gemini, monkeypatch):
+        key = gemini.key_pool.keys[0]
+        errors = [exceptions.ServiceUnavailable("busy")]
+        generate = key.client._generate
+
+        def flaky(request):
+            if errors:
+                key.client.calls += 1
+                raise errors.pop()
+            return generate(request)
+
+        monkeypatch.setattr(key.client, "_generate", flaky)
+        monkeypatch.setattr(gemini, "_select_key", lambda: key)
+
+        assert gemini.generate("prompt") == f"answer from {key.key}"
+        assert key.client.calls == 2
+
+    def test_timeouts_follow_the_task_and_streams_get_the_ceiling(self, gemini, monkeypatch):
+        key = gemini.key_pool.keys[0]
+        monkeypatch.setattr(gemini, "_select_key", lambda: key)
+        for _ in range(10):
+            key.breaker.record_success(0.01, profile=profile_for(TaskType.EXTRACTION).name)
+
+        gemini.generate("prompt", task=TaskType.EXTRACTION)
+        gemini.generate("other prompt", task=TaskType.TEACHING)
+        assert list(gemini.generate_stream("third prompt", task=TaskType.TEACHING)) == [f"answer from {key.key}"]
+
+        extraction, teaching, stream = key.client.timeouts
+        assert extraction == key.breaker.min_timeout
+        # Quick extraction calls do not shorten the deadline of long answers
+        assert teaching == stream == key.breaker.max_timeout
+
+class TestKeyClients:
+    def test_async_client_per_event_loop(self):
+        clients = KeyClients("loop-test-key")
+
+        async def grab():
+            first = clients.for_running_loop()
+            assert clients.for_running_loop() is first
+            return first
+
+        first_loop, second_loop = asyncio.run(grab()), asyncio.run(grab())
+
+        assert first_loop is not second_loop
+        # The first loop is closed, so its client was dropped
+        assert len(clients._async) == 1
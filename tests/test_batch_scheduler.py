@@ -0,0 +1,88 @@
+import threading
+import pytest
+from services.llm.batch_scheduler import MicroBatchScheduler
+
+@pytest.fixture
+def batches():
+    return []
+
+@pytest.fixture
+def scheduler(batches):
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item.upper() for item in items]
+
+    scheduler = MicroBatchScheduler(batch_fn, max_batch_size=4, max_wait=0.1)
+    yield scheduler
+    scheduler.close()
+
+class TestMicroBatchScheduler:
+    def test_single_request(self, scheduler):
+        assert scheduler.submit("love").result(timeout=1) == "LOVE"
+
+    def test_concurrent_requests_are_merged(self, scheduler, batches):
+        results = {}
+
+        def call(topic):
+            results[topic] = scheduler.submit(topic).result(timeout=2)
+
+        topics = ["love", "faith", "hope", "grace"]
+        threads = [threading.Thread(target=call, args=(t,)) for t in topics]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {t: t.upper() for t in topics}
+        assert len(batches) < len(topics)
+
+    def test_max_batch_size_respected(self, scheduler, batches):
+        futures = [scheduler.submit(str(i)) for i in range(10)]
+        assert [f.result(timeout=2) for f in futures] == [str(i) for i in range(10)]
+        assert all(len(batch) <= 4 for batch in batches)
+
+    def test_group_key_keeps_keys_apart(self, batches):
+        def batch_fn(items):
+            batches.append(list(items))
+            return [topic for topic, _ in items]
+
+        scheduler = MicroBatchScheduler(batch_fn, max_batch_size=8, max_wait=0.1,
+                                        group_key=lambda item: item[1])
+        items = [("love", "teaching"), ("faith", "chat"), ("hope", "teaching"), ("grace", "chat")]
+        futures = [scheduler.submit(item) for item in items]
+
+        assert [f.result(timeout=2) for f in futures] == ["love", "faith", "hope", "grace"]
+        assert all(len({key for _, key in batch}) == 1 for batch in batches)
+        scheduler.close()
+
+    def test_errors_propagate_to_callers(self):
+        def failing(items):
+            raise ValueError("model failure")
+
+        scheduler = MicroBatchScheduler(failing, max_wait=0.01)
+        with pytest.raises(ValueError):
+            scheduler.submit("love").result(timeout=1)
+        scheduler.close()
+
+    def test_close_leaves_no_request_unanswered(self, scheduler):
+        futures = []
+
+        def call():
+            for i in range(50):
+                try:
+                    futures.append(scheduler.submit(str(i)))
+                except RuntimeError:
+                    return
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        scheduler.close()
+        for thread in threads:
+            thread.join()
+
+        # Every accepted request is either answered or failed, never left pending
+        for future in futures:
+            assert future.exception(timeout=2) is None or isinstance(future.exception(), RuntimeError)
+        with pytest.raises(RuntimeError):
+            scheduler.submit("late")
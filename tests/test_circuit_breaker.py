@@ -0,0 +1,179 @@
+import asyncio
+import time
+import pytest
+import requests
+from services.circuit_breaker import BreakerState, CircuitBreaker, CircuitOpenError, is_outage
+
+class FlakyDependency:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def __call__(self, value="ok"):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return value
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("test", max_timeout=10.0, failure_threshold=3,
+                          recovery_timeout=0.05, min_timeout=0.5, timeout_multiplier=3.0)
+
+@pytest.fixture
+def dependency():
+    return FlakyDependency()
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+def trip(breaker, dependency):
+    dependency.error = ConnectionError("down")
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(dependency)
+
+class TestStateMachine:
+    def test_opens_after_consecutive_failures(self, breaker, dependency):
+        trip(breaker, dependency)
+
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.trips == 1
+
+    def test_fails_fast_while_open(self, breaker, dependency):
+        trip(breaker, dependency)
+        calls = dependency.calls
+
+        with pytest.raises(CircuitOpenError):
+            breaker.call(dependency)
+
+        assert dependency.calls == calls
+        assert breaker.rejected == 1
+
+    def test_success_resets_failure_count(self, breaker, dependency):
+        dependency.error = ConnectionError("down")
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                breaker.call(dependency)
+        dependency.error = None
+        breaker.call(dependency)
+
+        assert breaker.consecutive_failures == 0
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_half_open_probe_closes_on_success(self, breaker, dependency):
+        trip(breaker, dependency)
+        time.sleep(0.06)
+
+        assert breaker.state == BreakerState.HALF_OPEN
+        dependency.error = None
+        assert breaker.call(dependency) == "ok"
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_half_open_allows_a_single_probe(self, breaker, dependency):
+        trip(breaker, dependency)
+        time.sleep(0.06)
+
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+
+    def test_failed_probe_reopens(self, breaker, dependency):
+        trip(breaker, dependency)
+        time.sleep(0.06)
+
+        with pytest.raises(ConnectionError):
+            breaker.call(dependency)
+
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.trips == 2
+
+    def test_client_errors_do_not_trip(self, breaker, dependency):
+        dependency.error = http_error(400)
+        for _ in range(5):
+            with pytest.raises(requests.HTTPError):
+                breaker.call(dependency)
+
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_async_call(self, breaker):
+        async def down():
+            raise ConnectionError("down")
+
+        async def run():
+            for _ in range(3):
+                with pytest.raises(ConnectionError):
+                    await breaker.acall(down)
+            with pytest.raises(CircuitOpenError):
+                await breaker.acall(down)
+
+        asyncio.run(run())
+
+    def test_cancelled_probe_frees_the_slot(self, breaker, dependency):
+        trip(breaker, dependency)
+        time.sleep(0.06)
+        failures = breaker.failures
+
+        async def run():
+            probe = asyncio.create_task(breaker.acall(asyncio.sleep, 10))
+            await asyncio.sleep(0.01)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+        asyncio.run(run())
+
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.failures == failures
+        dependency.error = None
+        assert breaker.call(dependency) == "ok"
+        assert breaker.state == BreakerState.CLOSED
+
+class TestIsOutage:
+    def test_classification(self):
+        assert is_outage(ConnectionError("down"))
+        assert is_outage(http_error(503))
+        assert is_outage(http_error(429))
+        assert not is_outage(http_error(404))
+
+class TestAdaptiveTimeout:
+    def test_uses_max_until_enough_samples(self, breaker):
+        breaker.record_success(0.1)
+
+        assert breaker.timeout() == 10.0
+
+    def test_follows_recent_p95(self, breaker):
+        for _ in range(20):
+            breaker.record_success(1.0)
+
+        assert breaker.timeout() == pytest.approx(3.0)
+
+    def test_clamped(self, breaker):
+        for _ in range(20):
+            breaker.record_success(0.01)
+        assert breaker.timeout() == 0.5
+
+        for _ in range(100):
+            breaker.record_success(60.0)
+        assert breaker.timeout() == 10.0
+
+    def test_profiles_have_separate_windows(self, breaker):
+        for _ in range(20):
+            breaker.call(lambda: None, latency_profile="extraction")
+        for _ in range(20):
+            breaker.record_success(3.0, profile="teaching")
+
+        assert breaker.timeout("extraction") == 0.5
+        assert breaker.timeout("teaching") == 9.0
+        # Neither profile shrinks the timeout of calls without one
+        assert breaker.timeout() == 10.0
+
+class TestRegistry:
+    def test_shared_by_name(self):
+        first = CircuitBreaker.get("registry-test", max_timeout=5.0)
+
+        assert CircuitBreaker.get("registry-test", max_timeout=1.0) is first
+        stats = CircuitBreaker.all_stats()["registry-test"]
+        assert stats["state"] == "closed"
+        assert stats["timeout"] == 5.0
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+import pytest
+from google.ai import generativelanguage as glm
+from config.settings import Config
+from services.llm.gemini_llm import GeminiLLM
+from services.llm.hedged_llm import HedgedLLM
+from services.llm.model_types import ModelType, TaskType
+
+class FakeModel:
+    def __init__(self, result="answer", delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    def generate(self, prompt, task=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.result
+
+    async def agenerate(self, prompt, task=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.result
+
+class FakeSelector:
+    def __init__(self, p95):
+        self.p95 = p95
+        self.updates = []
+
+    def get_latency_profile(self, model_type, task=None):
+        return self.p95 / 2, self.p95
+
+    def update_performance(self, model_type, success, latency, task=None):
+        self.updates.append((model_type, success))
+
+def make_hedged(models, hedge=True, p95=0.05):
+    chain = list(models)
+    return HedgedLLM(
+        chain=[model_type for model_type, _ in chain],
+        model_getter=lambda model_type: dict(chain)[model_type],
+        selector=FakeSelector(p95),
+        hedge=hedge,
+        min_delay=0.0
+    )
+
+class TestHedgedLLM:
+    def test_fast_primary_is_not_hedged(self):
+        primary, backup = FakeModel("primary"), FakeModel("backup")
+        llm = make_hedged([(ModelType.GEMINI, primary), (ModelType.ONNX, backup)])
+
+        assert llm.generate("love") == "primary"
+        assert backup.calls == 0
+        assert llm.get_stats()["hedged_requests"] == 0
+
+    def test_slow_primary_is_hedged(self):
+        primary, backup = FakeModel("primary", delay=1.0), FakeModel("backup")
+        llm = make_hedged([(ModelType.GEMINI, primary), (ModelType.ONNX, backup)])
+
+        start = time.perf_counter()
+        assert llm.generate("love", task=TaskType.TEACHING) == "backup"
+        assert time.perf_counter() - start < 0.5
+        assert llm.get_stats()["hedged_requests"] == 1
+
+    def test_falls_back_on_empty_answer(self):
+        primary, backup = FakeModel(None), FakeModel("backup")
+        llm = make_hedged([(ModelType.GEMINI, primary), (ModelType.ONNX, backup)], hedge=False)
+
+        assert llm.generate("love") == "backup"
+        assert llm.get_stats()["fallbacks"] == 1
+        assert llm.selector.updates[0] == (ModelType.GEMINI, False)
+
+    def test_without_hedging_slow_primary_is_awaited(self):
+        primary, backup = FakeModel("primary", delay=0.2), FakeModel("backup")
+        llm = make_hedged([(ModelType.GEMINI, primary), (ModelType.ONNX, backup)], hedge=False)
+
+        assert llm.generate("love") == "primary"
+        assert backup.calls == 0
+
+    def test_missing_model_falls_through(self):
+        llm = make_hedged([(ModelType.PHI, None), (ModelType.GEMINI, FakeModel("backup"))])
+        assert llm.generate("love") == "backup"
+
+    def test_all_backends_fail(self):
+        llm = make_hedged([(ModelType.GEMINI, FakeModel(None)), (ModelType.ONNX, FakeModel(""))])
+        assert llm.generate("love") is None
+        assert llm.get_stats()["failures"] == 1
+
+    def test_async_loser_is_cancelled(self):
+        primary, backup = FakeModel("primary", delay=1.0), FakeModel("backup")
+        llm = make_hedged([(ModelType.GEMINI, primary), (ModelType.ONNX, backup)])
+
+        async def run():
+            text = await llm.agenerate("love")
+            await asyncio.sleep(0)  # let the cancellation land
+            return text
+
+        assert asyncio.run(run()) == "backup"
+        assert primary.cancelled
+
+    def test_async_fallback(self):
+        llm = make_hedged(
+            [(ModelType.GEMINI, FakeModel(None)), (ModelType.ONNX, FakeModel("backup"))], hedge=False
+        )
+        assert asyncio.run(llm.agenerate("love")) == "backup"
+
+class SlowFirstClient:
+    """Gemini client stand-in whose first request hangs"""
+
+    def __init__(self):
+        self.sync = self
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, request, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            time.sleep(1.0)
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=f"call {call}")]))]
+        )
+
+class TestHedgedGemini:
+    @pytest.fixture
+    def gemini(self, monkeypatch):
+        monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+        llm = GeminiLLM(api_key=f"hedge-test-{time.time()}")
+        client = SlowFirstClient()
+        for key in llm.key_pool.keys:
+            key.client = client
+        return llm, client
+
+    def test_hedge_is_not_coalesced_into_the_slow_call(self, gemini):
+        llm, client = gemini
+        hedged = make_hedged([(ModelType.GEMINI, llm), (ModelType.GEMINI, llm)])
+
+        start = time.perf_counter()
+        assert hedged.generate("love") == "call 2"
+        assert time.perf_counter() - start < 0.9
+        assert client.calls == 2
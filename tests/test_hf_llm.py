@@ -0,0 +1,318 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from types import SimpleNamespace
+import pytest
+import torch
+from safetensors.torch import load_file, save_file
+from transformers import BatchEncoding, GPT2Config, GPT2LMHeadModel
+from config.settings import Config
+from services.llm import hf_llm
+from services.llm.hf_llm import HuggingFaceLLM, is_compile_or_shape_error, mmap_safetensors
+from services.llm.model_types import TaskType
+from services.llm.usage_ledger import UsageLedger
+
+class FakeTokenizer:
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+@pytest.fixture
+def llm():
+    llm = HuggingFaceLLM.__new__(HuggingFaceLLM)
+    llm.model_id = "target"
+    return llm
+
+class TestDraftModel:
+    @pytest.fixture(autouse=True)
+    def draft(self, monkeypatch):
+        monkeypatch.setattr(Config, "HF_DRAFT_MODEL_ID", "draft")
+        monkeypatch.setattr(
+            hf_llm.AutoTokenizer, "from_pretrained",
+            lambda model_id, **kwargs: FakeTokenizer({"<eos>": 0, "grace": 1})
+        )
+
+    def test_draft_with_matching_vocabulary_is_loaded(self, llm, monkeypatch):
+        monkeypatch.setattr(llm, "_load_model", lambda model_id, dtype: f"model:{model_id}", raising=False)
+        assert llm._load_draft_model(FakeTokenizer({"<eos>": 0, "grace": 1}), None) == "model:draft"
+
+    def test_draft_with_other_vocabulary_is_skipped(self, llm, monkeypatch):
+        loaded = []
+        monkeypatch.setattr(llm, "_load_model", lambda model_id, dtype: loaded.append(model_id), raising=False)
+
+        assert llm._load_draft_model(FakeTokenizer({"<s>": 0, "faith": 1}), None) is None
+        assert loaded == []
+
+class TestAssistedDecoding:
+    class Target(torch.nn.Linear):
+        def __init__(self, error=None):
+            super().__init__(1, 1)
+            self.error = error
+
+        def generate(self, input_ids, assistant_model, **kwargs):
+            # Two verification passes, three draft proposals, four new tokens
+            for _ in range(3):
+                assistant_model(torch.ones(1, 1))
+            self(torch.ones(1, 1))
+            if self.error:
+                raise self.error
+            self(torch.ones(1, 1))
+            return torch.cat([input_ids, torch.ones(1, 4, dtype=torch.long)], dim=1)
+
+    @pytest.fixture
+    def assisted_llm(self, llm):
+        llm.draft_model = torch.nn.Linear(1, 1)
+        llm.generation_kwargs = {}
+        llm.assisted_stats = deque()
+        llm._assist_lock = threading.Lock()
+        return llm
+
+    def test_forward_passes_are_counted(self, assisted_llm):
+        assisted_llm.pipe = SimpleNamespace(model=self.Target(), tokenizer=SimpleNamespace(eos_token_id=0))
+
+        output_ids = assisted_llm._generate_assisted({"input_ids": torch.ones(1, 3, dtype=torch.long)})
+
+        assert output_ids.shape == (1, 7)
+        stats = assisted_llm.get_assisted_stats()
+        assert stats["tokens_per_target_forward"] == 2.0
+        assert stats["acceptance_rate"] == pytest.approx(2 / 3)
+
+    def test_hooks_are_removed_after_an_error(self, assisted_llm):
+        target = self.Target(error=RuntimeError("out of memory"))
+        assisted_llm.pipe = SimpleNamespace(model=target, tokenizer=SimpleNamespace(eos_token_id=0))
+
+        with pytest.raises(RuntimeError):
+            assisted_llm._generate_assisted({"input_ids": torch.ones(1, 3, dtype=torch.long)})
+
+        assert not target._forward_hooks and not assisted_llm.draft_model._forward_hooks
+        assert not assisted_llm._assist_lock.locked()
+        assert not assisted_llm.assisted_stats
+
+class TestMmapSafetensors:
+    def test_round_trip_matches_safetensors(self, tmp_path):
+        tensors = {
+            "bias": torch.arange(3, dtype=torch.uint8),
+            "embed": torch.randn(4, 3),
+            "norm": torch.randn(5, dtype=torch.bfloat16),
+            "position": torch.arange(6, dtype=torch.int64).reshape(2, 3),
+            "mask": torch.tensor([True, False, True]),
+        }
+        path = tmp_path / "model.safetensors"
+        save_file(tensors, str(path))
+
+        expected = load_file(str(path))
+        mapped = mmap_safetensors(path)
+
+        assert mapped.keys() == expected.keys()
+        for name, tensor in expected.items():
+            assert mapped[name].dtype == tensor.dtype
+            assert torch.equal(mapped[name], tensor)
+
+    def test_tensors_share_one_file_mapping(self, tmp_path):
+        path = tmp_path / "model.safetensors"
+        save_file({"a": torch.ones(8), "b": torch.zeros(8)}, str(path))
+
+        mapped = mmap_safetensors(path)
+
+        assert mapped["a"].untyped_storage().nbytes() == path.stat().st_size
+        assert mapped["a"].untyped_storage().data_ptr() == mapped["b"].untyped_storage().data_ptr()
+
+    def test_misaligned_tensor_is_rejected(self, tmp_path):
+        header = json.dumps({
+            "flag": {"dtype": "U8", "shape": [1], "data_offsets": [0, 1]},
+            "weight": {"dtype": "F32", "shape": [1], "data_offsets": [1, 5]},
+        }).encode()
+        header += b" " * (-len(header) % 8)
+        path = tmp_path / "model.safetensors"
+        path.write_bytes(len(header).to_bytes(8, "little") + header + bytes(5))
+
+        with pytest.raises(ValueError, match="not aligned"):
+            mmap_safetensors(path)
+
+class TestStaticCache:
+    class FailingModel:
+        def __init__(self, error):
+            self.error = error
+
+        def generate(self, **kwargs):
+            raise self.error
+
+    @pytest.fixture
+    def static_llm(self, llm):
+        llm.static_cache = type("Cache", (), {"reset": lambda self: None})()
+        llm.generation_kwargs = {}
+        llm.pipe = type("Pipe", (), {"tokenizer": type("Tok", (), {"eos_token_id": 0})()})()
+        llm._static_lock = threading.Lock()
+        return llm
+
+    def test_compile_errors_disable_the_static_path(self, static_llm):
+        static_llm.static_model = self.FailingModel(torch._dynamo.exc.Unsupported("graph break"))
+        assert static_llm._generate_static({}) is None
+        assert static_llm.static_cache is None
+
+    def test_other_errors_keep_the_static_path(self, static_llm):
+        static_llm.static_model = self.FailingModel(RuntimeError("worker interrupted"))
+        assert static_llm._generate_static({}) is None
+        assert static_llm.static_cache is not None
+
+    def test_old_transformers_falls_back_to_the_dynamic_cache(self, llm, monkeypatch):
+        import transformers
+
+        class OldStaticCache:
+            def __init__(self, config, max_batch_size, max_cache_len=None):
+                pass
+
+        monkeypatch.setattr(transformers, "StaticCache", OldStaticCache)
+        llm.static_cache = None
+        llm.static_model = None
+
+        llm._init_static_cache(SimpleNamespace(config=None))
+
+        assert llm.static_cache is None and llm.static_model is None
+
+    def test_shape_errors_are_recognised(self):
+        assert is_compile_or_shape_error(RuntimeError("The size of tensor a (5) must match the size of tensor b"))
+        assert is_compile_or_shape_error(IndexError("index 300 is out of bounds for dimension 2"))
+        assert not is_compile_or_shape_error(ConnectionError("reset"))
+
+def test_agenerate_keeps_the_callers_context(llm, tmp_path):
+    ledger = UsageLedger(path=tmp_path / "ledger.jsonl", persist=False)
+    llm.generate = lambda prompt, task=None: ledger.record("local", task, 1, 1, 0.1).command
+
+    async def run():
+        with ledger.command("teach"):
+            return await llm.agenerate("grace")
+
+    assert asyncio.run(run()) == "teach"
+
+class TestGenerateStream:
+    class RaisingModel:
+        def generate(self, **kwargs):
+            raise RuntimeError("out of memory")
+
+    def test_generate_error_ends_the_stream(self, llm):
+        llm.cache = None
+        llm.stream_metrics = deque()
+        llm.generation_kwargs = {}
+        llm.pipe = SimpleNamespace(model=self.RaisingModel(), tokenizer=SimpleNamespace(eos_token_id=0))
+        llm._model_inputs = lambda prompt: {"input_ids": torch.ones(1, 3, dtype=torch.long)}
+        done = []
+
+        def consume():
+            done.append(list(llm.generate_stream("grace")))
+
+        thread = threading.Thread(target=consume, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+        assert done == [[]]
+
+class CharTokenizer:
+    """One token per character, id 0 for padding"""
+    pad_token = eos_token = "\0"
+    pad_token_id = eos_token_id = 0
+
+    def __init__(self):
+        self.padding_side = "right"
+
+    def __call__(self, texts, return_tensors=None, padding=False, add_special_tokens=True,
+                 return_token_type_ids=None):
+        rows = [[ord(char) for char in text] for text in ([texts] if isinstance(texts, str) else texts)]
+        if return_tensors is None:
+            return {"input_ids": rows}
+        width = max(len(row) for row in rows)
+        pad = [[0] * (width - len(row)) for row in rows]
+        if self.padding_side == "left":
+            rows, mask = [p + r for p, r in zip(pad, rows)], [[0] * len(p) + [1] * len(r) for p, r in zip(pad, rows)]
+        else:
+            rows, mask = [r + p for p, r in zip(pad, rows)], [[1] * len(r) + [0] * len(p) for p, r in zip(pad, rows)]
+        return BatchEncoding({"input_ids": torch.tensor(rows), "attention_mask": torch.tensor(mask)})
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return ["".join(chr(i) for i in row if i) for row in rows.tolist()]
+
+class LengthModel:
+    """Answers each row with the letter at its unpadded length ('a' for 1 token)"""
+
+    def __init__(self, fail_at_width=None):
+        self.fail_at_width = fail_at_width
+        self.batches = []
+
+    def generate(self, input_ids, attention_mask, **kwargs):
+        if input_ids.shape[1] == self.fail_at_width:
+            raise RuntimeError("out of memory")
+        # Left padding keeps every row's last position a real token
+        assert bool(attention_mask[:, -1].all())
+        self.batches.append(input_ids.shape[0])
+        answers = (ord("a") - 1 + attention_mask.sum(dim=1)).unsqueeze(1)
+        return torch.cat([input_ids, answers], dim=1)
+
+class TestGenerateBatch:
+    @pytest.fixture
+    def batch_llm(self, llm):
+        llm.cache = None
+        llm.device = "cpu"
+        llm.generation_kwargs = {}
+        llm.pipe = SimpleNamespace(model=LengthModel(), tokenizer=CharTokenizer())
+        llm._format_prompt = lambda prompt: prompt
+        llm._record_inference = lambda *args, **kwargs: None
+        return llm
+
+    def test_results_come_back_in_input_order(self, batch_llm):
+        assert batch_llm.generate_batch(["ccc", "a", "dddd", "bb"], batch_size=2) == ["c", "a", "d", "b"]
+        assert batch_llm.pipe.model.batches == [2, 2]
+
+    def test_failed_batch_yields_none_and_restores_padding(self, batch_llm):
+        batch_llm.pipe.model.fail_at_width = 4
+
+        assert batch_llm.generate_batch(["ccc", "a", "dddd", "bb"], batch_size=2) == [None, "a", None, "b"]
+        assert batch_llm.pipe.tokenizer.padding_side == "right"
+
+    def test_batches_are_recorded_under_their_task(self, batch_llm):
+        tasks = []
+        batch_llm._record_inference = lambda timer, task, *args, **kwargs: tasks.append(task)
+
+        batch_llm.generate_batch(["ccc", "a"], task=TaskType.TEACHING)
+        assert batch_llm._generate_micro_batch([("bb", TaskType.REFLECTION), ("a", TaskType.REFLECTION)]) == ["b", "a"]
+        assert tasks == [TaskType.TEACHING, TaskType.REFLECTION]
+
+    def test_padding_side_is_restored_when_tokenizing_fails(self, batch_llm, monkeypatch):
+        def fail(*args, **kwargs):
+            assert batch_llm.pipe.tokenizer.padding_side == "left"
+            raise ValueError("unknown token")
+
+        monkeypatch.setattr(CharTokenizer, "__call__", fail)
+
+        with pytest.raises(ValueError):
+            batch_llm._generate_padded(["grace"])
+        assert batch_llm.pipe.tokenizer.padding_side == "right"
+
+class TestPrefixCache:
+    @pytest.fixture
+    def prefix_llm(self, llm, monkeypatch):
+        monkeypatch.setattr(Config, "HF_PREFIX_CACHE", True)
+        torch.manual_seed(0)
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=128, n_positions=512, n_embd=16, n_layer=2, n_head=2))
+        llm.pipe = SimpleNamespace(model=model.eval(), tokenizer=CharTokenizer())
+        llm.device = "cpu"
+        llm._prefix_ids = None
+        llm._prefix_kv = None
+        llm._prefix_lock = threading.Lock()
+        return llm
+
+    def generate(self, llm, inputs):
+        with torch.inference_mode():
+            return llm.pipe.model.generate(**inputs, max_new_tokens=8, do_sample=False, pad_token_id=0)
+
+    def test_cached_prefix_matches_a_full_prefill(self, prefix_llm):
+        full = prefix_llm._model_inputs("grace", use_prefix_cache=False)
+        for _ in range(2):
+            cached = prefix_llm._model_inputs("grace")
+            assert torch.equal(cached["input_ids"], full["input_ids"])
+            assert torch.equal(self.generate(prefix_llm, cached), self.generate(prefix_llm, full))
+
+        # Each call extended its own copy; the shared prefix cache is untouched
+        assert prefix_llm._prefix_kv.get_seq_length() == prefix_llm._prefix_ids.shape[1]
@@ -0,0 +1,99 @@
+import time
+import pytest
+from services.llm.inference_stats import GenerationTimer, InferenceRecord, InferenceStats
+from services.llm.model_selector import ModelSelector
+from services.llm.model_types import ModelType, TaskType
+
+def make_record(model_type=ModelType.PHI, task=TaskType.TEACHING, success=True, seconds=1.0):
+    return InferenceRecord(
+        model_id="test-model",
+        model_type=model_type,
+        task=task,
+        prompt_tokens=100,
+        generated_tokens=21,
+        prefill_seconds=seconds / 2,
+        decode_seconds=seconds / 2,
+        success=success
+    )
+
+@pytest.fixture
+def stats():
+    return InferenceStats(max_records=10)
+
+class TestInferenceRecord:
+    def test_rates(self):
+        record = make_record(seconds=2.0)
+        assert record.total_seconds == 2.0
+        assert record.tokens_per_second == pytest.approx(10.5)
+        # The first token comes from prefill
+        assert record.decode_tokens_per_second == pytest.approx(20.0)
+
+class TestGenerationTimer:
+    def test_splits_prefill_and_decode(self):
+        timer = GenerationTimer()
+        time.sleep(0.02)
+        for _ in range(3):
+            timer(None, "scores")
+            time.sleep(0.01)
+
+        record = timer.finish("test-model", ModelType.PHI, None, prompt_tokens=5)
+
+        assert record.generated_tokens == 3
+        assert record.prefill_seconds >= 0.02
+        assert record.decode_seconds >= 0.03
+
+    def test_leaves_scores_untouched(self):
+        assert GenerationTimer()(None, "scores") == "scores"
+
+class TestInferenceStats:
+    def test_filters_by_model_and_task(self, stats):
+        stats.record(make_record())
+        stats.record(make_record(task=TaskType.REFLECTION))
+        stats.record(make_record(model_type=ModelType.ONNX))
+
+        assert len(stats.records()) == 3
+        assert len(stats.records(ModelType.PHI)) == 2
+        assert len(stats.records(ModelType.PHI, TaskType.TEACHING)) == 1
+
+    def test_summary(self, stats):
+        stats.record(make_record(seconds=1.0))
+        stats.record(make_record(seconds=3.0))
+        stats.record(make_record(success=False))
+
+        summary = stats.summary(ModelType.PHI)
+
+        assert summary["calls"] == 3
+        assert summary["failures"] == 1
+        assert summary["prefill_seconds"] == pytest.approx(1.0)
+        assert summary["tokens_per_second"] == pytest.approx(42 / 4.0)
+        assert summary["latency_p50"] == pytest.approx(2.0)
+
+    def test_empty_summary(self, stats):
+        assert stats.summary(ModelType.LLAMA) == {}
+
+    def test_subscriber_errors_are_contained(self, stats):
+        received = []
+
+        def broken(record):
+            raise RuntimeError("boom")
+
+        stats.subscribe(broken)
+        stats.subscribe(received.append)
+        stats.record(make_record())
+
+        assert len(received) == 1
+
+class TestModelSelectorFeed:
+    def test_records_update_selector_metrics(self, tmp_path):
+        selector = ModelSelector(metrics_path=tmp_path / "routing.json")
+        try:
+            assert selector.get_latency(ModelType.ONNX) == selector.capabilities[ModelType.ONNX].avg_latency
+
+            selector.inference_stats.record(make_record(model_type=ModelType.ONNX, seconds=4.0))
+
+            metrics = selector.metrics[ModelType.ONNX]
+            assert metrics.success_count == 1
+            assert selector.get_latency(ModelType.ONNX) == pytest.approx(4.0)
+            assert selector.get_performance_summary()["ONNX"]["latency_measured"]
+        finally:
+            selector.inference_stats.unsubscribe(selector._record_inference)
@@ -0,0 +1,170 @@
+import threading
+import pytest
+from config.settings import Config
+from services.llm.model_selector import ModelMetrics, ModelSelector, RoutedModel
+from services.llm.model_types import ModelType, TaskType
+from services.llm.worker_pool import LocalModelWorkerPool
+from services.model_manager import ModelManager
+
+class FakeModel:
+    def __init__(self, result="ok"):
+        self.result = result
+
+    def generate(self, prompt, task=None):
+        return self.result
+
+@pytest.fixture
+def selector(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ROUTING_MODELS", "GEMINI,ONNX")
+    monkeypatch.setattr(Config, "ROUTING_EXPLORATION", 0.0)
+    selector = ModelSelector(metrics_path=tmp_path / "routing.json")
+    yield selector
+    selector.inference_stats.unsubscribe(selector._record_inference)
+
+def route_counts(selector, task, n=200):
+    counts = {ModelType.GEMINI: 0, ModelType.ONNX: 0}
+    for _ in range(n):
+        counts[selector.select_model(task)] += 1
+    return counts
+
+class TestModelMetrics:
+    def test_ring_buffer_keeps_recent_calls(self):
+        metrics = ModelMetrics()
+        for i in range(Config.ROUTING_METRICS_WINDOW + 20):
+            metrics.record(True, float(i))
+
+        assert len(metrics.latencies) == Config.ROUTING_METRICS_WINDOW
+        assert metrics.latencies[0] == 20.0
+        assert metrics.success_count == Config.ROUTING_METRICS_WINDOW + 20
+
+    def test_percentiles(self):
+        metrics = ModelMetrics()
+        for latency in range(1, 101):
+            metrics.record(True, float(latency))
+        p50, p95 = metrics.latency_percentiles()
+        assert p50 == pytest.approx(50.5)
+        assert p95 == pytest.approx(95.05)
+
+class TestRouting:
+    def test_single_backend_is_not_routed(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, "ROUTING_MODELS", "")
+        monkeypatch.setattr(Config, "MODEL_BACKEND", "GEMINI")
+        selector = ModelSelector(metrics_path=tmp_path / "routing.json")
+        assert selector.select_model(TaskType.TEACHING) == ModelType.GEMINI
+
+    def test_traffic_shifts_to_faster_backend(self, selector):
+        for _ in range(30):
+            selector.update_performance(ModelType.GEMINI, True, 4.0, task=TaskType.TEACHING)
+            selector.update_performance(ModelType.ONNX, True, 0.5, task=TaskType.TEACHING)
+
+        counts = route_counts(selector, TaskType.TEACHING)
+        assert counts[ModelType.ONNX] > 0.9 * sum(counts.values())
+
+    def test_unhealthy_backend_is_avoided(self, selector):
+        for _ in range(30):
+            selector.update_performance(ModelType.GEMINI, True, 2.0, task=TaskType.SEARCH)
+            selector.update_performance(ModelType.ONNX, False, 0.5, task=TaskType.SEARCH)
+
+        counts = route_counts(selector, TaskType.SEARCH)
+        assert counts[ModelType.GEMINI] > 0.9 * sum(counts.values())
+
+    def test_routing_is_per_task(self, selector):
+        for _ in range(30):
+            selector.update_performance(ModelType.GEMINI, True, 0.5, task=TaskType.SEARCH)
+            selector.update_performance(ModelType.ONNX, True, 4.0, task=TaskType.SEARCH)
+            selector.update_performance(ModelType.GEMINI, True, 4.0, task=TaskType.REFLECTION)
+            selector.update_performance(ModelType.ONNX, True, 0.5, task=TaskType.REFLECTION)
+
+        assert route_counts(selector, TaskType.SEARCH)[ModelType.GEMINI] > 180
+        assert route_counts(selector, TaskType.REFLECTION)[ModelType.ONNX] > 180
+
+    def test_falls_back_when_model_fails_to_load(self, selector, monkeypatch):
+        models = {ModelType.GEMINI: FakeModel(), ModelType.ONNX: None}
+        monkeypatch.setattr(selector, "get_model", lambda model_type: models[model_type])
+        for _ in range(30):
+            selector.update_performance(ModelType.ONNX, True, 0.1, task=TaskType.TEACHING)
+
+        model = selector.select_and_get_model(TaskType.TEACHING)
+
+        assert isinstance(model, RoutedModel)
+        assert model.model_type == ModelType.GEMINI
+        assert selector.metrics[ModelType.ONNX].fail_count == 1
+
+    def test_routed_calls_are_measured(self, selector):
+        model = RoutedModel(FakeModel(result=None), ModelType.GEMINI, selector)
+        model.generate("love", task=TaskType.TEACHING)
+
+        metrics = selector.task_metrics[(ModelType.GEMINI, TaskType.TEACHING)]
+        assert metrics.recent_outcomes() == (0, 1)
+
+    def test_self_reporting_models_are_not_wrapped(self, selector, monkeypatch):
+        pool = LocalModelWorkerPool.__new__(LocalModelWorkerPool)
+        pool.inference_stats = selector.inference_stats
+        monkeypatch.setattr(selector, "routing_models", [ModelType.ONNX])
+        monkeypatch.setattr(selector, "get_model", lambda model_type: pool)
+
+        assert selector.select_and_get_model(TaskType.TEACHING) is pool
+
+    def test_scoring_does_not_create_task_metrics(self, selector):
+        route_counts(selector, TaskType.SEARCH, n=10)
+        assert not selector.task_metrics
+
+    def test_summary_is_safe_during_updates(self, selector):
+        stop = threading.Event()
+
+        def update():
+            while not stop.is_set():
+                for task in TaskType:
+                    selector.update_performance(ModelType.ONNX, True, 0.5, task=task)
+
+        writer = threading.Thread(target=update)
+        writer.start()
+        try:
+            for _ in range(50):
+                summary = selector.get_performance_summary()
+        finally:
+            stop.set()
+            writer.join()
+        assert summary["ONNX"]["calls"] > 0
+
+class TestPersistence:
+    def test_metrics_survive_restart(self, selector, monkeypatch):
+        for latency in (1.0, 2.0, 3.0):
+            selector.update_performance(ModelType.ONNX, True, latency, task=TaskType.TEACHING)
+        selector.update_performance(ModelType.ONNX, False, 0.0, task=TaskType.TEACHING)
+        selector.save_metrics()
+
+        restored = ModelSelector(metrics_path=selector.metrics_path)
+        try:
+            metrics = restored.task_metrics[(ModelType.ONNX, TaskType.TEACHING)]
+            assert list(metrics.latencies) == [1.0, 2.0, 3.0]
+            assert metrics.recent_outcomes() == (3, 1)
+            assert restored.metrics[ModelType.ONNX].fail_count == 1
+        finally:
+            restored.inference_stats.unsubscribe(restored._record_inference)
+
+    def test_corrupt_file_is_ignored(self, tmp_path):
+        path = tmp_path / "routing.json"
+        path.write_text("{not json")
+        selector = ModelSelector(metrics_path=path)
+        assert selector.metrics[ModelType.GEMINI].success_count == 0
+        selector.inference_stats.unsubscribe(selector._record_inference)
+
+class TestSharedModels:
+    def test_local_models_have_one_owner(self, tmp_path, monkeypatch):
+        created = []
+        monkeypatch.setattr(ModelManager, "_residency", None)
+        monkeypatch.setattr(ModelManager, "_create_model", staticmethod(
+            lambda model_type: created.append(model_type) or FakeModel(model_type.name)
+        ))
+        selector = ModelSelector(metrics_path=tmp_path / "routing.json")
+        try:
+            routed = selector.get_model(ModelType.ONNX)
+            direct = ModelManager().get_model(ModelType.ONNX)
+
+            assert routed.generate("grace") == direct.generate("grace") == "ONNX"
+            assert created == [ModelType.ONNX]
+            assert selector.residency is ModelManager().residency
+        finally:
+            selector.inference_stats.unsubscribe(selector._record_inference)
+            selector.residency.close()
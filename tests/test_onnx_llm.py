@@ -0,0 +1,96 @@
+import json
+import sys
+from types import ModuleType, SimpleNamespace
+import pytest
+import torch
+from transformers import AutoTokenizer
+from config.settings import Config
+from services.llm.inference_stats import InferenceStats
+from services.llm.model_types import TaskType
+from services.llm.onnx_llm import OnnxLLM
+
+class StubTokenizer:
+    eos_token_id = 0
+
+    def __call__(self, text, return_tensors=None, return_token_type_ids=None):
+        return {"input_ids": torch.tensor([[ord(char) for char in text]])}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(i) for i in ids.tolist())
+
+    def save_pretrained(self, path):
+        pass
+
+class StubSession:
+    """Stands in for ORTModelForCausalLM: answers with a fixed text"""
+    loads = []
+
+    def __init__(self, answer=" Grace upon grace. Generated using ONNX"):
+        self.answer = answer
+        self.calls = []
+
+    @classmethod
+    def from_pretrained(cls, source, export, **kwargs):
+        cls.loads.append((str(source), export))
+        return cls()
+
+    def generate(self, input_ids, **kwargs):
+        self.calls.append(kwargs)
+        answer = torch.tensor([[ord(char) for char in self.answer]])
+        return torch.cat([input_ids, answer], dim=1)
+
+    def save_pretrained(self, path):
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "config.json").write_text(json.dumps({"model_type": "stub"}))
+
+@pytest.fixture
+def onnx_runtime(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+    ort = ModuleType("onnxruntime")
+    ort.SessionOptions = lambda: SimpleNamespace()
+    ort.GraphOptimizationLevel = SimpleNamespace(ORT_ENABLE_ALL="all")
+    optimum_ort = ModuleType("optimum.onnxruntime")
+    optimum_ort.ORTModelForCausalLM = StubSession
+    monkeypatch.setitem(sys.modules, "onnxruntime", ort)
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", optimum_ort)
+    monkeypatch.setattr(AutoTokenizer, "from_pretrained", lambda source, **kwargs: StubTokenizer())
+    monkeypatch.setattr(StubSession, "loads", [])
+    return StubSession
+
+def test_missing_runtime_explains_the_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+
+    with pytest.raises(ImportError, match=r"biblia\[onnx\]"):
+        OnnxLLM(model_id="stub/model")
+
+def test_exports_once_then_loads_the_saved_graph(onnx_runtime):
+    first = OnnxLLM(model_id="stub/model")
+    OnnxLLM(model_id="stub/model")
+
+    assert onnx_runtime.loads == [("stub/model", True), (str(first.export_dir), False)]
+
+def test_generate_strips_the_prompt_and_records_inference(onnx_runtime):
+    llm = OnnxLLM(model_id="stub/model")
+    records = []
+    llm.inference_stats = InferenceStats()
+    llm.inference_stats.subscribe(records.append)
+
+    assert llm.generate("grace", task=TaskType.TEACHING) == "Grace upon grace."
+    record = records[0]
+    assert record.task == TaskType.TEACHING and record.success
+    assert record.generated_tokens == len(llm.model.answer)
+
+def test_generate_error_returns_none(onnx_runtime):
+    llm = OnnxLLM(model_id="stub/model")
+    records = []
+    llm.inference_stats = InferenceStats()
+    llm.inference_stats.subscribe(records.append)
+
+    def fail(**kwargs):
+        raise RuntimeError("session failed")
+
+    llm.model.generate = fail
+
+    assert llm.generate("grace") is None
+    assert not records[0].success
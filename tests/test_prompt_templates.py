@@ -0,0 +1,108 @@
+import logging
+import pytest
+from services.llm.generation_profiles import profile_for
+from services.llm.model_types import TaskType
+from services.llm.prompt_templates import (
+    PromptRegistry, PromptTemplate, compact, estimate_tokens, rank_snippets
+)
+
+SNIPPETS = [
+    "Weather for the weekend is sunny",
+    "Suffering produces perseverance, and perseverance hope (Romans 5:3-4)",
+    "Recipes for a quick pasta dinner",
+    "Hope does not put us to shame",
+]
+
+@pytest.fixture
+def registry():
+    return PromptRegistry([
+        PromptTemplate("analysis", """
+            Analyze biblically: {topic}
+            Sources:
+            {snippets}
+            """, snippets="snippets", query="topic", max_snippets=2),
+        PromptTemplate("application", """
+            Based on these insights:
+            {insights}
+
+            Give application points.
+            """, token_budget=40, truncate=("insights",)),
+    ])
+
+def test_compact_strips_indentation():
+    assert compact("""
+        First line
+            nested
+
+
+        Last line   
+        """) == "First line\n    nested\n\nLast line"
+
+def test_rank_snippets_prefers_query_terms():
+    assert rank_snippets(SNIPPETS, "hope in suffering")[:2] == [1, 3]
+
+class TestPromptRegistry:
+    def test_selects_relevant_snippets_in_search_order(self, registry):
+        prompt = registry.render("analysis", topic="hope in suffering", snippets=SNIPPETS)
+
+        assert prompt == (
+            "Analyze biblically: hope in suffering\nSources:\n"
+            f"- {SNIPPETS[1]}\n- {SNIPPETS[3]}"
+        )
+
+    def test_truncates_to_budget(self, registry):
+        prompt = registry.render("application", insights="grace " * 500)
+
+        assert estimate_tokens(prompt) <= 40
+        assert "grace …" in prompt
+        assert prompt.endswith("Give application points.")
+
+    def test_snippets_dropped_to_fit_budget(self):
+        template = PromptTemplate("tight", "Topic: {topic}\n{snippets}", token_budget=25,
+                                  snippets="snippets", query="topic")
+
+        rendered = template.render(topic="hope", snippets=SNIPPETS)
+
+        assert rendered.truncated
+        assert rendered.tokens <= 25
+        assert SNIPPETS[1] in rendered.text and SNIPPETS[3] not in rendered.text
+
+    def test_truncation_is_logged(self, registry, caplog):
+        with caplog.at_level(logging.WARNING):
+            registry.render("application", insights="short")
+            assert not caplog.records
+
+            registry.render("application", insights="grace " * 500)
+
+        assert "application truncated to its 40-token budget" in caplog.text
+        assert "~763 tokens requested, 39 sent" in caplog.text
+
+    def test_reports_token_counts(self, registry):
+        registry.render("application", insights="short")
+        registry.render("application", insights="grace " * 500)
+
+        stats = registry.get_stats()["application"]
+        assert stats["renders"] == 2
+        assert stats["truncated"] == 1
+        assert stats["max_tokens"] == stats["last_tokens"] <= 40
+        assert registry.get_stats()["analysis"]["renders"] == 0
+
+    def test_rejects_unknown_fields(self):
+        with pytest.raises(ValueError):
+            PromptTemplate("broken", "Text: {text}", truncate=("insights",))
+
+def test_default_templates_render():
+    registry = PromptRegistry.shared()
+    for name in ("teaching", "references", "application", "prayer", "devotional"):
+        assert registry.get(name).template == compact(registry.get(name).template)
+    assert "  " not in registry.render("prayer", topic="grace", insights="Saved by grace")
+
+def test_follow_up_prompts_fit_a_full_teaching():
+    registry = PromptRegistry.shared()
+    # The longest answer the teaching profile allows, in estimate_tokens() units
+    insights = "x" * (4 * profile_for(TaskType.TEACHING).max_output_tokens)
+
+    for name, values in (("references", {"text": insights}),
+                         ("application", {"insights": insights}),
+                         ("prayer", {"topic": "grace", "insights": insights})):
+        assert insights in registry.render(name, **values)
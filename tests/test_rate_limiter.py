@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+import pytest
+from services.llm.rate_limiter import Priority, RateLimiter, current_priority, request_priority
+
+@pytest.fixture
+def limiter():
+    # 2 requests and 100 tokens per 0.2s window
+    return RateLimiter(requests_per_minute=2, tokens_per_minute=100, period=0.2)
+
+def wait_for_queue(limiter, depth):
+    while limiter.get_stats()["queue_depth"] < depth:
+        time.sleep(0.005)
+
+class TestRateLimiter:
+    def test_grants_within_quota(self, limiter):
+        started = time.monotonic()
+
+        assert limiter.acquire(10)
+        assert limiter.acquire(10)
+        assert time.monotonic() - started < 0.05
+
+    def test_waits_for_request_quota(self, limiter):
+        limiter.acquire()
+        limiter.acquire()
+        started = time.monotonic()
+
+        assert limiter.acquire()
+        assert time.monotonic() - started >= 0.08
+
+    def test_waits_for_token_quota(self, limiter):
+        limiter.acquire(100)
+        started = time.monotonic()
+
+        assert limiter.acquire(50)
+        assert time.monotonic() - started >= 0.08
+
+    def test_times_out(self, limiter):
+        limiter.acquire(100)
+
+        assert not limiter.acquire(100, timeout=0.01)
+        stats = limiter.get_stats()
+        assert stats["timed_out"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_interactive_requests_go_first(self, limiter):
+        limiter.acquire()
+        limiter.acquire()
+        order = []
+
+        def call(priority):
+            limiter.acquire(priority=priority)
+            order.append(priority)
+
+        background = threading.Thread(target=call, args=(Priority.BACKGROUND,))
+        background.start()
+        wait_for_queue(limiter, 1)
+        interactive = threading.Thread(target=call, args=(Priority.INTERACTIVE,))
+        interactive.start()
+        wait_for_queue(limiter, 2)
+        assert limiter.get_stats()["queued_by_priority"] == {"INTERACTIVE": 1, "NORMAL": 0, "BACKGROUND": 1}
+
+        background.join()
+        interactive.join()
+        assert order == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+    def test_reconcile_refunds_unused_tokens(self, limiter):
+        limiter.acquire(100)
+        limiter.reconcile(100, 20)
+
+        assert limiter.get_stats()["tokens_available"] == pytest.approx(80, abs=5)
+
+    def test_penalize_drains_quota(self, limiter):
+        limiter.penalize()
+
+        stats = limiter.get_stats()
+        assert stats["throttled"] == 1
+        assert stats["requests_available"] < 1
+
+    def test_async_acquire(self, limiter):
+        assert asyncio.run(limiter.aacquire(10))
+        assert limiter.get_stats()["granted"] == 1
+
+    def test_cancelled_async_acquire_leaves_the_queue(self, limiter):
+        assert limiter.acquire() and limiter.acquire()
+
+        async def run():
+            waiter = asyncio.ensure_future(limiter.aacquire(10))
+            await asyncio.to_thread(wait_for_queue, limiter, 1)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(run())
+        while limiter.get_stats()["queue_depth"]:
+            time.sleep(0.005)
+        stats = limiter.get_stats()
+        assert stats["cancelled"] == 1
+        assert stats["granted"] == 2
+
+    def test_grant_racing_a_cancellation_is_refunded(self, limiter):
+        async def run():
+            waiter = asyncio.ensure_future(limiter.aacquire(10))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            # Let the thread finish and its done callback run
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+        stats = limiter.get_stats()
+        assert stats["granted"] == 0 and stats["cancelled"] == 1
+        assert stats["requests_available"] == pytest.approx(2, abs=0.1)
+
+class TestRequestPriority:
+    def test_context_manager(self):
+        assert current_priority() == Priority.NORMAL
+        with request_priority(Priority.INTERACTIVE):
+            assert current_priority() == Priority.INTERACTIVE
+        assert current_priority() == Priority.NORMAL
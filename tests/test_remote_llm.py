@@ -0,0 +1,117 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from config.settings import Config
+from services.llm.model_types import TaskType
+from services.llm.remote_llm import RemoteLLM, parse_endpoints
+from services.llm.usage_ledger import UsageLedger
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /v1/chat/completions endpoint"""
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.client_address, payload))
+        prompt = payload["messages"][0]["content"]
+        answer = f"{self.server.name}: {prompt}"
+
+        if payload.get("stream"):
+            body = "".join(
+                f"data: {json.dumps({'choices': [{'delta': {'content': word}}]})}\n\n"
+                for word in answer.split(" ")
+            ) + "data: [DONE]\n\n"
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(answer.split())}
+            })
+            content_type = "application/json"
+
+        encoded = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(name):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.name = name
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def servers():
+    started = [start_server("node-a"), start_server("node-b")]
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def remote(servers, monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+    llm = RemoteLLM([f"http://127.0.0.1:{s.server_address[1]}/v1" for s in servers], model_id="stand-in")
+    llm.usage_ledger = UsageLedger(persist=False)
+    yield llm
+    llm.close()
+
+def test_parse_endpoints():
+    assert parse_endpoints("http://a:8080, http://b:8080/v1/,") == ["http://a:8080/v1", "http://b:8080/v1"]
+
+class TestRemoteLLM:
+    def test_generate(self, remote, servers):
+        assert remote.generate("grace") == "node-a: grace"
+        _, payload = servers[0].requests[0]
+        assert payload["model"] == "stand-in"
+        assert payload["messages"] == [{"role": "user", "content": "grace"}]
+
+    def test_task_profile_and_usage(self, remote, servers):
+        remote.generate("John 3:16 and Romans 8:28", task=TaskType.EXTRACTION)
+
+        _, payload = servers[0].requests[0]
+        assert payload["max_tokens"] == 256
+        assert payload["temperature"] == 0.0
+        [record] = remote.usage_ledger.records()
+        assert (record.task, record.input_tokens, record.output_tokens) == ("EXTRACTION", 5, 6)
+
+    def test_round_robin(self, remote, servers):
+        answers = [remote.generate(f"q{i}") for i in range(4)]
+
+        assert [a.split(":")[0] for a in answers] == ["node-a", "node-b", "node-a", "node-b"]
+
+    def test_reuses_connections(self, remote, servers):
+        for i in range(6):
+            remote.generate(f"q{i}")
+
+        for server in servers:
+            client_ports = {address[1] for address, _ in server.requests}
+            assert len(server.requests) == 3
+            assert len(client_ports) == 1
+
+    def test_skips_dead_endpoint(self, servers, monkeypatch):
+        monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+        # Nothing listens on the freed port of a closed server
+        dead = start_server("dead")
+        dead_port = dead.server_address[1]
+        dead.shutdown()
+        dead.server_close()
+        llm = RemoteLLM([f"http://127.0.0.1:{dead_port}", f"http://127.0.0.1:{servers[0].server_address[1]}"])
+
+        assert llm.generate("hope") == "node-a: hope"
+        assert llm.get_stats()[f"http://127.0.0.1:{dead_port}/v1"]["failures"] >= 1
+        llm.close()
+
+    def test_stream(self, remote):
+        assert list(remote.generate_stream("love one another")) == ["node-a:", "love", "one", "another"]
+
+    def test_agenerate(self, remote):
+        import asyncio
+        assert asyncio.run(remote.agenerate("faith")) == "node-a: faith"
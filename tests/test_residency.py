@@ -0,0 +1,143 @@
+import threading
+import pytest
+from services.llm.model_types import ModelType
+from services.llm.residency import ModelResidencyManager, PinnedModel
+
+class FakeModel:
+    def __init__(self, model_type):
+        self.model_type = model_type
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def generate(self, prompt, task=None):
+        return prompt
+
+@pytest.fixture
+def loads():
+    return []
+
+@pytest.fixture
+def manager(loads):
+    def loader(model_type):
+        loads.append(model_type)
+        return FakeModel(model_type)
+
+    manager = ModelResidencyManager(
+        loader,
+        memory_budget_mb=250,
+        size_estimates={ModelType.PHI: 100, ModelType.LLAMA: 100, ModelType.ONNX: 100}
+    )
+    yield manager
+    manager.close()
+
+@pytest.fixture(autouse=True)
+def fixed_sizes(monkeypatch):
+    sizes = {ModelType.PHI: 100, ModelType.LLAMA: 100, ModelType.ONNX: 100}
+    monkeypatch.setattr(
+        "services.llm.residency.model_weights_mb",
+        lambda model: sizes[model.model_type]
+    )
+    monkeypatch.setattr("services.llm.residency.available_memory_mb", lambda: None)
+
+class TestModelResidencyManager:
+    def test_loads_once(self, manager, loads):
+        first = manager.get(ModelType.PHI)
+        assert manager.get(ModelType.PHI) is first
+        assert loads == [ModelType.PHI]
+
+    def test_evicts_least_recently_used_over_budget(self, manager):
+        phi = manager.get(ModelType.PHI)
+        manager.get(ModelType.LLAMA)
+        manager.get(ModelType.PHI)  # LLAMA is now least recently used
+
+        manager.get(ModelType.ONNX)
+
+        assert manager.is_resident(ModelType.PHI)
+        assert not manager.is_resident(ModelType.LLAMA)
+        assert manager.is_resident(ModelType.ONNX)
+        assert manager.resident_mb <= manager.memory_budget_mb
+        assert not phi.closed
+
+    def test_pinned_models_are_not_evicted(self, manager):
+        with manager.acquire(ModelType.PHI) as phi:
+            with manager.acquire(ModelType.LLAMA):
+                assert manager.get(ModelType.ONNX) is None
+            assert manager.get(ModelType.ONNX) is not None
+            assert manager.is_resident(ModelType.PHI)
+            assert not phi.closed
+
+    def test_evict_closes_model(self, manager):
+        model = manager.get(ModelType.PHI)
+        assert manager.evict(ModelType.PHI)
+        assert model.closed
+        assert manager.evictions == 1
+
+    def test_idle_eviction(self, manager):
+        manager.get(ModelType.PHI)
+        with manager.acquire(ModelType.LLAMA):
+            manager.idle_timeout = 0.01
+            manager._resident[ModelType.PHI].last_used -= 1
+            manager._resident[ModelType.LLAMA].last_used -= 1
+
+            assert manager.evict_idle() == 1
+            assert manager.is_resident(ModelType.LLAMA)
+        assert not manager.is_resident(ModelType.PHI)
+
+    def test_oversized_model_loads_when_alone(self, loads):
+        manager = ModelResidencyManager(lambda t: FakeModel(t), memory_budget_mb=50)
+        assert manager.get(ModelType.PHI) is not None
+
+    def test_load_runs_outside_the_lock(self, monkeypatch):
+        release = threading.Event()
+        loads = []
+
+        def loader(model_type):
+            loads.append(model_type)
+            if model_type == ModelType.LLAMA:
+                release.wait(5)
+            return FakeModel(model_type)
+
+        manager = ModelResidencyManager(loader, memory_budget_mb=1000)
+        waiters = [threading.Thread(target=manager.get, args=(ModelType.LLAMA,)) for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+        while not loads:
+            threading.Event().wait(0.01)
+
+        # Another model loads while LLAMA is still loading
+        other = threading.Thread(target=manager.get, args=(ModelType.PHI,))
+        other.start()
+        other.join(timeout=2)
+        assert not other.is_alive() and manager.is_resident(ModelType.PHI)
+        release.set()
+        for thread in waiters:
+            thread.join()
+
+        assert loads.count(ModelType.LLAMA) == 1
+        assert manager.is_resident(ModelType.LLAMA)
+
+    def test_pinned_handle_blocks_eviction_during_generate(self, manager):
+        handle = PinnedModel(manager, ModelType.PHI)
+        evicted = []
+        model = manager.get(ModelType.PHI)
+        model.generate = lambda prompt, task=None: evicted.append(manager.evict(ModelType.PHI)) or prompt
+
+        assert handle.generate("grace") == "grace"
+        assert evicted == [False]
+        assert manager.evict(ModelType.PHI)
+
+    def test_attribute_probes_do_not_reload_an_evicted_model(self, manager, loads):
+        handle = PinnedModel(manager, ModelType.PHI)
+        manager.get(ModelType.PHI)
+        assert handle.model_type == ModelType.PHI and not handle.closed
+        manager.evict(ModelType.PHI)
+
+        assert not hasattr(handle, "inference_stats")
+        assert not hasattr(handle, "generate_stream")
+        assert loads == [ModelType.PHI, ModelType.PHI]  # generate_stream is a generate method
+        manager.evict(ModelType.PHI)
+
+        assert handle.generate("grace") == "grace"
+        assert loads == [ModelType.PHI] * 3
@@ -0,0 +1,70 @@
+import sqlite3
+import time
+import pytest
+from services.llm.response_cache import ResponseCache
+from services.llm.model_types import TaskType
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=tmp_path / "responses.sqlite3", max_entries=3,
+                         max_bytes=1024 * 1024, default_ttl=60)
+
+class TestResponseCache:
+    def test_key_depends_on_generation_config(self):
+        key_a = ResponseCache.make_key("love", "gemini-1.5-flash", {"temperature": 0.7})
+        key_b = ResponseCache.make_key("love", "gemini-1.5-flash", {"temperature": 0.2})
+        assert key_a != key_b
+        assert key_a == ResponseCache.make_key("love", "gemini-1.5-flash", {"temperature": 0.7})
+
+    def test_hit_and_miss_counters(self, cache):
+        assert cache.get("missing") is None
+        cache.set("key", "response", task=TaskType.TEACHING)
+        assert cache.get("key") == "response"
+
+        stats = cache.get_stats()
+        assert stats["process"]["hits"] == 1
+        assert stats["process"]["misses"] == 1
+        assert stats["global"]["hits"] == 1
+
+    def test_lru_eviction(self, cache):
+        for i in range(3):
+            cache.set(f"key{i}", f"response{i}")
+            time.sleep(0.01)
+        cache.get("key0")  # Touch oldest entry
+        cache.set("key3", "response3")
+
+        assert cache.get("key0") == "response0"
+        assert cache.get("key1") is None
+        assert cache.get_stats()["entries"] == 3
+
+    def test_rolled_back_eviction_is_not_counted(self, cache, monkeypatch):
+        for i in range(3):
+            cache.set(f"key{i}", f"response{i}")
+        conn = cache._connection()
+
+        class FailingCommit:
+            def execute(self, sql, *args):
+                if sql == "COMMIT":
+                    raise sqlite3.OperationalError("disk I/O error")
+                return conn.execute(sql, *args)
+
+        monkeypatch.setattr(cache, "_connection", lambda: FailingCommit())
+        cache.set("key3", "response3")
+
+        stats = cache.get_stats()
+        assert stats["process"]["evictions"] == stats["global"]["evictions"] == 0
+        assert stats["entries"] == 3
+
+    def test_per_task_ttl(self, tmp_path):
+        cache = ResponseCache(path=tmp_path / "ttl.sqlite3",
+                              ttls={TaskType.REFLECTION: -1}, default_ttl=60)
+        cache.set("reflection", "expired", task=TaskType.REFLECTION)
+        cache.set("teaching", "fresh", task=TaskType.TEACHING)
+
+        assert cache.get("reflection") is None
+        assert cache.get("teaching") == "fresh"
+
+    def test_shared_across_instances(self, tmp_path):
+        path = tmp_path / "shared.sqlite3"
+        ResponseCache(path=path).set("key", "response")
+        assert ResponseCache(path=path).get("key") == "response"
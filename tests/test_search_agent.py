@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+import pytest
+from config.settings import Config
+from agent.search_agent import SearchAgent
+from services.llm.model_types import TaskType
+
+RESULTS = [{"title": "Grace", "link": "https://biblehub.com/grace", "snippet": "Saved by grace through faith."}]
+
+class FakeModel:
+    """A model without generate_stream, like the hedged fallback chain"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tasks = []
+
+    def generate(self, prompt, task=None):
+        self.tasks.append(task)
+        return self.text
+
+@pytest.fixture
+def make_agent(monkeypatch):
+    monkeypatch.setattr(Config, "SEMANTIC_CACHE_ENABLED", False)
+
+    def make(model, stream_renderer=None):
+        picked = []
+
+        def model_for(task):
+            picked.append(task)
+            return model
+
+        agent = SearchAgent(model_manager=None, stream_renderer=stream_renderer, model_for=model_for)
+        agent.searches = []
+        agent.serper = SimpleNamespace(search=lambda query: agent.searches.append(query) or RESULTS)
+        return agent, picked
+    return make
+
+def test_search_and_analyze_uses_the_model_picker(make_agent):
+    model = FakeModel("Grace is unearned favour.")
+    rendered = []
+    agent, picked = make_agent(model, stream_renderer=lambda chunks, title: rendered.append("".join(chunks)))
+
+    result = agent.search_and_analyze("grace")
+
+    assert result["insights"] == "Grace is unearned favour."
+    assert picked == [TaskType.TEACHING]
+    # Without generate_stream the finished text is still shown
+    assert rendered == ["Grace is unearned favour."]
+
+def test_search_and_teach_uses_the_model_picker(make_agent):
+    model = FakeModel(json.dumps({
+        "insights": "Grace is a gift.", "references": ["Ephesians 2:8"],
+        "application": "Receive it.", "prayer": "Thank you."
+    }))
+    rendered = []
+    agent, picked = make_agent(model, stream_renderer=lambda chunks, title: rendered.append("".join(chunks)))
+
+    result = agent.search_and_teach("grace")
+
+    assert result["references"] == ["Ephesians 2:8"] and result["missing"] == []
+    assert picked == [TaskType.TEACHING]
+    assert rendered == ["Grace is a gift."]
+
+class StreamingModel(FakeModel):
+    def generate_stream(self, prompt, task=None):
+        self.tasks.append(task)
+        yield from (self.text[i:i + 5] for i in range(0, len(self.text), 5))
+
+def test_search_and_teach_streams_the_insights(make_agent):
+    model = StreamingModel(json.dumps({
+        "insights": "Grace is a gift.", "references": ["Ephesians 2:8"],
+        "application": "Receive it.", "prayer": "Thank you."
+    }))
+    seen = []
+
+    def renderer(chunks, title):
+        chunks = list(chunks)
+        seen.append(chunks)
+        return "".join(chunks)
+
+    agent, _ = make_agent(model, stream_renderer=renderer)
+    result = agent.search_and_teach("grace")
+
+    assert result["insights"] == "Grace is a gift." and result["missing"] == []
+    # Shown piece by piece as the JSON arrives, and only once
+    assert len(seen) == 1 and len(seen[0]) > 1
+    assert "".join(seen[0]) == "Grace is a gift."
+
+def test_fallback_reuses_search_results(make_agent):
+    agent, _ = make_agent(FakeModel("not json"))
+
+    raw_results = agent.search("grace")
+    assert agent.search_and_teach("grace", raw_results=raw_results) is None
+    assert agent.search_and_analyze("grace", raw_results=raw_results)["insights"] == "not json"
+    assert agent.searches == ["grace"]
@@ -0,0 +1,64 @@
+import time
+import pytest
+from services.semantic_cache import SemanticCache, normalize_topic
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticCache("test", path=tmp_path / "semantic.json", threshold=0.85, max_entries=3, ttl=3600)
+
+class TestNormalizeTopic:
+    @pytest.mark.parametrize("topic", ["love", "Love ", "God's love", "What does the Bible say about love?"])
+    def test_variants_collapse(self, topic):
+        assert normalize_topic(topic) == "love"
+
+    def test_keeps_filler_only_topics(self):
+        assert normalize_topic("The Lord") == "the lord"
+
+class TestSemanticCache:
+    def test_serves_near_duplicates(self, cache):
+        cache.set("hope in suffering", {"insights": "..."})
+
+        assert cache.get("Hope when suffering") == {"insights": "..."}
+        assert cache.get("marriage") is None
+        assert cache.get("suffering") is None
+
+    def test_hit_statistics(self, cache):
+        cache.set("prayer", "teaching")
+        cache.get("prayers")
+        cache.get("God's prayer")
+        cache.get("fasting")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == pytest.approx(2 / 3)
+        assert stats["top_entries"][0] == {"topic": "prayer", "hits": 2, "last_hit_at": pytest.approx(time.time(), abs=5)}
+
+    def test_threshold_is_tunable(self, tmp_path):
+        loose = SemanticCache("loose", path=tmp_path / "loose.json", threshold=0.5)
+        loose.set("money and wealth", "teaching")
+
+        assert loose.get("wealth") == "teaching"
+
+    def test_evicts_least_used(self, cache):
+        for topic in ("love", "faith", "grace"):
+            cache.set(topic, topic)
+        cache.get("love")
+        cache.get("grace")
+        cache.set("mercy", "mercy")
+
+        assert cache.get("faith") is None
+        assert cache.get("love") == "love"
+
+    def test_expired_entries_are_not_served(self, tmp_path):
+        cache = SemanticCache("ttl", path=tmp_path / "ttl.json", ttl=0.01)
+        cache.set("love", "teaching")
+        time.sleep(0.02)
+
+        assert cache.get("love") is None
+
+    def test_persists_entries(self, cache):
+        cache.set("forgiveness", "teaching")
+
+        reloaded = SemanticCache("test", path=cache.path)
+        assert reloaded.get("Forgiveness") == "teaching"
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import pytest
+from services.single_flight import SingleFlight, uncoalesced
+
+@pytest.fixture
+def flight():
+    return SingleFlight()
+
+def run_concurrently(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+class TestThreaded:
+    def test_coalesces_concurrent_calls(self, flight):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+
+        threads, results = run_concurrently(5, lambda: flight.do("key", fetch))
+        while flight.get_stats()["coalesced"] < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert calls == [1]
+        assert results == ["answer"] * 5
+        assert flight.get_stats() == {"executed": 1, "coalesced": 4, "bypassed": 0, "in_flight": 0}
+
+    def test_shares_exceptions(self, flight):
+        release = threading.Event()
+        errors = []
+
+        def fetch():
+            release.wait(5)
+            raise ConnectionError("down")
+
+        def call():
+            try:
+                flight.do("key", fetch)
+            except ConnectionError as e:
+                errors.append(e)
+
+        threads, _ = run_concurrently(3, call)
+        while flight.get_stats()["coalesced"] < 2:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(errors) == 3
+
+    def test_sequential_calls_are_not_shared(self, flight):
+        calls = []
+        flight.do("key", calls.append, 1)
+        flight.do("key", calls.append, 2)
+
+        assert calls == [1, 2]
+
+    def test_uncoalesced_calls_do_not_join(self, flight):
+        release = threading.Event()
+        calls = []
+
+        def fetch(value):
+            calls.append(value)
+            release.wait(5)
+            return value
+
+        first = threading.Thread(target=flight.do, args=("key", fetch, 1))
+        first.start()
+        while not calls:
+            threading.Event().wait(0.01)
+        with uncoalesced():
+            release.set()
+            assert flight.do("key", fetch, 2) == 2
+        first.join()
+
+        assert calls == [1, 2]
+        assert flight.get_stats()["bypassed"] == 1
+
+class TestAsync:
+    def test_coalesces_concurrent_calls(self, flight):
+        calls = []
+
+        async def fetch(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def run():
+            return await asyncio.gather(
+                flight.ado("a", fetch, "a"), flight.ado("a", fetch, "a"), flight.ado("b", fetch, "b")
+            )
+
+        assert asyncio.run(run()) == ["a", "a", "b"]
+        assert calls == ["a", "b"]
+        assert flight.get_stats()["in_flight"] == 0
+
+    def test_cancelling_one_waiter_keeps_the_call(self, flight):
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def run():
+            first = asyncio.create_task(flight.ado("key", fetch))
+            second = asyncio.create_task(flight.ado("key", fetch))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == "answer"
+
+    def test_cancelling_all_waiters_cancels_the_call(self, flight):
+        finished = []
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            finished.append(True)
+
+        async def run():
+            waiter = asyncio.create_task(flight.ado("key", fetch))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+        assert finished == []
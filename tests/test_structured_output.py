@@ -0,0 +1,78 @@
+import json
+import pytest
+from services.llm.structured_output import extract_json, find_references, parse_structured, stream_json_field
+
+TEACHING = {
+    "insights": "God's love is steadfast (Romans 8:38-39).",
+    "references": ["Romans 8:38-39", "1 John 4:8"],
+    "application": "Love your neighbour.",
+    "prayer": "Pray for a loving heart."
+}
+
+class TestExtractJson:
+    @pytest.mark.parametrize("text", [
+        json.dumps(TEACHING),
+        f"```json\n{json.dumps(TEACHING)}\n```",
+        f"Here is your teaching:\n{json.dumps(TEACHING)}\nMay it bless you {{always}}."
+    ])
+    def test_tolerates_fences_and_chatter(self, text):
+        assert extract_json(text) == TEACHING
+
+    @pytest.mark.parametrize("text", ["", "no json here", "[1, 2]", '{"insights": "unterminated'])
+    def test_rejects_unusable_responses(self, text):
+        assert extract_json(text) is None
+
+class TestParseStructured:
+    def test_complete_response(self):
+        result = parse_structured(json.dumps(TEACHING))
+
+        assert result.complete
+        assert result.data == TEACHING
+
+    def test_invalid_fields_are_reported_missing(self):
+        result = parse_structured(json.dumps({"insights": "Grace.", "references": 42, "prayer": "  "}))
+
+        assert result.data == {"insights": "Grace."}
+        assert result.missing == ["references", "application", "prayer"]
+
+    def test_coerces_near_misses(self):
+        result = parse_structured(json.dumps({
+            "insights": "Grace.",
+            "references": "- John 3:16\n- Ephesians 2:8",
+            "application": ["Rest", "Give thanks"],
+            "prayer": "Thank you."
+        }))
+
+        assert result.data["references"] == ["John 3:16", "Ephesians 2:8"]
+        assert result.data["application"] == "- Rest\n- Give thanks"
+
+    def test_non_json_is_all_missing(self):
+        assert parse_structured("I cannot help with that").missing == list(TEACHING)
+
+class TestFindReferences:
+    def test_finds_references_in_order(self):
+        text = "In Romans 8:28 and 1 Corinthians 13:4-7, and again in Romans 8:28, see Song of Solomon 2:4."
+
+        assert find_references(text) == ["Romans 8:28", "1 Corinthians 13:4-7", "Song of Solomon 2:4"]
+
+    def test_ignores_times_and_ratios(self):
+        assert find_references("Meet at 10:30 for a 3:1 discussion") == []
+
+class TestStreamJsonField:
+    def test_yields_the_field_while_streaming(self):
+        # Quotes, newlines and non-ASCII (a surrogate pair for the emoji) arrive escaped
+        insights = 'Grace "abounds"\né 🙏'
+        text = json.dumps({**TEACHING, "insights": insights})
+        raw = []
+        # Two-character chunks split keys and escape sequences
+        chunks = [text[i:i + 2] for i in range(0, len(text), 2)]
+
+        shown = "".join(stream_json_field(iter(chunks), "insights", raw))
+
+        assert shown == insights
+        assert "".join(raw) == text
+
+    def test_non_string_field_yields_nothing(self):
+        raw = []
+        assert list(stream_json_field(iter(['{"insights": ["Grace"]}']), "insights", raw)) == []
+        assert raw == ['{"insights": ["Grace"]}']
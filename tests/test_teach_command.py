@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from config.settings import Config
+from agent.bible_agent import BibleAgent
+from services.event_loop import BackgroundLoop
+from services.llm.prompt_templates import PromptRegistry
+
+class LoopBoundModel:
+    """Like a grpc.aio channel: only usable on the event loop it first ran on"""
+
+    def __init__(self):
+        self.loop = None
+        self.calls = 0
+
+    async def agenerate(self, prompt, task=None):
+        loop = asyncio.get_running_loop()
+        self.loop = self.loop or loop
+        if self.loop is not loop:
+            raise RuntimeError("Event loop is closed")
+        self.calls += 1
+        return "John 3:16"
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(Config, "TEACH_STRUCTURED_OUTPUT", False)
+    monkeypatch.setattr("builtins.input", lambda prompt="": "grace")
+    model = LoopBoundModel()
+    agent = BibleAgent.__new__(BibleAgent)
+    agent.event_loop = BackgroundLoop()
+    agent.teach_cache = None
+    agent.prompts = PromptRegistry.shared()
+    agent._model_for = lambda task: model
+    agent.search_agent = SimpleNamespace(
+        search_and_analyze=lambda query, raw_results=None: {"insights": f"Saved by {query}.", "sources": []}
+    )
+    agent.current_session = SimpleNamespace(add_teaching=lambda data: None)
+    agent.console_formatter = SimpleNamespace(format_teaching=lambda data: "")
+    yield agent
+    agent.event_loop.close()
+
+def test_teach_commands_share_one_event_loop(agent):
+    first = agent._handle_teach_command()
+    second = agent._handle_teach_command()
+
+    for teaching in (first, second):
+        assert teaching["references"] == ["John 3:16"]
+        assert teaching["application"] and teaching["prayer"]
+    assert agent._model_for(None).calls == 6
+
+def test_background_loop_keeps_context():
+    import contextvars
+    marker = contextvars.ContextVar("marker", default=None)
+    loop = BackgroundLoop()
+
+    async def read():
+        return marker.get()
+
+    marker.set("command")
+    try:
+        assert loop.run(read()) == "command"
+    finally:
+        loop.close()
+
+class FakeCache:
+    def __init__(self):
+        self.saved = {}
+
+    def get(self, topic):
+        return self.saved.get(topic)
+
+    def set(self, topic, value):
+        self.saved[topic] = value
+
+def test_only_complete_teachings_are_cached(agent):
+    agent.teach_cache = FakeCache()
+
+    async def failing_prayer(topic, insights):
+        return ""
+
+    agent._agenerate_prayer_points = failing_prayer
+    assert agent._handle_teach_command()["prayer"] == ""
+    assert agent.teach_cache.saved == {}
+
+    del agent._agenerate_prayer_points
+    agent._handle_teach_command()
+    assert list(agent.teach_cache.saved) == ["grace"]
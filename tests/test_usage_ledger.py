@@ -0,0 +1,52 @@
+import json
+import pytest
+from services.llm.generation_profiles import DEFAULT_PROFILE, profile_for
+from services.llm.model_types import TaskType
+from services.llm.usage_ledger import UsageLedger
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(path=tmp_path / "usage.jsonl", prices={"priced": (1.0, 4.0)}, persist=True)
+
+class TestGenerationProfiles:
+    def test_extraction_is_short_and_deterministic(self):
+        config = profile_for(TaskType.EXTRACTION).gemini_config()
+
+        assert config["max_output_tokens"] < profile_for(TaskType.TEACHING).max_output_tokens
+        assert config["temperature"] == 0.0
+        assert config["stop_sequences"] == ["\n\n\n"]
+
+    def test_unknown_task_uses_default(self):
+        assert profile_for(None) is DEFAULT_PROFILE
+        assert "stop" not in DEFAULT_PROFILE.openai_params()
+
+class TestUsageLedger:
+    def test_estimates_cost(self, ledger):
+        record = ledger.record("priced", TaskType.TEACHING, 1_000_000, 500_000, 2.0)
+
+        assert record.cost == pytest.approx(3.0)
+        assert ledger.record("local", None, 100, 100, 1.0).cost == 0
+
+    def test_attributes_calls_to_commands(self, ledger):
+        with ledger.command("teach") as teach_id:
+            ledger.record("priced", TaskType.TEACHING, 100, 50, 1.0)
+            ledger.record("priced", TaskType.EXTRACTION, 80, 10, 0.2)
+        with ledger.command("verse"):
+            ledger.record("priced", TaskType.VERSE_ANALYSIS, 40, 60, 0.5)
+        ledger.record("priced", None, 1, 1, 0.1)
+
+        teach = ledger.command_totals(teach_id)
+        assert (teach["calls"], teach["input_tokens"], teach["output_tokens"]) == (2, 180, 60)
+        assert teach["latency"] == pytest.approx(1.2)
+        assert set(ledger.summary("command")) == {"teach", "verse", "None"}
+        assert ledger.get_stats()["session"]["calls"] == 4
+        assert ledger.summary("task")["EXTRACTION"]["output_tokens"] == 10
+
+    def test_persists_records(self, ledger):
+        with ledger.command("teach"):
+            ledger.record("priced", TaskType.TEACHING, 10, 20, 0.3)
+
+        [line] = ledger.path.read_text().splitlines()
+        saved = json.loads(line)
+        assert saved["command"] == "teach"
+        assert saved["session_id"] == ledger.session_id
@@ -0,0 +1,32 @@
+from services.llm.warmup import ModelWarmup
+
+class DummyModel:
+    def __init__(self):
+        self.warmed_up = False
+
+    def warmup(self):
+        self.warmed_up = True
+
+class TestModelWarmup:
+    def test_loads_and_warms_up(self):
+        warmup = ModelWarmup(DummyModel, name="dummy").start()
+        model = warmup.wait(timeout=5)
+
+        assert model.warmed_up
+        stats = warmup.get_stats()
+        assert stats["ready"] and stats["error"] is None
+        assert stats["load_seconds"] is not None
+        assert stats["warmup_seconds"] is not None
+
+    def test_model_without_warmup_hook(self):
+        warmup = ModelWarmup(object, name="plain").start()
+        assert warmup.wait(timeout=5) is not None
+        assert warmup.get_stats()["warmup_seconds"] is None
+
+    def test_load_failure_is_recorded(self):
+        def loader():
+            raise RuntimeError("no weights")
+
+        warmup = ModelWarmup(loader).start()
+        assert warmup.wait(timeout=5) is None
+        assert warmup.get_stats()["error"] == "no weights"
@@ -0,0 +1,78 @@
+import os
+import time
+import pytest
+from services.llm.inference_stats import InferenceStats
+from services.llm.worker_pool import LocalModelWorkerPool, _split_cores
+
+class FakeLLM:
+    model_type = None
+    model_id = "fake"
+
+    def generate(self, prompt, task=None):
+        if prompt == "fail":
+            raise RuntimeError("boom")
+        if prompt == "slow":
+            time.sleep(30)
+        return f"{prompt}:{os.getpid()}"
+
+def failing_factory():
+    raise OSError("weights not found")
+
+@pytest.fixture
+def pool():
+    pool = LocalModelWorkerPool(FakeLLM, num_workers=2, liveness_interval=0.1)
+    yield pool
+    pool.close()
+
+class TestLocalModelWorkerPool:
+    def test_split_cores(self):
+        assert _split_cores(list(range(8)), 2) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+        assert _split_cores([0], 2) == [[0], [0]]
+
+    def test_results_returned_to_caller(self, pool):
+        result = pool.generate("love")
+        assert result.startswith("love:")
+        assert result.split(":")[1] != str(os.getpid())
+
+    def test_requests_balanced_across_workers(self, pool):
+        futures = [pool.submit(f"topic{i}") for i in range(20)]
+        results = [f.result(timeout=10) for f in futures]
+
+        assert [r.split(":")[0] for r in results] == [f"topic{i}" for i in range(20)]
+        assert len({r.split(":")[1] for r in results}) == 2
+        assert sum(pool.get_stats()["served"]) == 20
+
+    def test_worker_errors_return_none(self, pool):
+        assert pool.generate("fail") is None
+        assert pool.generate("hope").startswith("hope:")
+
+    def test_pool_publishes_inference_records(self, pool):
+        # Routing relies on this to avoid measuring pooled calls twice
+        assert pool.inference_stats is InferenceStats.shared()
+
+    def test_dead_worker_fails_its_requests(self, pool):
+        future = pool.submit("slow")
+        worker = pool._assigned[0]
+        pool._processes[worker].kill()
+
+        assert future.result(timeout=5) is None
+        # New requests go to the surviving worker
+        assert pool.generate("hope").startswith("hope:")
+        assert pool.get_stats()["alive"].count(True) == 1
+
+    def test_close_fails_unanswered_requests(self):
+        pool = LocalModelWorkerPool(FakeLLM, num_workers=1)
+        future = pool.submit("slow")
+        pool.close(timeout=0.5)
+
+        assert future.result(timeout=5) is None
+        assert pool.submit("late").result(timeout=1) is None
+
+    def test_workers_load_the_model_themselves(self, pool):
+        # Nothing is loaded in the parent; the workers report what they loaded
+        assert pool.model_id == "fake"
+        assert pool.get_stats()["alive"] == [True, True]
+
+    def test_load_failure_in_every_worker_raises(self):
+        with pytest.raises(RuntimeError, match="weights not found"):
+            LocalModelWorkerPool(failing_factory, num_workers=2)
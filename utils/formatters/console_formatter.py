@@ -6,7 +6,8 @@ from rich.box import ROUNDED, HEAVY, DOUBLE  # Import box styles directly as con
 from rich.markdown import Markdown
 from rich.align import Align
 from rich.layout import Layout
-from typing import Dict, Any, List
+from rich.live import Live
+from typing import Dict, Any, List, Iterable
 import textwrap
 from datetime import datetime
 
@@ -47,6 +48,29 @@ class ConsoleFormatter:
             expand=True
         )
 
+    def stream_panel(self, chunks: Iterable[str], title: str, border_style: str = "magenta") -> str:
+        """Render streamed text live in a panel and return the full text"""
+        text = ""
+
+        def render() -> Panel:
+            return Panel(
+                Markdown(text or "..."),
+                title=title,
+                title_align="left",
+                box=ROUNDED,
+                border_style=border_style,
+                padding=(1, 2),
+                expand=True
+            )
+
+        # Transient so the final formatted output replaces the live preview
+        with Live(render(), console=self.console, refresh_per_second=12, transient=True) as live:
+            for chunk in chunks:
+                text += chunk
+                live.update(render())
+
+        return text
+
     def format_teaching(self, data: Dict) -> str:
         """Format biblical teaching with enhanced styling"""
         # Capture rich output as string